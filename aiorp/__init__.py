@@ -1,18 +1,98 @@
+from .access_log import AccessLog, AccessRecord, format_json, format_text
+from .body_limits import BodyLimits, BodyReader, MemoryBudget
+from .client_trace import client_trace_config
+from .config import ProxyConfig
 from .context import ProxyContext, configure_contexts
 from .http_handler import HTTPProxyHandler, MiddlewarePhase, ProxyMiddlewareDef
+from .limiter import AdaptiveLimit, ConcurrencyLimiter
+from .metrics import Histogram, ProxyMetrics, TargetMetrics
+from .mirror import Mirror
+from .ratelimit import (
+    RateLimitBackend,
+    SlidingWindow,
+    TokenBucket,
+    by_client_ip,
+    by_header,
+    by_state,
+    rate_limit,
+)
+from .registry import ConnectionLimit, ConnectionRegistry
 from .request import ProxyRequest
 from .response import ProxyResponse
-from .rewrite import Rewrite
-from .ws_handler import WsProxyHandler
+from .rewrite import PrefixRewrite, RegexRewrite, Rewrite, RewriteRules
+from .router import ProxyRoute, ProxyRouter
+from .runner import RunConfig, run
+from .shared import SharedTable
+from .split import SplitTarget, TrafficSplit
+from .sse import EventStreaming
+from .timing import ChainTiming, MiddlewareTime, UpstreamTiming
+from .tracing import BatchExporter, LoggingExporter, Span, SpanExporter, Tracer
+from .workers import WorkerSupervisor, run_workers
+from .ws_broadcast import WsBroadcast
+from .ws_handler import (
+    MessageDirection,
+    MessageMiddlewareDef,
+    WsCompression,
+    WsProxyHandler,
+)
 
 __all__ = [
     "ProxyContext",
     "HTTPProxyHandler",
     "WsProxyHandler",
+    "WsCompression",
+    "WsBroadcast",
     "ProxyRequest",
     "ProxyResponse",
     "ProxyMiddlewareDef",
     "MiddlewarePhase",
+    "MessageMiddlewareDef",
+    "MessageDirection",
     "Rewrite",
+    "PrefixRewrite",
+    "RegexRewrite",
+    "RewriteRules",
     "configure_contexts",
+    "ConnectionRegistry",
+    "ConnectionLimit",
+    "ProxyRouter",
+    "ProxyRoute",
+    "ProxyConfig",
+    "RateLimitBackend",
+    "TokenBucket",
+    "SlidingWindow",
+    "rate_limit",
+    "by_client_ip",
+    "by_header",
+    "by_state",
+    "ConcurrencyLimiter",
+    "AdaptiveLimit",
+    "ProxyMetrics",
+    "TargetMetrics",
+    "Histogram",
+    "ChainTiming",
+    "MiddlewareTime",
+    "UpstreamTiming",
+    "client_trace_config",
+    "Tracer",
+    "Span",
+    "SpanExporter",
+    "BatchExporter",
+    "LoggingExporter",
+    "WorkerSupervisor",
+    "run_workers",
+    "SharedTable",
+    "RunConfig",
+    "run",
+    "AccessLog",
+    "AccessRecord",
+    "format_text",
+    "format_json",
+    "Mirror",
+    "TrafficSplit",
+    "SplitTarget",
+    "EventStreaming",
+    "BodyLimits",
+    "BodyReader",
+    "MemoryBudget",
 ]
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, List, TextIO
+
+from aiohttp import web
+from yarl import URL
+
+from aiorp.batching import Batcher
+from aiorp.context import ProxyContext
+from aiorp.response import bytes_sent
+
+logger = logging.getLogger(__name__)
+
+
+#  pylint: disable=too-many-instance-attributes
+@dataclass(slots=True)
+class AccessRecord:
+    """The fields logged for a proxied request.
+
+    Args:
+        time: Time the request was received, as a UNIX timestamp in seconds.
+        remote: The address of the client.
+        method: The HTTP method.
+        path: The path and query string requested from the proxy.
+        target: The URL the request was proxied to, after rewriting.
+        status: The status sent to the client.
+        upstream_status: The status returned by the target, None if the target
+            didn't respond.
+        upstream_time: Seconds until the target responded, None if it didn't.
+        request_time: Seconds spent handling the request.
+        bytes_in: Number of bytes of the request body received.
+        bytes_out: Number of bytes of the response sent, see `bytes_sent`.
+    """
+
+    time: float
+    remote: str | None
+    method: str
+    path: str
+    target: URL
+    status: int
+    upstream_status: int | None
+    upstream_time: float | None
+    request_time: float
+    bytes_in: int
+    bytes_out: int
+
+
+def format_text(record: AccessRecord) -> str:
+    """Format the record as a text line, the upstream fields after the arrow.
+
+    Times are in milliseconds, and missing values are logged as `-`.
+
+    Args:
+        record: The record
+
+    Returns:
+        The log line
+    """
+    timestamp = time.strftime("%d/%b/%Y:%H:%M:%S %z", time.localtime(record.time))
+    upstream_time = (
+        "-" if record.upstream_time is None else f"{record.upstream_time * 1000:.3f}"
+    )
+    return (
+        f'{record.remote or "-"} [{timestamp}] "{record.method} {record.path}" '
+        f"{record.status} {record.bytes_in} {record.bytes_out} "
+        f"{record.request_time * 1000:.3f} -> {record.target} "
+        f'{record.upstream_status or "-"} {upstream_time}'
+    )
+
+
+def format_json(record: AccessRecord) -> str:
+    """Format the record as a JSON object.
+
+    Args:
+        record: The record
+
+    Returns:
+        The log line
+    """
+    return json.dumps(asdict(record), default=str)
+
+
+class AccessLog:
+    """Access log of the proxied requests, written in batches off the event loop.
+
+    Handling a request only stores a record of it. The records are formatted and
+    written in batches by a background thread, which wakes up every `interval`
+    seconds or when a batch is full. When more than `max_queue_size` records are
+    waiting, new ones are dropped and counted in `dropped`.
+
+    ```python
+    access_log = AccessLog(sys.stdout, sample_rate=0.1)
+    handler = HTTPProxyHandler(context=ctx, access_log=access_log)
+    access_log.setup(app)  # Writes the remaining records on shutdown
+    ```
+
+    Args:
+        stream: The stream to write the lines to, e.g. an open file. The lines
+            are logged with the `aiorp.access` logger if not set.
+        formatter: Function formatting a record as a line, `format_text` by default.
+        sample_rate: Share of the requests to log. Requests failing with a server
+            error are always logged.
+        max_batch_size: Maximum number of records written at once.
+        max_queue_size: Maximum number of records waiting to be written.
+        interval: Maximum time in seconds a record waits before being written.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO | None = None,
+        formatter: Callable[[AccessRecord], str] = format_text,
+        sample_rate: float = 1.0,
+        max_batch_size: int = 1024,
+        max_queue_size: int = 8192,
+        interval: float = 1.0,
+    ):
+        self.stream = stream
+        self.formatter = formatter
+        self.sample_rate = sample_rate
+        self.skipped = 0
+        self._logger = logging.getLogger("aiorp.access")
+        self._batcher: Batcher[AccessRecord] = Batcher(
+            self._write_batch, max_batch_size, max_queue_size, interval
+        )
+        # A single thread keeps the lines in order
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def dropped(self) -> int:
+        """The number of records dropped because the queue was full"""
+        return self._batcher.dropped
+
+    def record(self, ctx: ProxyContext, status: int, request_time: float):
+        """Queue the record of a handled request, starting the writer if needed.
+
+        Args:
+            ctx: The proxy context of the request
+            status: The status sent to the client
+            request_time: Seconds spent handling the request
+        """
+        if status < 500 and random.random() >= self.sample_rate:
+            self.skipped += 1
+            return
+
+        in_req = ctx.request.in_req
+        try:
+            response = ctx.response
+        except ValueError:
+            response = None
+        bytes_out = 0
+        if response is not None and response.web_response_set:
+            bytes_out = bytes_sent(response.web)
+        self._batcher.add(
+            AccessRecord(
+                time=time.time() - request_time,
+                remote=in_req.remote,
+                method=in_req.method,
+                path=in_req.path_qs,
+                target=ctx.request.url,
+                status=status,
+                upstream_status=None if response is None else response.in_resp.status,
+                upstream_time=ctx.upstream_time,
+                request_time=request_time,
+                bytes_in=in_req.content.total_bytes,
+                bytes_out=bytes_out,
+            )
+        )
+
+    async def flush(self):
+        """Stop the writer and write all queued records."""
+        await self._batcher.flush()
+        if self._executor is not None:
+            # Every write was awaited, so there's nothing left to wait for
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def _write_batch(self, batch: List[AccessRecord]):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix="aiorp-access")
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._write, batch
+        )
+
+    def _write(self, batch: List[AccessRecord]):
+        try:
+            if self.stream is None:
+                if self._logger.isEnabledFor(logging.INFO):
+                    for record in batch:
+                        self._logger.info(self.formatter(record))
+                return
+            self.stream.write("".join(f"{self.formatter(r)}\n" for r in batch))
+            self.stream.flush()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to write %d access log records", len(batch))
+
+    def setup(self, app: web.Application):
+        """Write the remaining records when the application shuts down.
+
+        Args:
+            app: The application the access log is used in
+        """
+
+        async def _cleanup(_):
+            await self.flush()
+
+        app.on_cleanup.append(_cleanup)
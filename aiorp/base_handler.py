@@ -1,7 +1,9 @@
 from aiohttp import web
 
 from aiorp.context import ProxyContext
-from aiorp.rewrite import Rewrite
+from aiorp.metrics import TargetMetrics
+from aiorp.rewrite import Rewrite, RewriteRules
+from aiorp.split import TrafficSplit
 
 
 class BaseHandler:
@@ -12,20 +14,45 @@ class BaseHandler:
 
     Args:
         context: Optional proxy context containing target URL and session information.
-        rewrite: Optional rewrite configuration for modifying request paths.
+        rewrite: Optional rewrite rule or rules for modifying request paths.
         request_options: Optional dictionary of additional request options to be injected on
             request. Refer to the `ClientSession.request` function arguments for the exact options
+        metrics: Optional metrics of the target to record the proxied traffic in.
+        split: Optional split of the traffic between several targets, selecting
+            the context of every request instead of `context`.
     """
 
     def __init__(
         self,
         context: ProxyContext | None = None,
-        rewrite: Rewrite | None = None,
+        rewrite: Rewrite | RewriteRules | None = None,
         request_options: dict | None = None,
+        metrics: TargetMetrics | None = None,
+        split: TrafficSplit | None = None,
     ):
         self._rewrite = rewrite
         self.request_options = request_options or {}
         self.context: ProxyContext | None = context
+        self.metrics: TargetMetrics | None = metrics
+        self.split: TrafficSplit | None = split
+
+    def _select_context(self, request: web.Request) -> ProxyContext:
+        """Select the context to proxy the request with.
+
+        Args:
+            request: The incoming web request.
+
+        Returns:
+            The context selected by the traffic split, or the handler context.
+
+        Raises:
+            ValueError: If neither the context nor the traffic split is set.
+        """
+        if self.split is not None:
+            return self.split.select(request)
+        if self.context is None:
+            raise ValueError("Proxy context must be set before the handler is invoked.")
+        return self.context
 
     async def __call__(self, request: web.Request):
         """Handle incoming requests.
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, List, TypeVar
+
+T = TypeVar("T")
+
+
+#  pylint: disable=too-many-instance-attributes
+class Batcher(Generic[T]):
+    """Queues items and hands them over in batches from a background task.
+
+    Adding an item never waits. The batches are handed over every `interval`
+    seconds, or as soon as a batch is full. When more than `max_queue_size` items
+    are waiting, new ones are dropped and counted in `dropped`.
+
+    Args:
+        handle: Coroutine function processing a batch, it's expected to handle
+            its own errors.
+        max_batch_size: Maximum number of items handed over at once.
+        max_queue_size: Maximum number of items waiting to be handed over.
+        interval: Maximum time in seconds an item waits before being handed over.
+    """
+
+    def __init__(
+        self,
+        handle: Callable[[List[T]], Awaitable[None]],
+        max_batch_size: int,
+        max_queue_size: int,
+        interval: float,
+    ):
+        self.handle = handle
+        self.max_batch_size = max_batch_size
+        self.max_queue_size = max_queue_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: List[T] = []
+        self._full: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def add(self, item: T):
+        """Queue an item, starting the background task if needed.
+
+        Args:
+            item: The item to queue
+        """
+        if len(self._queue) >= self.max_queue_size:
+            self.dropped += 1
+            return
+        self._queue.append(item)
+        if self._task is None or self._task.done():
+            self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        if len(self._queue) >= self.max_batch_size:
+            self._full.set()
+
+    async def flush(self):
+        """Stop the background task and hand over all queued items."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._handle_queued()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self._handle_queued()
+
+    async def _handle_queued(self):
+        while self._queue:
+            batch = self._queue[: self.max_batch_size]
+            del self._queue[: self.max_batch_size]
+            await self.handle(batch)
@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+from typing import Callable, List
+
+from aiohttp import streams, web
+
+
+class MemoryBudget:
+    """Maximum number of body bytes buffered at once, across all in-flight requests.
+
+    Share a single budget between the handlers, so the bodies held by the proxy
+    never exceed it whatever the number of concurrent requests. Requests which
+    would exceed it are rejected with `503 Service Unavailable` and counted in
+    `rejected`.
+
+    Args:
+        max_bytes: The number of bytes that can be buffered at once.
+    """
+
+    def __init__(self, max_bytes: int):
+        if max_bytes <= 0:
+            raise ValueError("The memory budget must be positive")
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.rejected = 0
+
+    def reserve(self, size: int) -> bool:
+        """Reserve bytes of the budget.
+
+        Args:
+            size: The number of bytes to reserve
+
+        Returns:
+            Whether the bytes were reserved, False if the budget is exhausted.
+        """
+        if self.used + size > self.max_bytes:
+            self.rejected += 1
+            return False
+        self.used += size
+        return True
+
+    def release(self, size: int):
+        """Return reserved bytes to the budget.
+
+        Args:
+            size: The number of bytes to return
+        """
+        self.used -= size
+
+
+@dataclass
+class BodyLimits:
+    """Limits of the bodies buffered by the HTTP handler
+
+    The bodies are read chunk by chunk, and reading stops as soon as a limit is
+    crossed. Bodies declaring a larger `Content-Length` are rejected without being
+    read at all.
+
+    Args:
+        max_request_size: Maximum size of a request body in bytes. Larger requests
+            are rejected with `413 Request Entity Too Large`. The `client_max_size`
+            of the application applies when not set.
+        max_response_size: Maximum size of a target response body in bytes. Larger
+            responses are answered with `502 Bad Gateway`.
+        budget: Optional memory budget shared by the requests, limiting the bytes
+            of all the bodies buffered at once.
+        chunk_size: Size of the chunks the bodies are read in.
+    """
+
+    max_request_size: int | None = None
+    max_response_size: int | None = None
+    budget: MemoryBudget | None = None
+    chunk_size: int = 64 * 1024
+
+
+class BodyReader:
+    """Reads the bodies of a single request within the limits.
+
+    Bytes reserved from the memory budget are held until `release` is called,
+    once the response is sent to the client.
+
+    Args:
+        limits: The limits to read the bodies within
+    """
+
+    def __init__(self, limits: BodyLimits):
+        self.limits = limits
+        self.reserved = 0
+
+    async def read(
+        self,
+        stream: streams.StreamReader,
+        max_size: int | None,
+        declared_size: int | None,
+        too_large: Callable[[int], web.HTTPException],
+    ) -> bytes:
+        """Read a whole body, raising as soon as it crosses a limit.
+
+        Args:
+            stream: The stream of the body
+            max_size: Maximum size of the body, None for no limit
+            declared_size: The size declared by the Content-Length header, if any
+            too_large: Function building the error raised for a body over the
+                maximum size, from the size read so far
+
+        Returns:
+            The body
+
+        Raises:
+            HTTPException: The error built by `too_large` if the body is over the
+                maximum size, or `503 Service Unavailable` if the memory budget
+                is exhausted.
+        """
+        if max_size is not None and declared_size is not None:
+            if declared_size > max_size:
+                raise too_large(declared_size)
+        budget = self.limits.budget
+        chunks: List[bytes] = []
+        size = 0
+        while chunk := await stream.read(self.limits.chunk_size):
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                raise too_large(size)
+            if budget is not None:
+                if not budget.reserve(len(chunk)):
+                    raise web.HTTPServiceUnavailable(
+                        reason="Memory budget exhausted", headers={"Retry-After": "1"}
+                    )
+                self.reserved += len(chunk)
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def release(self):
+        """Return the bytes reserved for the bodies to the memory budget."""
+        if self.limits.budget is not None and self.reserved:
+            self.limits.budget.release(self.reserved)
+        self.reserved = 0
@@ -0,0 +1,89 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Any
+
+from aiohttp import ClientSession, TraceConfig
+
+from aiorp.context import ProxyContext
+from aiorp.timing import UpstreamTiming
+
+proxy_context: ContextVar[ProxyContext | None] = ContextVar(
+    "aiorp_proxy_context", default=None
+)
+"""The context of the request the HTTP handler is sending to the target.
+
+Set by the handler around the upstream request only, so the `trace_request_ctx`
+request option stays free for the trace configs of the user.
+"""
+
+
+def client_trace_config() -> TraceConfig:
+    """Build a trace config recording the phases of the requests to the target.
+
+    Add it to the session created by the session factory of the context, the HTTP
+    handler then stores the timings of each proxied request in `ctx.upstream_timing`
+    and records them in the handler metrics, if set.
+
+    ```python
+    ctx = ProxyContext(
+        url=URL("http://localhost:8002"),
+        session_factory=lambda: ClientSession(trace_configs=[client_trace_config()]),
+    )
+    ```
+
+    Returns:
+        The trace config
+    """
+    trace_config = TraceConfig()
+
+    def _on(signal: str, start: str | None = None, phase: str | None = None):
+        """Register a callback recording the time of the signal.
+
+        The callback stores the time under `start`, and adds the time elapsed since
+        the matching start to the `phase` of the timing.
+        """
+
+        async def _callback(_session: ClientSession, trace_ctx: Any, _):
+            ctx = proxy_context.get()
+            if not isinstance(ctx, ProxyContext):
+                return
+            now = asyncio.get_running_loop().time()
+            if start is not None:
+                setattr(trace_ctx, start, now)
+            if phase is not None:
+                begin = getattr(trace_ctx, f"{phase}_start", None)
+                if begin is not None:
+                    timing = ctx.upstream_timing
+                    setattr(timing, phase, getattr(timing, phase) + now - begin)
+
+        getattr(trace_config, signal).append(_callback)
+
+    async def _on_request_start(_session: ClientSession, trace_ctx: Any, _):
+        ctx = proxy_context.get()
+        if isinstance(ctx, ProxyContext) and ctx.upstream_timing is None:
+            ctx.upstream_timing = UpstreamTiming()
+            trace_ctx.total_start = asyncio.get_running_loop().time()
+
+    async def _on_connection_reuseconn(_session: ClientSession, trace_ctx: Any, _):
+        ctx = proxy_context.get()
+        if isinstance(ctx, ProxyContext):
+            ctx.upstream_timing.reused = True
+
+    async def _on_request_end(_session: ClientSession, trace_ctx: Any, _):
+        ctx = proxy_context.get()
+        if isinstance(ctx, ProxyContext):
+            now = asyncio.get_running_loop().time()
+            ctx.upstream_timing.total = now - trace_ctx.total_start
+
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    _on("on_connection_queued_start", start="queue_start")
+    _on("on_connection_queued_end", phase="queue")
+    _on("on_dns_resolvehost_start", start="dns_start")
+    _on("on_dns_resolvehost_end", phase="dns")
+    _on("on_connection_create_start", start="connect_start")
+    _on("on_connection_create_end", phase="connect")
+    _on("on_request_headers_sent", start="server_start")
+    _on("on_request_end", phase="server")
+    trace_config.on_request_end.append(_on_request_end)
+    return trace_config
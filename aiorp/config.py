@@ -0,0 +1,304 @@
+import asyncio
+import importlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from aiohttp import web
+from yarl import URL
+
+from aiorp.context import ProxyContext
+from aiorp.http_handler import HTTPProxyHandler, MiddlewarePhase, ProxyMiddlewareDef
+from aiorp.limiter import AdaptiveLimit, ConcurrencyLimiter
+from aiorp.metrics import ProxyMetrics
+from aiorp.registry import ConnectionLimit
+from aiorp.rewrite import PrefixRewrite, RegexRewrite, Rewrite, RewriteRules
+from aiorp.router import ProxyRoute, ProxyRouter
+from aiorp.ws_handler import MessageDirection, MessageMiddlewareDef, WsProxyHandler
+
+logger = logging.getLogger(__name__)
+
+
+def read_config(path: str | Path) -> Dict[str, Any]:
+    """Read a configuration file, picking the format by the file extension.
+
+    JSON and TOML are supported out of the box, YAML requires PyYAML to be installed.
+
+    Args:
+        path: Path to the configuration file
+
+    Returns:
+        The parsed configuration.
+
+    Raises:
+        ValueError: If the file format is not supported.
+        ImportError: If the parser for the file format is not installed.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    if suffix == ".toml":
+        try:
+            import tomllib  # pylint: disable=import-outside-toplevel
+        except ImportError:  # Python < 3.11, tomli is a dependency there
+            import tomli as tomllib  # pylint: disable=import-outside-toplevel
+        with open(path, "rb") as file:
+            return tomllib.load(file)
+    if suffix in (".yaml", ".yml"):
+        try:
+            import yaml  # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise ImportError("PyYAML is required for YAML configuration files") from e
+        with open(path, encoding="utf-8") as file:
+            return yaml.safe_load(file)
+    raise ValueError(f"Unsupported configuration file format: {suffix}")
+
+
+def _import(reference: str) -> Callable:
+    """Import an object referenced as `module:attribute`."""
+    module, _, attribute = reference.partition(":")
+    if not attribute:
+        raise ValueError(f"Expected a 'module:attribute' reference, got {reference!r}")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def _build_rewrite(config: Dict[str, Any] | List) -> Rewrite | RewriteRules:
+    if isinstance(config, list):
+        return RewriteRules([_build_rewrite(rule) for rule in config])
+    extra = {"host": config.get("host"), "query": config.get("query")}
+    if "prefix" in config:
+        return PrefixRewrite(config["prefix"], config.get("replacement", ""), **extra)
+    if "pattern" in config:
+        reverse = config.get("reverse")
+        return RegexRewrite(
+            config["pattern"],
+            config["replacement"],
+            reverse=tuple(reverse) if reverse else None,
+            **extra,
+        )
+    return Rewrite(config["from"], config["to"], **extra)
+
+
+def _build_limiter(config: Dict[str, Any]) -> ConcurrencyLimiter:
+    config = dict(config)
+    if priority := config.get("priority"):
+        config["priority"] = _import(priority)
+    if adaptive := config.get("adaptive"):
+        config["adaptive"] = AdaptiveLimit(**adaptive)
+    return ConcurrencyLimiter(**config)
+
+
+def _build_phase(phase: str | int) -> MiddlewarePhase | int:
+    if isinstance(phase, str):
+        return MiddlewarePhase[phase.upper()]
+    return phase
+
+
+#  pylint: disable=too-many-instance-attributes
+class ProxyConfig:
+    """Proxy contexts, handlers and routes built from a configuration file.
+
+    The configuration defines named contexts and the routes using them:
+
+    ```yaml
+    contexts:
+      inventory:
+        url: http://localhost:8002
+        limiter: {max_in_flight: 100, queue_size: 50, queue_timeout: 1}
+    routes:
+      - prefix: /inventory
+        context: inventory
+        rewrite: {prefix: /inventory, replacement: /shops}
+        middlewares:
+          - {phase: client_edge, middleware: "my_app.middlewares:auth"}
+      - prefix: /live
+        context: inventory
+        type: ws
+    ```
+
+    Once set up with an application, the file is checked for changes periodically.
+    On change the routing table is rebuilt and swapped at once, contexts whose
+    definition didn't change are reused with their sessions, and the sessions of
+    removed or changed contexts are closed once their in-flight requests are drained.
+    An invalid configuration is logged and the current one is kept.
+
+    Args:
+        path: Path to the configuration file (JSON, TOML or YAML).
+        router: Optional router to load the routes into.
+        poll_interval: Interval in seconds for checking the file for changes.
+        drain_timeout: Maximum time in seconds to wait for in-flight requests
+            before closing the session of a removed context.
+        metrics: Optional metrics to record the traffic of the routes in,
+            labelled with the name of their context.
+        connection_limit: Optional limit of the sockets proxied at once, shared by
+            the websocket routes and kept across reloads. A route setting its own
+            `max_connections` option is limited by that instead.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        router: ProxyRouter | None = None,
+        poll_interval: float = 1.0,
+        drain_timeout: float = 30.0,
+        metrics: ProxyMetrics | None = None,
+        connection_limit: ConnectionLimit | None = None,
+    ):
+        self.path = Path(path)
+        self.router = router or ProxyRouter()
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.metrics = metrics
+        self.connection_limit = connection_limit
+        self.contexts: Dict[str, ProxyContext] = {}
+        self._definitions: Dict[str, Dict[str, Any]] = {}
+        self._mtime: int | None = None
+        self._watcher: asyncio.Task | None = None
+
+    def load(self) -> List[ProxyContext]:
+        """Load the configuration file and swap the routes.
+
+        Returns:
+            The contexts which are no longer used and should be closed.
+
+        Raises:
+            Exception: If the configuration is invalid, the current routes are kept.
+        """
+        mtime = os.stat(self.path).st_mtime_ns
+        config = read_config(self.path)
+
+        definitions = config.get("contexts", {})
+        contexts = {
+            name: (
+                self.contexts[name]
+                if self._definitions.get(name) == definition
+                else self._build_context(definition)
+            )
+            for name, definition in definitions.items()
+        }
+        routes = [
+            self._build_route(route, contexts) for route in config.get("routes", [])
+        ]
+
+        self.router.reload(routes)
+        stale = [
+            ctx for name, ctx in self.contexts.items() if contexts.get(name) is not ctx
+        ]
+        self.contexts, self._definitions, self._mtime = contexts, definitions, mtime
+        return stale
+
+    async def reload(self) -> bool:
+        """Reload the configuration and close the sessions of the stale contexts.
+
+        Returns:
+            True if the configuration was reloaded, False if it was invalid.
+        """
+        try:
+            stale = self.load()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to load proxy configuration from %s", self.path)
+            return False
+        await asyncio.gather(*[self._close_context(ctx) for ctx in stale])
+        return True
+
+    def setup(self, app: web.Application):
+        """Load the configuration and register the router with the application.
+
+        The file is watched for changes while the application is running,
+        and the contexts are drained and closed on shutdown.
+
+        Args:
+            app: The application to set up
+        """
+        if self._mtime is None:
+            self.load()
+        self.router.setup(app)
+
+        async def _startup(_):
+            for ctx in self.contexts.values():
+                ctx.start_session()
+            self._watcher = asyncio.create_task(self._watch())
+
+        async def _shutdown(_):
+            if self._watcher is not None:
+                self._watcher.cancel()
+            await asyncio.gather(
+                *[self._close_context(ctx) for ctx in self.contexts.values()]
+            )
+
+        app.on_startup.append(_startup)
+        app.on_shutdown.append(_shutdown)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                logger.warning("Proxy configuration %s is not accessible", self.path)
+                continue
+            if mtime != self._mtime:
+                # Remember the attempt, so an invalid file is only reported once
+                self._mtime = mtime
+                await self.reload()
+
+    async def _close_context(self, ctx: ProxyContext):
+        await ctx.registry.drain(self.drain_timeout)
+        await ctx.close_session()
+
+    @staticmethod
+    def _build_context(definition: Dict[str, Any]) -> ProxyContext:
+        session_factory = definition.get("session_factory")
+        limiter = definition.get("limiter")
+        return ProxyContext(
+            url=URL(definition["url"]),
+            state=definition.get("state"),
+            session_factory=_import(session_factory) if session_factory else None,
+            limiter=_build_limiter(limiter) if limiter else None,
+        )
+
+    def _build_route(
+        self, route: Dict[str, Any], contexts: Dict[str, ProxyContext]
+    ) -> ProxyRoute:
+        if route["context"] not in contexts:
+            raise ValueError(f"Route uses an undefined context {route['context']!r}")
+        kwargs = {
+            "context": contexts[route["context"]],
+            "rewrite": _build_rewrite(route["rewrite"]) if "rewrite" in route else None,
+            "request_options": route.get("request_options"),
+            "metrics": self.metrics.target(route["context"]) if self.metrics else None,
+            **route.get("options", {}),
+        }
+        middlewares = route.get("middlewares", [])
+        handler: HTTPProxyHandler | WsProxyHandler
+        if route.get("type", "http") == "ws":
+            if self.connection_limit is not None:
+                kwargs.setdefault("max_connections", self.connection_limit)
+            handler = WsProxyHandler(
+                message_middlewares=[
+                    MessageMiddlewareDef(
+                        direction=MessageDirection[item["direction"].upper()],
+                        middleware=_import(item["middleware"]),
+                    )
+                    for item in middlewares
+                ],
+                **kwargs,
+            )
+        else:
+            handler = HTTPProxyHandler(
+                middlewares=[
+                    ProxyMiddlewareDef(
+                        phase=_build_phase(item["phase"]),
+                        middleware=_import(item["middleware"]),
+                    )
+                    for item in middlewares
+                ],
+                **kwargs,
+            )
+        return ProxyRoute(
+            prefix=route["prefix"], handler=handler, host=route.get("host")
+        )
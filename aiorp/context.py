@@ -1,11 +1,17 @@
+import asyncio
 from typing import Callable, List
 
 from aiohttp import ClientSession, ClientWebSocketResponse, client, web
 from aiohttp.web_ws import WebSocketResponse
 from yarl import URL
 
+from aiorp.body_limits import BodyReader
+from aiorp.limiter import ConcurrencyLimiter
+from aiorp.registry import ConnectionRegistry
 from aiorp.request import ProxyRequest
 from aiorp.response import ProxyResponse
+from aiorp.rewrite import Rewrite, RewriteRules
+from aiorp.timing import MiddlewareTime, UpstreamTiming
 
 SessionFactory = Callable[[], ClientSession]
 
@@ -22,6 +28,9 @@ class ProxyContext:
         session_factory: Optional factory function to create client sessions.
             If not provided, defaults to aiohttp.ClientSession.
         state: Optional state object to store additional context data.
+        registry: Optional registry tracking the requests proxied with this context.
+            If not provided, each context gets its own registry.
+        limiter: Optional limiter of the number of requests proxied to the target at once.
     """
 
     def __init__(
@@ -29,10 +38,18 @@ class ProxyContext:
         url: URL,
         session_factory: SessionFactory | None = None,
         state: dict | None = None,
+        registry: ConnectionRegistry | None = None,
+        limiter: ConcurrencyLimiter | None = None,
     ):
         self.url: URL = url
         self.state: dict | None = state
         self.session_factory: SessionFactory = session_factory or ClientSession
+        self.registry: ConnectionRegistry = registry or ConnectionRegistry()
+        self.limiter: ConcurrencyLimiter | None = limiter
+        self.timings: List[MiddlewareTime] | None = None
+        self.upstream_timing: UpstreamTiming | None = None
+        self.upstream_time: float | None = None
+        self.body_reader: BodyReader | None = None
         self._request: ProxyRequest | None = None
         self._response: ProxyResponse | None = None
         self._ws_source: web.WebSocketResponse | None = None
@@ -42,7 +59,8 @@ class ProxyContext:
     def __copy__(self) -> "ProxyContext":
         """Copy the proxy context
 
-        Shares the session object, but creates a new instance for the state.
+        Shares the session object, the registry and the limiter, but creates a new
+        instance for the state.
 
         Returns:
             A ProxyContext instance with a new instance of state,
@@ -52,6 +70,8 @@ class ProxyContext:
             url=self.url,  # Thread-safe design, always returns a new instance
             state={**self.state} if self.state else None,
             session_factory=self.session_factory,
+            registry=self.registry,
+            limiter=self.limiter,
         )
         # Set the session in case it is already there
         ctx._session = self._session
@@ -113,15 +133,27 @@ class ProxyContext:
         self._request = ProxyRequest(
             url=self.url,
             in_req=request,
+            body_reader=self.body_reader,
         )
 
-    def set_response(self, response: client.ClientResponse):
+    def set_response(
+        self,
+        response: client.ClientResponse,
+        rewrite: Rewrite | RewriteRules | None = None,
+    ):
         """Set the current proxy response.
 
         Args:
             response: The response from the target server.
+            rewrite: Optional rewrite applied to the request, reversed on the
+                response headers.
         """
-        self._response = ProxyResponse(in_resp=response)
+        self._response = ProxyResponse(
+            in_resp=response,
+            request=self._request,
+            rewrite=rewrite,
+            body_reader=self.body_reader,
+        )
 
     @property
     def session(self) -> ClientSession:
@@ -170,12 +202,31 @@ class ProxyContext:
             await self._ws_target.close()
 
 
-def configure_contexts(app: web.Application, ctxs: List[ProxyContext]):
+def configure_contexts(
+    app: web.Application, ctxs: List[ProxyContext], drain_timeout: float = 30.0
+):
+    """Manage the lifecycle of the contexts with the application.
+
+    Sessions are started on application startup. On shutdown, new requests are
+    rejected, proxied sockets are closed with the going away code, and in-flight
+    requests are given up to `drain_timeout` seconds to finish before the sessions
+    are closed.
+
+    Args:
+        app: The application the contexts are used in
+        ctxs: The contexts to manage
+        drain_timeout: Maximum time in seconds to wait for in-flight requests on shutdown
+    """
+
     async def _startup(_):
         for ctx in ctxs:
             ctx.start_session()
 
     async def _shutdown(_):
+        registries = {id(ctx.registry): ctx.registry for ctx in ctxs}
+        await asyncio.gather(
+            *[registry.drain(drain_timeout) for registry in registries.values()]
+        )
         for ctx in ctxs:
             await ctx.close_session()
 
@@ -1,16 +1,26 @@
 import asyncio
 import copy
 import json
+import re
+import time
 from collections import defaultdict
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import Any, AsyncGenerator, Callable, List
+from typing import Any, AsyncGenerator, Callable, Dict, Hashable, List
 
 from aiohttp import ClientResponseError, client, web
 from aiohttp.web_exceptions import HTTPInternalServerError
 
+from aiorp.access_log import AccessLog
 from aiorp.base_handler import BaseHandler
+from aiorp.body_limits import BodyLimits, BodyReader
+from aiorp.client_trace import proxy_context
 from aiorp.context import ProxyContext
+from aiorp.response import ResponseType, bytes_sent
+from aiorp.sse import EVENT_STREAM, HEARTBEAT, EventChannel, EventStreaming
+from aiorp.timing import ChainTiming, MiddlewareTime
+
+_TOKEN_CHARS = re.compile(r"[^!#$%&'*+\-.^_`|~0-9A-Za-z]")
 
 ErrorHandler = Callable[[ClientResponseError], None] | None
 ProxyMiddleware = Callable[[ProxyContext], AsyncGenerator[None, Any]]
@@ -26,6 +36,30 @@ class MiddlewarePhase(IntEnum):
     )
 
 
+def _middleware_name(middleware: ProxyMiddleware) -> str:
+    return getattr(middleware, "__name__", type(middleware).__name__)
+
+
+def _server_timing(timings: List[MiddlewareTime]) -> str:
+    """Format the timings as a Server-Timing header value, in milliseconds"""
+    entries = []
+    for timing in timings:
+        entry = f"{_TOKEN_CHARS.sub('_', timing.name.strip('_')) or 'middleware'}"
+        entry += f";dur={timing.total * 1000:.3f}"
+        if timing.phase is not None:
+            entry += f';desc="{_phase_name(timing.phase)}"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+
+def _phase_name(phase: int) -> str:
+    """Name of the phase, for phases in between the predefined ones the number"""
+    try:
+        return MiddlewarePhase(phase).name.lower()
+    except ValueError:
+        return str(phase)
+
+
 @dataclass
 class ProxyMiddlewareDef:
     """A ProxyMiddleware definition used to simply set the middleware for a handler
@@ -39,6 +73,7 @@ class ProxyMiddlewareDef:
     middleware: ProxyMiddleware
 
 
+#  pylint: disable=too-many-instance-attributes
 class HTTPProxyHandler(BaseHandler):
     """A handler for proxying requests to a remote server.
 
@@ -52,6 +87,10 @@ class HTTPProxyHandler(BaseHandler):
         middlewares: You can if you want initialize the handler with a set of
             proxy middlewares right away
         error_handler: Callable that is called when an error occurs during the proxied request.
+        timing: Optional settings for timing each middleware of the chain.
+        access_log: Optional access log to record the handled requests in.
+        streaming: Optional settings for proxying Server-Sent Events and long polls.
+        body_limits: Optional limits of the request and response bodies buffered.
 
     Raises:
         ValueError: If connection options contain invalid keys.
@@ -62,6 +101,10 @@ class HTTPProxyHandler(BaseHandler):
         *args: Any,
         middlewares: List[ProxyMiddlewareDef] | None = None,
         error_handler: ErrorHandler = None,
+        timing: ChainTiming | None = None,
+        access_log: AccessLog | None = None,
+        streaming: EventStreaming | None = None,
+        body_limits: BodyLimits | None = None,
         **kwargs: Any,
     ):
         """Initialize the HTTP proxy handler.
@@ -69,6 +112,10 @@ class HTTPProxyHandler(BaseHandler):
         Args:
             *args: Variable length argument list.
             error_handler: Optional callable for handling errors during proxied requests.
+            timing: Optional settings for timing each middleware of the chain.
+            access_log: Optional access log to record the handled requests in.
+            streaming: Optional settings for proxying Server-Sent Events and long polls.
+            body_limits: Optional limits of the request and response bodies buffered.
             **kwargs: Arbitrary keyword arguments.
 
         Raises:
@@ -91,6 +138,17 @@ class HTTPProxyHandler(BaseHandler):
             )
 
         self._error_handler = error_handler
+        self._timing = timing
+        self.access_log = access_log
+        self._streaming = streaming
+        self._body_limits = body_limits
+        self._event_channels: Dict[Hashable, EventChannel] = {}
+        if streaming is not None:
+            # Explicit request options take precedence
+            self.request_options = {
+                "timeout": streaming.timeout,
+                **self.request_options,
+            }
         self._middlewares = defaultdict(list)
 
         for item in middlewares or []:
@@ -111,31 +169,218 @@ class HTTPProxyHandler(BaseHandler):
         Raises:
             ValueError: If proxy context is not set.
             HTTPInternalServerError: If there's an error during request processing.
+            HTTPServiceUnavailable: If the proxy is shutting down or the target is overloaded.
+        """
+        context = self._select_context(request)
+        with context.registry.track_request():
+            if self.metrics is None:
+                return await self._admit(request, context)
+            return await self._measure(request, context)
+
+    async def _admit(
+        self, request: web.Request, context: ProxyContext
+    ) -> web.Response | web.StreamResponse:
+        """Handle the request once the concurrency limiter of the context admits it.
+
+        Args:
+            request: The incoming request to proxy.
+            context: The context to proxy the request with.
+
+        Returns:
+            The response from the external server.
+        """
+        if context.limiter is None:
+            return await self._handle(request, context)
+        async with context.limiter.acquire(request):
+            return await self._handle(request, context)
+
+    async def _measure(
+        self, request: web.Request, context: ProxyContext
+    ) -> web.Response | web.StreamResponse:
+        """Handle the request, recording it in the metrics.
+
+        Args:
+            request: The incoming request to proxy.
+            context: The context to proxy the request with.
+
+        Returns:
+            The response from the external server.
+        """
+        start = time.perf_counter()
+        # Anything else than an HTTP exception ends up as an internal server error
+        status, bytes_out = 500, 0
+        try:
+            response = await self._admit(request, context)
+            status, bytes_out = response.status, bytes_sent(response)
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            self.metrics.observe_request(
+                status,
+                time.perf_counter() - start,
+                # Counted as read, chunked uploads have no content length
+                bytes_in=request.content.total_bytes,
+                bytes_out=bytes_out,
+            )
+
+    async def _handle(
+        self, request: web.Request, context: ProxyContext
+    ) -> web.Response | web.StreamResponse:
+        """Proxy the request through the middleware chain.
+
+        Args:
+            request: The incoming request to proxy.
+            context: The context to proxy the request with.
+
+        Returns:
+            The response from the external server.
         """
-        if self.context is None:
-            raise ValueError("Proxy context must be set before the handler is invoked.")
-        self.context.start_session()
+        context.start_session()
 
         # We need to copy context since we don't want race conditions
         # with request or response setting
-        ctx = copy.copy(self.context)
+        ctx = copy.copy(context)
+        if self._body_limits is not None:
+            ctx.body_reader = reader = BodyReader(self._body_limits)
+            # The response body is held until aiohttp has sent it, which happens
+            # in the task of the request once the handler returns
+            asyncio.current_task().add_done_callback(lambda _: reader.release())
 
         # Set the request to context
         ctx.set_request(request)
 
         if self._rewrite:
-            ctx.request.url = self._rewrite.execute(ctx.request.url)
+            self._rewrite.apply(ctx.request)
+
+        if self.access_log is None:
+            return await self._respond(ctx)
+        return await self._log(ctx)
+
+    async def _log(self, ctx: ProxyContext) -> web.Response | web.StreamResponse:
+        """Respond to the request, recording it in the access log.
+
+        Args:
+            ctx: The ProxyContext of the request
+
+        Returns:
+            The response from the external server.
+        """
+        start = time.perf_counter()
+        # Anything else than an HTTP exception ends up as an internal server error
+        status = 500
+        try:
+            response = await self._respond(ctx)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            self.access_log.record(ctx, status, time.perf_counter() - start)
+
+    async def _respond(self, ctx: ProxyContext) -> web.Response | web.StreamResponse:
+        """Respond to the request through the middleware chain.
 
+        Args:
+            ctx: The ProxyContext of the request
+
+        Returns:
+            The response from the external server.
+        """
         # Execute the middleware chain
         await self._execute_middleware_chain(ctx)
 
         # Check if the web response was set and set it if it wasn't
+        streaming = False
         if not ctx.response.web_response_set:
-            await ctx.response.set_response()
+            streaming = (
+                self._streaming is not None
+                and ctx.response.in_resp.content_type == EVENT_STREAM
+            )
+            await ctx.response.set_response(
+                ResponseType.STREAM if streaming else ResponseType.BASE
+            )
+
+        if self._timing is not None:
+            self._report_timings(ctx)
+
+        if streaming:
+            await self._stream_events(ctx)
 
         # Return the response
         return ctx.response.web
 
+    def _event_key(self, ctx: ProxyContext) -> Hashable | None:
+        """The key event streams are shared by, None if it can't be shared"""
+        if not self._streaming.fan_out:
+            return None
+        return self._streaming.key(ctx)
+
+    async def _stream_events(self, ctx: ProxyContext):
+        """Stream the events of the target response to the client as they arrive.
+
+        With fan out, the client joins the channel of the stream if it's already
+        open, otherwise the target response opens a new one.
+
+        Args:
+            ctx: The ProxyContext holding the target response and the stream response
+        """
+        key = self._event_key(ctx)
+        channel = self._event_channels.get(key)
+        if channel is None or channel.in_resp is not ctx.response.in_resp:
+            shared = key is not None and channel is None
+            channel = EventChannel(
+                key,
+                ctx.response.in_resp,
+                self._streaming.queue_size,
+                self._remove_event_channel if shared else None,
+            )
+            if shared:
+                self._event_channels[key] = channel
+        # Subscribe before any await, so no event is missed
+        subscriber = channel.subscribe()
+
+        response = ctx.response.web
+        response.headers.setdefault("Cache-Control", "no-cache")
+        # Tells a buffering proxy in front, e.g. nginx, to pass the events through
+        response.headers["X-Accel-Buffering"] = "no"
+        try:
+            await response.prepare(ctx.request.in_req)
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.queue.get(), self._streaming.heartbeat
+                    )
+                except asyncio.TimeoutError:
+                    event = HEARTBEAT
+                if event is None:
+                    break
+                await response.write(event)
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # The client went away
+        finally:
+            channel.unsubscribe(subscriber)
+
+    def _remove_event_channel(self, channel: EventChannel):
+        if self._event_channels.get(channel.key) is channel:
+            del self._event_channels[channel.key]
+
+    def _report_timings(self, ctx: ProxyContext):
+        """Report the recorded timings in the response header and to the hook.
+
+        The header is not added if the response was already sent by a middleware.
+
+        Args:
+            ctx: The ProxyContext holding the timings and the response
+        """
+        if self._timing.server_timing and not ctx.response.web.prepared:
+            ctx.response.web.headers["Server-Timing"] = _server_timing(ctx.timings)
+        if self._timing.hook is not None:
+            self._timing.hook(ctx)
+
     async def _execute_middleware_chain(self, ctx: ProxyContext):
         """Execute the entire provided middleware chain.
 
@@ -151,22 +396,115 @@ class HTTPProxyHandler(BaseHandler):
         """
         sorted_middlewares = sorted(self._middlewares.keys())
         middleware_generators = defaultdict(list)
+        # Time spent per phase, only measured when metrics are recorded
+        durations = dict.fromkeys(sorted_middlewares, 0.0) if self.metrics else None
+        # Time spent per middleware, only measured when timing is enabled
+        timings = defaultdict(list) if self._timing else None
+
+        # Generators started so far, closed right away if the chain fails
+        started = []
+        try:
+            # Start all middleware generators and store them
+            for order_key in sorted_middlewares:
+                start = time.perf_counter()
+                middleware_funcs = self._middlewares[order_key]
+                generators = [aiter(func(ctx)) for func in middleware_funcs]
+                started.extend(generators)
+                if timings is None:
+                    await asyncio.gather(*[anext(gen, None) for gen in generators])
+                else:
+                    timings[order_key] = [
+                        MiddlewareTime(_middleware_name(func), order_key)
+                        for func in middleware_funcs
+                    ]
+                    await asyncio.gather(
+                        *[
+                            self._timed_step(gen, timing, "pre")
+                            for gen, timing in zip(generators, timings[order_key])
+                        ]
+                    )
+                middleware_generators[order_key] = generators
+                if durations is not None:
+                    durations[order_key] += time.perf_counter() - start
+
+            # Execute the actual request
+            start = time.perf_counter()
+            await self._proxy_middleware(ctx)
+            proxy_duration = time.perf_counter() - start
+
+            # Resume all middleware generators in reverse order
+            for order_key in reversed(sorted_middlewares):
+                start = time.perf_counter()
+                generators = middleware_generators[order_key]
+                if timings is None:
+                    await asyncio.gather(*[anext(gen, None) for gen in generators])
+                else:
+                    await asyncio.gather(
+                        *[
+                            self._timed_step(gen, timing, "post")
+                            for gen, timing in zip(generators, timings[order_key])
+                        ]
+                    )
+                if durations is not None:
+                    durations[order_key] += time.perf_counter() - start
+        except BaseException:
+            await self._close_middlewares(started)
+            raise
+
+        if timings is not None:
+            ctx.timings = [
+                *(
+                    timing
+                    for order_key in sorted_middlewares
+                    for timing in timings[order_key]
+                ),
+                MiddlewareTime("proxy", None, pre=proxy_duration),
+            ]
+        if durations is not None:
+            for order_key, duration in durations.items():
+                self.metrics.observe_phase(_phase_name(order_key), duration)
 
-        # Start all middleware generators and store them
-        for order_key in sorted_middlewares:
-            middleware_funcs = self._middlewares[order_key]
-            generators = [aiter(func(ctx)) for func in middleware_funcs]
-            await asyncio.gather(*[anext(gen, None) for gen in generators])
-            middleware_generators[order_key] = generators
+    @staticmethod
+    async def _close_middlewares(generators: List[AsyncGenerator]):
+        """Close the middleware generators of a failed chain, last started first.
 
-        # Execute the actual request
-        await self._proxy_middleware(ctx)
+        The generators that weren't resumed run their cleanup code right away,
+        instead of whenever they are garbage collected. The generators finished
+        already are left as is, and the ones still running, e.g. in a phase where
+        another middleware failed, finish on their own.
 
-        # Resume all middleware generators in reverse order
-        for order_key in reversed(sorted_middlewares):
-            await asyncio.gather(
-                *[anext(gen, None) for gen in middleware_generators[order_key]]
-            )
+        Args:
+            generators: The started middleware generators, in order
+        """
+        for gen in reversed(generators):
+            if gen.ag_running:
+                continue
+            try:
+                await gen.aclose()
+            except Exception as e:  # pylint: disable=broad-except
+                # Reported like the event loop does, the chain error is raised
+                asyncio.get_running_loop().call_exception_handler(
+                    {
+                        "message": "Error closing a middleware",
+                        "exception": e,
+                        "asyncgen": gen,
+                    }
+                )
+
+    @staticmethod
+    async def _timed_step(gen: AsyncGenerator, timing: MiddlewareTime, stage: str):
+        """Advance the middleware generator, adding the time it took to the timing.
+
+        Args:
+            gen: The middleware generator
+            timing: The timing of the middleware
+            stage: The stage to add the time to, `pre` or `post`
+        """
+        start = time.perf_counter()
+        try:
+            await anext(gen, None)
+        finally:
+            setattr(timing, stage, getattr(timing, stage) + time.perf_counter() - start)
 
     async def _proxy_middleware(self, ctx: ProxyContext):
         """The default final middleware in the middleware chain.
@@ -180,19 +518,38 @@ class HTTPProxyHandler(BaseHandler):
         Raises:
             ValueError: If proxy request is not set.
         """
+        if self._streaming is not None and (key := self._event_key(ctx)) is not None:
+            channel = self._event_channels.get(key)
+            if channel is not None and not channel.closed:
+                # Join the stream already open instead of requesting it again
+                ctx.set_response(channel.in_resp, rewrite=self._rewrite)
+                return
+
         # Execute the request and check the response
         await ctx.request.load_content()
-        resp = await ctx.session.request(
-            url=ctx.request.url,
-            method=ctx.request.method,
-            params=ctx.request.params,
-            headers=ctx.request.headers,
-            data=ctx.request.content,
-            **self.request_options,
-        )
+        start = time.perf_counter()
+        # Lets the client trace config record the upstream timing in the context
+        token = proxy_context.set(ctx)
+        try:
+            resp = await ctx.session.request(
+                url=ctx.request.url,
+                method=ctx.request.method,
+                params=ctx.request.params,
+                headers=ctx.request.headers,
+                data=ctx.request.content,
+                **self.request_options,
+            )
+        finally:
+            proxy_context.reset(token)
+        ctx.upstream_time = time.perf_counter() - start
+        if self.metrics is not None:
+            self.metrics.observe_upstream(ctx.upstream_time)
+            if ctx.upstream_timing is not None:
+                self.metrics.observe_connection(ctx.upstream_timing)
+        # Build the proxy response object from the target response, set before
+        # checking the status so the upstream status is known when it fails
+        ctx.set_response(resp, rewrite=self._rewrite)
         self._raise_for_status(resp)
-        # Build the proxy response object from the target response
-        ctx.set_response(resp)
 
     def _raise_for_status(self, response: client.ClientResponse):
         """Check status of request and handle the error properly.
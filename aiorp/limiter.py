@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, List, Tuple
+
+from aiohttp import web
+
+RequestPriority = Callable[[web.Request], int]
+
+
+@dataclass
+class AdaptiveLimit:
+    """Adapts the concurrency limit to the latency of the target (AIMD).
+
+    The limit grows by one for every `limit` requests completed within the latency
+    threshold, and is multiplied by `backoff` when a request is slower or fails
+    with a connection error. Only requests started after the last decrease can
+    decrease it again, so a burst of slow requests backs off once.
+
+    Args:
+        latency_threshold: Latency in seconds above which the target is considered
+            overloaded.
+        min_limit: The lowest the limit can drop to.
+        max_limit: The highest the limit can grow to.
+        backoff: The factor the limit is multiplied by when decreasing.
+    """
+
+    latency_threshold: float
+    min_limit: int = 1
+    max_limit: int = 1000
+    backoff: float = 0.9
+
+
+#  pylint: disable=too-many-instance-attributes
+class ConcurrencyLimiter:
+    """Limits the number of requests proxied to a target at once.
+
+    Requests over the limit wait in a bounded queue, and are rejected with
+    `503 Service Unavailable` when the queue is full or they waited for too long.
+    This keeps the requests from piling up in the connection pool of the session,
+    and the latency of the admitted ones bounded.
+
+    Args:
+        max_in_flight: The maximum number of requests in flight, the initial
+            limit in adaptive mode.
+        queue_size: The maximum number of waiting requests, 0 rejects requests
+            over the limit right away.
+        queue_timeout: Maximum time in seconds a request waits in the queue.
+        lifo: Admit the most recent waiting request first. Under overload the oldest
+            requests are the ones most likely to be abandoned by their clients.
+        priority: Optional function returning the priority of the request,
+            waiting requests with lower values are admitted first.
+        adaptive: Optional settings for adapting the limit to the target latency.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        queue_size: int = 0,
+        queue_timeout: float | None = None,
+        lifo: bool = False,
+        priority: RequestPriority | None = None,
+        adaptive: AdaptiveLimit | None = None,
+    ):
+        if max_in_flight < 1:
+            raise ValueError("The concurrency limit must be at least 1")
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.lifo = lifo
+        self.priority = priority
+        self.adaptive = adaptive
+        self._limit = float(max_in_flight)
+        self._in_flight = 0
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued = 0
+        self._sequence = 0
+        self._last_decrease = float("-inf")
+
+    @property
+    def limit(self) -> int:
+        """The current concurrency limit"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """The number of admitted requests"""
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        """The number of waiting requests"""
+        return self._queued
+
+    @asynccontextmanager
+    async def acquire(self, request: web.Request) -> AsyncIterator[None]:
+        """Admit the request for the duration of the context.
+
+        Args:
+            request: The incoming request
+
+        Raises:
+            HTTPServiceUnavailable: If the request can't be admitted.
+        """
+        if self._in_flight < self.limit and not self._queued:
+            self._in_flight += 1
+        else:
+            await self._wait(self.priority(request) if self.priority else 0)
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        failed = False
+        try:
+            yield
+        except web.HTTPException:
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._in_flight -= 1
+            if self.adaptive is not None:
+                self._adapt(start, loop.time() - start, failed)
+            self._wake()
+
+    async def _wait(self, priority: int):
+        """Wait in the queue until a slot is handed over."""
+        if self._queued >= self.queue_size:
+            raise self._reject()
+        self._sequence += 1
+        seq = self._sequence
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, -seq if self.lifo else seq, waiter))
+        self._queued += 1
+        try:
+            await asyncio.wait((waiter,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.cancel():
+                self._leave_queue()
+            else:
+                # The slot was handed over already, pass it on
+                self._in_flight -= 1
+                self._wake()
+            raise
+        if waiter.cancel():
+            self._leave_queue()
+            raise self._reject()
+
+    def _leave_queue(self):
+        """Account for a waiter that gave up, compacting the queue if needed.
+
+        The entries of cancelled waiters are skipped when a slot frees, but a
+        stuck target frees none, so they are dropped once they outnumber the
+        waiting requests to keep the queue bounded.
+        """
+        self._queued -= 1
+        if len(self._queue) > 2 * self._queued:
+            self._queue = [entry for entry in self._queue if not entry[2].done()]
+            heapq.heapify(self._queue)
+
+    def _wake(self):
+        """Hand the free slots over to the waiting requests."""
+        while self._queue and self._in_flight < self.limit:
+            _, _, waiter = heapq.heappop(self._queue)
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            self._queued -= 1
+            waiter.set_result(None)
+
+    def _adapt(self, start: float, latency: float, failed: bool):
+        adaptive = self.adaptive
+        if failed or latency > adaptive.latency_threshold:
+            if start > self._last_decrease:
+                self._limit = max(adaptive.min_limit, self._limit * adaptive.backoff)
+                self._last_decrease = start + latency
+        else:
+            self._limit = min(adaptive.max_limit, self._limit + 1 / self._limit)
+
+    @staticmethod
+    def _reject() -> web.HTTPServiceUnavailable:
+        return web.HTTPServiceUnavailable(reason="Target is overloaded")
@@ -0,0 +1,299 @@
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Sequence
+
+from aiohttp import web
+
+from aiorp.timing import UpstreamTiming
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+
+class Histogram:
+    """Histogram with fixed buckets, allocated once.
+
+    Recording a value increments a single bucket, the cumulative counts are only
+    computed when the histogram is exported. The event loop runs one callback at a
+    time, so no locking is needed.
+
+    Args:
+        buckets: The upper bounds of the buckets, in seconds.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # The last count is for the values over the highest bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Record a value.
+
+        Args:
+            value: The value to record
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterator[tuple[str, int]]:
+        """Iterate over the buckets with their cumulative counts.
+
+        Yields:
+            The upper bound of the bucket, formatted for exposition, and the number
+            of values less than or equal to it.
+        """
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield _format_value(bound), total
+        yield "+Inf", self.count
+
+
+#  pylint: disable=too-many-instance-attributes
+class TargetMetrics:
+    """Metrics of the traffic proxied to a single target.
+
+    Pass it to the handlers of the target to have them record the metrics.
+
+    Args:
+        name: The name of the target, used as the `target` label.
+        buckets: The bucket bounds of the latency histograms.
+    """
+
+    def __init__(self, name: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self._buckets = buckets
+        self.requests: Dict[str, int] = dict.fromkeys(_STATUS_CLASSES, 0)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = Histogram(buckets)
+        self.upstream_latency = Histogram(buckets)
+        self.connection_latency: Dict[str, Histogram] = {
+            phase: Histogram(buckets) for phase in ("queue", "dns", "connect", "server")
+        }
+        self.connections = {"new": 0, "reused": 0}
+        self.phase_latency: Dict[str, Histogram] = {}
+        self.websockets_active = 0
+        self.websocket_messages: Dict[str, int] = {}
+
+    def observe_request(
+        self, status: int, duration: float, bytes_in: int = 0, bytes_out: int = 0
+    ):
+        """Record a proxied request.
+
+        Args:
+            status: The status code returned to the client
+            duration: The total time in seconds spent handling the request
+            bytes_in: The number of bytes of the request body received
+            bytes_out: The number of bytes of the response sent
+        """
+        self.requests[_STATUS_CLASSES[min(max(status // 100, 1), 5) - 1]] += 1
+        self.latency.observe(duration)
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def observe_upstream(self, duration: float):
+        """Record the time until the target responded with the headers.
+
+        Args:
+            duration: The time in seconds
+        """
+        self.upstream_latency.observe(duration)
+
+    def observe_connection(self, timing: UpstreamTiming):
+        """Record the phases of a request to the target traced by the client.
+
+        Args:
+            timing: The timing of the request
+        """
+        for phase, histogram in self.connection_latency.items():
+            histogram.observe(getattr(timing, phase))
+        self.connections["reused" if timing.reused else "new"] += 1
+
+    def observe_phase(self, phase: str, duration: float):
+        """Record the time spent in the middlewares of a phase.
+
+        Args:
+            phase: The name of the middleware phase
+            duration: The time in seconds, before and after the yield combined
+        """
+        histogram = self.phase_latency.get(phase)
+        if histogram is None:
+            histogram = self.phase_latency[phase] = Histogram(self._buckets)
+        histogram.observe(duration)
+
+    def observe_message(self, direction: str):
+        """Record a proxied websocket message.
+
+        Args:
+            direction: The direction of the message
+        """
+        self.websocket_messages[direction] = (
+            self.websocket_messages.get(direction, 0) + 1
+        )
+
+
+class ProxyMetrics:
+    """Collection of the metrics of all targets, exposed in the Prometheus text format.
+
+    ```python
+    metrics = ProxyMetrics()
+    handler = HTTPProxyHandler(context=ctx, metrics=metrics.target("inventory"))
+    metrics.setup(app)  # Serves the metrics on /metrics
+    ```
+
+    Args:
+        buckets: The bucket bounds of the latency histograms, in seconds.
+        namespace: The prefix of the metric names.
+    """
+
+    def __init__(
+        self, buckets: Sequence[float] = DEFAULT_BUCKETS, namespace: str = "aiorp"
+    ):
+        self.buckets = buckets
+        self.namespace = namespace
+        self._targets: Dict[str, TargetMetrics] = {}
+
+    def target(self, name: str) -> TargetMetrics:
+        """Get the metrics of a target, creating them on first use.
+
+        Args:
+            name: The name of the target
+
+        Returns:
+            The metrics of the target
+        """
+        metrics = self._targets.get(name)
+        if metrics is None:
+            metrics = self._targets[name] = TargetMetrics(name, self.buckets)
+        return metrics
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            The metrics
+        """
+        lines: List[str] = []
+        targets = list(self._targets.values())
+
+        def _header(name: str, kind: str, help_text: str) -> str:
+            lines.append(f"# HELP {self.namespace}_{name} {help_text}")
+            lines.append(f"# TYPE {self.namespace}_{name} {kind}")
+            return f"{self.namespace}_{name}"
+
+        def _histogram(name: str, labels: str, histogram: Histogram):
+            for bound, count in histogram.cumulative():
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {_format_value(histogram.sum)}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        name = _header("requests_total", "counter", "Proxied requests by status class.")
+        for t in targets:
+            for status, count in t.requests.items():
+                lines.append(f'{name}{{{_labels(t)},status="{status}"}} {count}')
+
+        name = _header(
+            "request_duration_seconds", "histogram", "Total time handling requests."
+        )
+        for t in targets:
+            _histogram(name, _labels(t), t.latency)
+
+        name = _header(
+            "upstream_duration_seconds",
+            "histogram",
+            "Time until the target responded with the headers.",
+        )
+        for t in targets:
+            _histogram(name, _labels(t), t.upstream_latency)
+
+        name = _header(
+            "upstream_phase_duration_seconds",
+            "histogram",
+            "Time spent in each phase of the requests to the target, "
+            "when traced by the client.",
+        )
+        for t in targets:
+            if t.connections["new"] or t.connections["reused"]:
+                for phase, histogram in t.connection_latency.items():
+                    _histogram(name, f'{_labels(t)},phase="{phase}"', histogram)
+
+        name = _header(
+            "upstream_connections_total",
+            "counter",
+            "Requests to the target by new or reused connection.",
+        )
+        for t in targets:
+            for kind, count in t.connections.items():
+                lines.append(f'{name}{{{_labels(t)},connection="{kind}"}} {count}')
+
+        name = _header(
+            "middleware_duration_seconds",
+            "histogram",
+            "Time spent in the middlewares of each phase.",
+        )
+        for t in targets:
+            for phase, histogram in t.phase_latency.items():
+                _histogram(name, f'{_labels(t)},phase="{_escape(phase)}"', histogram)
+
+        name = _header("request_bytes_total", "counter", "Bytes received from clients.")
+        for t in targets:
+            lines.append(f"{name}{{{_labels(t)}}} {t.bytes_in}")
+
+        name = _header("response_bytes_total", "counter", "Bytes sent to clients.")
+        for t in targets:
+            lines.append(f"{name}{{{_labels(t)}}} {t.bytes_out}")
+
+        name = _header("websockets_active", "gauge", "Websockets currently proxied.")
+        for t in targets:
+            lines.append(f"{name}{{{_labels(t)}}} {t.websockets_active}")
+
+        name = _header(
+            "websocket_messages_total", "counter", "Proxied websocket messages."
+        )
+        for t in targets:
+            for direction, count in t.websocket_messages.items():
+                lines.append(
+                    f'{name}{{{_labels(t)},direction="{_escape(direction)}"}} {count}'
+                )
+
+        return "\n".join(lines) + "\n"
+
+    async def handler(self, request: web.Request) -> web.Response:
+        """Serve the metrics.
+
+        Args:
+            request: The incoming request
+
+        Returns:
+            The response with the rendered metrics
+        """
+        return web.Response(
+            text=self.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    def setup(self, app: web.Application, path: str = "/metrics"):
+        """Register the metrics endpoint with the application.
+
+        Args:
+            app: The application to register the endpoint with
+            path: The path to serve the metrics on
+        """
+        app.router.add_get(path, self.handler)
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(target: TargetMetrics) -> str:
+    return f'target="{_escape(target.name)}"'
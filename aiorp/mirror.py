@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import random
+from typing import Any, Set
+
+from aiohttp import ClientTimeout, web
+from yarl import URL
+
+from aiorp.context import ProxyContext
+
+logger = logging.getLogger(__name__)
+
+
+#  pylint: disable=too-many-instance-attributes
+class Mirror:
+    """Copies a share of the proxied requests to a shadow target.
+
+    The copies are sent in the background and their responses are discarded, so
+    the shadow target never delays or fails the requests of the clients. When
+    `max_in_flight` copies are already waiting for the shadow target, new ones are
+    dropped and counted in `dropped`.
+
+    ```python
+    mirror = Mirror(ProxyContext(url=URL("http://shop-v2:8080")), fraction=0.1)
+    handler.target_edge(mirror.mirror)
+    configure_contexts(app, [ctx, mirror.context])
+    mirror.setup(app)  # Cancels the copies in flight on shutdown
+    ```
+
+    Register the middleware in the target edge phase, so the copies are sent as
+    modified by the other middlewares.
+
+    Args:
+        context: The context of the shadow target, its URL replaces the target URL
+            of the requests.
+        fraction: Share of the requests to copy.
+        max_in_flight: Maximum number of copies waiting for the shadow target.
+        timeout: Maximum time in seconds to wait for the shadow target.
+    """
+
+    def __init__(
+        self,
+        context: ProxyContext,
+        fraction: float = 1.0,
+        max_in_flight: int = 100,
+        timeout: float = 10.0,
+    ):
+        self.context = context
+        self.fraction = fraction
+        self.max_in_flight = max_in_flight
+        self.timeout = ClientTimeout(total=timeout)
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        """The number of copies waiting for the shadow target"""
+        return len(self._tasks)
+
+    async def mirror(self, ctx: ProxyContext):
+        """The mirroring middleware, register it in the target edge phase.
+
+        Args:
+            ctx: The proxy context of the request
+        """
+        if random.random() < self.fraction:
+            if len(self._tasks) >= self.max_in_flight:
+                self.dropped += 1
+            else:
+                # The body is cached by the request, the target gets it as well
+                await ctx.request.load_content()
+                self._start(ctx)
+        yield
+
+    def _start(self, ctx: ProxyContext):
+        request = ctx.request
+        headers = request.headers.copy()
+        headers["Host"] = self.context.url.host or ""
+        task = asyncio.create_task(
+            self._send(
+                request.method,
+                self.context.url.with_path(request.url.path),
+                params=dict(request.params),
+                headers=headers,
+                data=request.content,
+                timeout=self.timeout,
+            )
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, method: str, url: URL, **options: Any):
+        try:
+            async with self.context.session.request(method, url, **options) as resp:
+                await resp.read()
+            self.sent += 1
+        except Exception as e:  # pylint: disable=broad-except
+            self.failed += 1
+            logger.debug("Failed to mirror %s %s: %r", method, url, e)
+
+    async def close(self):
+        """Cancel the copies in flight."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def setup(self, app: web.Application):
+        """Cancel the copies in flight when the application shuts down.
+
+        Args:
+            app: The application the mirror is used in
+        """
+
+        async def _shutdown(_):
+            await self.close()
+
+        app.on_shutdown.append(_shutdown)
@@ -0,0 +1,305 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Hashable, List
+
+from aiohttp import web
+
+from aiorp.context import ProxyContext
+from aiorp.http_handler import ProxyMiddleware
+from aiorp.shared import SharedTable
+
+KeyFunc = Callable[[ProxyContext], Hashable | None]
+Clock = Callable[[], float]
+
+
+class RateLimitBackend(ABC):
+    """Interface of the stores keeping the rate limiting state.
+
+    The in-memory backends keep the state per process, or in a `SharedTable` to
+    share the limits between worker processes. Implement this interface to share
+    the limits through an external store.
+    """
+
+    @abstractmethod
+    async def acquire(self, key: Hashable, cost: int = 1) -> float:
+        """Take `cost` units from the limit of the key.
+
+        Args:
+            key: The key to limit, e.g. the client address
+            cost: The number of units the request costs
+
+        Returns:
+            0 if the request is allowed, otherwise the number of seconds
+            after which it would be.
+        """
+
+
+class _InMemoryBackend(RateLimitBackend):
+    """Base of the in-memory backends.
+
+    The entries are kept in the order they were last updated, with the time of the
+    update as their first item. Entries idle for longer than `ttl` are in the same
+    state as new ones, so they are evicted from the front on every update.
+
+    With a shared table, the entries are kept in the table instead, which expires
+    them after `ttl` the same way.
+    """
+
+    # The number of values of an entry
+    _width: int
+
+    def __init__(self, ttl: float, clock: Clock, store: SharedTable | None):
+        if store is not None and store.width < self._width:
+            raise ValueError(
+                f"{type(self).__name__} requires a table of {self._width} values per key"
+            )
+        self._ttl = ttl
+        self._clock = clock
+        self._store = store
+        self._entries: OrderedDict[Hashable, List[float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: Hashable, now: float) -> List[float] | None:
+        self._evict(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _evict(self, now: float):
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if entry[0] + self._ttl > now:
+                return
+            del entries[key]
+
+    @abstractmethod
+    def _new_entry(self, now: float) -> List[float]:
+        """The entry of a key seen for the first time, or idle for longer than `ttl`.
+
+        Args:
+            now: The current time
+        """
+
+    @abstractmethod
+    def _take(self, entry: List[float], now: float, cost: int) -> float:
+        """Take `cost` units from the entry, updating it in place.
+
+        Args:
+            entry: The entry of the key
+            now: The current time
+            cost: The number of units the request costs
+
+        Returns:
+            0 if the request is allowed, otherwise the number of seconds
+            after which it would be.
+        """
+
+    async def acquire(self, key: Hashable, cost: int = 1) -> float:
+        now = self._clock()
+        if self._store is not None:
+            with self._store.entry(key, ttl=self._ttl) as entry:
+                if not entry:
+                    entry[:] = self._new_entry(now)
+                return self._take(entry, now, cost)
+
+        entry = self._get(key, now)
+        if entry is None:
+            entry = self._entries[key] = self._new_entry(now)
+        return self._take(entry, now, cost)
+
+
+class TokenBucket(_InMemoryBackend):
+    """Token bucket limits, allowing bursts on top of a sustained rate.
+
+    Every key gets a bucket of `burst` tokens refilled at `rate` tokens per second,
+    and each request takes `cost` tokens out of it.
+
+    Args:
+        rate: Number of tokens added to the bucket per second.
+        burst: Capacity of the bucket.
+        clock: Optional monotonic clock returning the time in seconds.
+        store: Optional table shared by the worker processes to keep the buckets in,
+            holding at least 2 values per key.
+    """
+
+    _width = 2
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        clock: Clock = time.monotonic,
+        store: SharedTable | None = None,
+    ):
+        if rate <= 0 or burst <= 0:
+            raise ValueError("Rate and burst of the token bucket must be positive")
+        # A bucket left alone for burst / rate seconds is full again
+        super().__init__(ttl=burst / rate, clock=clock, store=store)
+        self.rate = rate
+        self.burst = burst
+
+    def _new_entry(self, now: float) -> List[float]:
+        return [now, float(self.burst)]
+
+    def _take(self, entry: List[float], now: float, cost: int) -> float:
+        entry[1] = min(self.burst, entry[1] + (now - entry[0]) * self.rate)
+        entry[0] = now
+        if entry[1] < cost:
+            return (cost - entry[1]) / self.rate
+        entry[1] -= cost
+        return 0.0
+
+
+class SlidingWindow(_InMemoryBackend):
+    """Sliding window limits, allowing `limit` units within any `window` seconds.
+
+    The window is approximated from the counts of the current and the previous
+    fixed window, weighting the previous count by its overlap with the sliding window.
+    This keeps the state of a key at three numbers, regardless of the limit.
+
+    Args:
+        limit: Number of units allowed within the window.
+        window: Length of the window in seconds.
+        clock: Optional monotonic clock returning the time in seconds.
+        store: Optional table shared by the worker processes to keep the windows in,
+            holding at least 3 values per key.
+    """
+
+    _width = 3
+
+    def __init__(
+        self,
+        limit: int,
+        window: float,
+        clock: Clock = time.monotonic,
+        store: SharedTable | None = None,
+    ):
+        if limit <= 0 or window <= 0:
+            raise ValueError("Limit and window of the sliding window must be positive")
+        # Counts older than the previous window don't contribute anymore
+        super().__init__(ttl=2 * window, clock=clock, store=store)
+        self.limit = limit
+        self.window = window
+
+    def _new_entry(self, now: float) -> List[float]:
+        return [now - now % self.window, 0.0, 0.0]
+
+    def _take(self, entry: List[float], now: float, cost: int) -> float:
+        start = now - now % self.window
+        if entry[0] != start:
+            previous = entry[2] if start - entry[0] == self.window else 0.0
+            entry[:3] = [start, previous, 0.0]
+
+        previous, current = entry[1], entry[2]
+        elapsed = (now - start) / self.window
+        if previous * (1 - elapsed) + current + cost <= self.limit:
+            entry[2] += cost
+            return 0.0
+
+        room = self.limit - current - cost
+        if room >= 0 and previous:
+            # Wait for the weight of the previous window to drop enough
+            return (1 - room / previous - elapsed) * self.window
+        return start + self.window - now
+
+
+def by_client_ip(forwarded: bool = False) -> KeyFunc:
+    """Limit by the address of the client.
+
+    Args:
+        forwarded: Use the first address of the X-Forwarded-For header if present,
+            only enable it behind a proxy that sets the header.
+
+    Returns:
+        The key function
+    """
+
+    def _key(ctx: ProxyContext) -> Hashable | None:
+        in_req = ctx.request.in_req
+        if forwarded and (header := in_req.headers.get("X-Forwarded-For")):
+            return header.split(",", 1)[0].strip()
+        return in_req.remote
+
+    return _key
+
+
+def by_header(name: str) -> KeyFunc:
+    """Limit by the value of a request header, e.g. an API key.
+
+    Requests without the header are not limited.
+
+    Args:
+        name: The header name
+
+    Returns:
+        The key function
+    """
+
+    def _key(ctx: ProxyContext) -> Hashable | None:
+        return ctx.request.in_req.headers.get(name)
+
+    return _key
+
+
+def by_state(*path: str) -> KeyFunc:
+    """Limit by a value in the context state, e.g. a JWT claim set by an
+    authentication middleware.
+
+    Requests without the value are not limited.
+
+    Args:
+        *path: The keys leading to the value in the nested state
+
+    Returns:
+        The key function
+    """
+
+    def _key(ctx: ProxyContext) -> Hashable | None:
+        value = ctx.state
+        for item in path:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(item)
+        return value
+
+    return _key
+
+
+def rate_limit(
+    backend: RateLimitBackend,
+    key: KeyFunc | None = None,
+    cost: int = 1,
+) -> ProxyMiddleware:
+    """Build a middleware rejecting requests over the limit.
+
+    Register it in the client edge phase, so requests over the limit are answered
+    with `429 Too Many Requests` before the other middlewares and the target are reached.
+
+    Args:
+        backend: The backend keeping the limits
+        key: Function returning the key to limit the request by, the client address
+            by default. Requests for which it returns None are not limited.
+        cost: The number of units each request costs
+
+    Returns:
+        The middleware function
+    """
+    key = key or by_client_ip()
+
+    async def _rate_limit(ctx: ProxyContext):
+        value = key(ctx)
+        if value is not None:
+            retry_after = await backend.acquire(value, cost)
+            if retry_after > 0:
+                raise web.HTTPTooManyRequests(
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+                )
+        yield
+
+    return _rate_limit
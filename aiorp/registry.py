@@ -0,0 +1,138 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Iterator
+
+from aiohttp import WSCloseCode, web
+
+
+class ConnectionRegistry:
+    """Registry of requests and sockets currently being proxied.
+
+    Handlers register every request they proxy, and websocket handlers additionally
+    register the client socket. On shutdown the registry stops accepting new requests,
+    closes all registered sockets and waits for the in-flight requests to finish.
+    """
+
+    def __init__(self):
+        self.closing = False
+        self._in_flight = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._sockets: set[web.WebSocketResponse] = set()
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests currently being proxied, websockets included"""
+        return self._in_flight
+
+    @property
+    def sockets(self) -> int:
+        """Number of client sockets currently registered"""
+        return len(self._sockets)
+
+    @contextmanager
+    def track_request(self) -> Iterator[None]:
+        """Register a request for the duration of the context.
+
+        Raises:
+            HTTPServiceUnavailable: If the registry is draining.
+        """
+        if self.closing:
+            raise web.HTTPServiceUnavailable(
+                reason="Server is shutting down", headers={"Connection": "close"}
+            )
+        self._in_flight += 1
+        self._drained.clear()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._drained.set()
+
+    @contextmanager
+    def track_socket(self, ws: web.WebSocketResponse) -> Iterator[None]:
+        """Register a client socket for the duration of the context.
+
+        Closing the client socket is enough to end the tunnel, the handler
+        takes care of closing the socket to the target.
+
+        Args:
+            ws: The client socket
+        """
+        self._sockets.add(ws)
+        try:
+            yield
+        finally:
+            self._sockets.discard(ws)
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop accepting requests, close all sockets and wait for requests to finish.
+
+        Args:
+            timeout: Maximum time in seconds to wait for the in-flight requests
+
+        Returns:
+            True if all requests finished in time, False otherwise.
+        """
+        self.closing = True
+        await asyncio.gather(
+            *[
+                ws.close(
+                    code=WSCloseCode.GOING_AWAY,
+                    message=b"Server is shutting down, going away.",
+                )
+                for ws in self._sockets
+                if not ws.closed
+            ],
+            return_exceptions=True,
+        )
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class ConnectionLimit:
+    """Limits the number of websockets proxied at once.
+
+    Share a single limit between the websocket handlers, so the cap holds for the
+    whole proxy whatever the number of routes, and across the handlers rebuilt
+    when the configuration is reloaded.
+
+    Args:
+        max_connections: The maximum number of concurrently proxied sockets.
+
+    Raises:
+        ValueError: If the maximum is lower than 1.
+    """
+
+    def __init__(self, max_connections: int):
+        if max_connections < 1:
+            raise ValueError("The connection limit must be at least 1")
+        self.max_connections = max_connections
+        self._active = 0
+
+    @property
+    def active(self) -> int:
+        """Number of sockets currently holding a slot"""
+        return self._active
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Hold a slot for the duration of the context.
+
+        Raises:
+            HTTPServiceUnavailable: If all slots are taken.
+        """
+        if self._active >= self.max_connections:
+            raise web.HTTPServiceUnavailable(
+                reason="Too many websocket connections",
+                headers={"Retry-After": "1"},
+            )
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
@@ -4,7 +4,10 @@ from aiohttp import web
 from multidict import CIMultiDict
 from yarl import URL
 
+from aiorp.body_limits import BodyReader
 
+
+#  pylint: disable=too-many-instance-attributes
 class ProxyRequest:
     """Proxy request object.
 
@@ -15,6 +18,7 @@ class ProxyRequest:
     Args:
         url: The target server URL.
         in_req: The incoming request object.
+        body_reader: Optional reader enforcing the body limits when loading the content.
     """
 
     HOP_BY_HOP_HEADERS = [
@@ -32,8 +36,11 @@ class ProxyRequest:
         self,
         url: URL,
         in_req: web.Request,
+        body_reader: BodyReader | None = None,
     ):
         self.in_req: web.Request = in_req
+        self.body_reader: BodyReader | None = body_reader
+        self._body: bytes | None = None
         self.url: URL = url
         self.headers: CIMultiDict[str] = CIMultiDict(in_req.headers)
         self.method: str = in_req.method
@@ -77,6 +84,26 @@ class ProxyRequest:
             self.headers["X-Forwarded-For"] = self.in_req.remote
 
     async def load_content(self):
-        """Load the content of the incoming request if it can be read."""
+        """Load the content of the incoming request if it can be read.
+
+        Raises:
+            HTTPRequestEntityTooLarge: If the body is over the limit of the body reader.
+            HTTPServiceUnavailable: If the memory budget of the body reader is exhausted.
+        """
         if self.method in ["POST", "PUT", "PATCH"] and self.in_req.can_read_body:
-            self.content = await self.in_req.read()
+            if self.body_reader is None:
+                self.content = await self.in_req.read()
+                return
+            # The body stream can only be read once, keep it for the next loads
+            if self._body is None:
+                max_size = self.body_reader.limits.max_request_size
+                if max_size is None:
+                    # Keep the limit the application applies when reading the body
+                    max_size = self.in_req.client_max_size or None
+                self._body = await self.body_reader.read(
+                    self.in_req.content,
+                    max_size,
+                    self.in_req.content_length,
+                    lambda size: web.HTTPRequestEntityTooLarge(max_size, size),
+                )
+            self.content = self._body
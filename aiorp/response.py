@@ -1,8 +1,39 @@
+import re
 from enum import Enum
 
-from aiohttp import client, web
+from aiohttp import client, hdrs, web
 from aiohttp.web import Response, StreamResponse
 from multidict import CIMultiDict
+from yarl import URL
+
+from aiorp.body_limits import BodyReader
+from aiorp.request import ProxyRequest
+from aiorp.rewrite import Rewrite, RewriteRules
+
+_REFRESH_URL = re.compile(r"(url\s*=\s*['\"]?)([^'\";]+)", re.IGNORECASE)
+_COOKIE_PATH = re.compile(r"(;\s*path=)([^;]*)", re.IGNORECASE)
+_COOKIE_DOMAIN = re.compile(r"(;\s*domain=)([^;]*)", re.IGNORECASE)
+
+
+def bytes_sent(response: web.StreamResponse) -> int:
+    """The number of bytes of the response sent to the client.
+
+    Streamed responses are counted by what their writer output, the headers
+    included, since their size isn't known upfront. Responses not sent yet are
+    counted by the size of their body.
+
+    Args:
+        response: The response returned to the client
+
+    Returns:
+        The number of bytes, 0 if unknown
+    """
+    if response.prepared:
+        return response.body_length
+    body = getattr(response, "body", None)
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return response.content_length or 0
 
 
 class ResponseType(Enum):
@@ -19,20 +50,36 @@ class ProxyResponse:
     It exposes a method to set the response object which can then be modified before being
     returned to the client.
 
+    When the proxy request is provided, URLs pointing to the target in the `Location`,
+    `Content-Location` and `Refresh` headers, and the `Path` and `Domain` attributes of
+    cookies are mapped back to what the client sees, reversing the rewrite if one is set.
+
     Args:
         in_resp: The incoming response object.
+        request: Optional proxy request the response was received for.
+        rewrite: Optional rewrite applied to the request.
+        body_reader: Optional reader enforcing the body limits when reading the body.
     """
 
     def __init__(
         self,
         in_resp: client.ClientResponse,
+        request: ProxyRequest | None = None,
+        rewrite: Rewrite | RewriteRules | None = None,
+        body_reader: BodyReader | None = None,
     ):
         """Initialize the proxy response object.
 
         Args:
             in_resp: The incoming response object.
+            request: Optional proxy request the response was received for.
+            rewrite: Optional rewrite applied to the request.
+            body_reader: Optional reader enforcing the body limits when reading the body.
         """
         self.in_resp: client.ClientResponse = in_resp
+        self.body_reader: BodyReader | None = body_reader
+        self.request: ProxyRequest | None = request
+        self.rewrite: Rewrite | RewriteRules | None = rewrite
         self._web: web.StreamResponse | None = None
         self._content: bytes | None = None
 
@@ -91,18 +138,18 @@ class ProxyResponse:
         # These headers should not be proxied
         headers.pop("content-length", None)
         headers.pop("content-encoding", None)
-        headers.pop("content-type", None)
+        self._reverse_headers(headers)
 
         stream_resp = StreamResponse(
             status=self.in_resp.status,
             reason=self.in_resp.reason,
-            headers=self.in_resp.headers,
+            headers=headers,
         )
         return stream_resp
 
     async def _get_base_response(self) -> Response:
         """Convert incoming response to base response."""
-        content = await self.in_resp.read()
+        content = await self._read()
 
         headers = CIMultiDict(self.in_resp.headers)
 
@@ -112,6 +159,7 @@ class ProxyResponse:
 
         if content:
             headers["content-length"] = str(len(content))
+        self._reverse_headers(headers)
 
         resp = Response(
             status=self.in_resp.status,
@@ -120,3 +168,99 @@ class ProxyResponse:
             body=content,
         )
         return resp
+
+    async def _read(self) -> bytes:
+        """Read the body of the incoming response, within the limits if set.
+
+        Raises:
+            HTTPBadGateway: If the body is over the limit of the body reader.
+            HTTPServiceUnavailable: If the memory budget of the body reader is exhausted.
+        """
+        if self.body_reader is None:
+            return await self.in_resp.read()
+        try:
+            return await self.body_reader.read(
+                self.in_resp.content,
+                self.body_reader.limits.max_response_size,
+                self.in_resp.content_length,
+                lambda _: web.HTTPBadGateway(reason="Target response too large"),
+            )
+        except web.HTTPException:
+            # Stop receiving the rest of the body
+            self.in_resp.close()
+            raise
+
+    def _reverse_headers(self, headers: CIMultiDict):
+        """Map target URLs and cookie attributes in the headers back to the client.
+
+        Args:
+            headers: The headers to update in place
+        """
+        if self.request is None:
+            return
+        for name in (hdrs.LOCATION, hdrs.CONTENT_LOCATION):
+            if name in headers:
+                headers[name] = self._reverse_url(headers[name])
+        if "Refresh" in headers:
+            headers["Refresh"] = _REFRESH_URL.sub(
+                lambda m: m.group(1) + self._reverse_url(m.group(2).strip()),
+                headers["Refresh"],
+            )
+        if hdrs.SET_COOKIE in headers:
+            for cookie in headers.popall(hdrs.SET_COOKIE):
+                headers.add(hdrs.SET_COOKIE, self._reverse_cookie(cookie))
+
+    def _reverse_url(self, value: str) -> str:
+        """Map a URL sent by the target to the URL the client should use.
+
+        Absolute URLs are only changed if they point to the target, in which
+        case they are pointed to the proxy instead.
+
+        Args:
+            value: The URL from the header
+
+        Returns:
+            The mapped URL.
+        """
+        url = URL(value)
+        if url.is_absolute():
+            # The target may build URLs from the Host header it received
+            target = self.request.url
+            if url.host != target.host or (
+                url.port != target.port
+                and url.raw_authority != self.request.headers.get(hdrs.HOST)
+            ):
+                return value
+            url = self.request.in_req.url.origin().join(url.relative())
+        path = self._reverse_path(url.path) if url.path.startswith("/") else None
+        if path is not None:
+            url = url.with_path(path).with_query(url.query).with_fragment(url.fragment)
+        return str(url)
+
+    def _reverse_cookie(self, cookie: str) -> str:
+        """Map the Path and Domain attributes of a Set-Cookie header to the client.
+
+        Args:
+            cookie: The Set-Cookie header value
+
+        Returns:
+            The mapped Set-Cookie header value.
+        """
+
+        def _path(match: re.Match) -> str:
+            path = self._reverse_path(match.group(2).strip())
+            return match.group(0) if path is None else match.group(1) + path
+
+        def _domain(match: re.Match) -> str:
+            domain = match.group(2).strip().lstrip(".")
+            if domain.lower() != (self.request.url.host or "").lower():
+                return match.group(0)
+            return match.group(1) + (self.request.in_req.url.host or "")
+
+        cookie = _COOKIE_PATH.sub(_path, cookie)
+        return _COOKIE_DOMAIN.sub(_domain, cookie)
+
+    def _reverse_path(self, path: str) -> str | None:
+        if self.rewrite is None:
+            return None
+        return self.rewrite.reverse_path(path)
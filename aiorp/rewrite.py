@@ -1,37 +1,328 @@
+import re
+from heapq import merge
+from typing import List, Mapping
+
 import yarl
 
+from aiorp.request import ProxyRequest
+from aiorp.trie import PathTrie
+
+_REGEX_SPECIAL = set(".^$*+?{}[]\\|()")
+_REGEX_QUANTIFIERS = set("*+?{")
+
 
 class Rewrite:
     """Specifies a rewrite configuration for rewriting URL paths.
 
     This class defines a path rewriting rule that can be used to modify
     the path of incoming requests before they are proxied.
+    It replaces every occurrence of `rfrom` in the path, for anchored rewrites
+    see `PrefixRewrite` and `RegexRewrite`.
 
     Args:
         rfrom: The path pattern to match and replace.
         rto: The replacement path pattern.
-
-    Raises:
-        ValueError: If only one of rfrom or rto is provided.
+        host: Optional value of the Host header to send when the rule matches.
+        query: Optional query parameters to set when the rule matches,
+            parameters set to None are removed.
     """
 
-    def __init__(self, rfrom: str, rto: str):
+    def __init__(
+        self,
+        rfrom: str,
+        rto: str,
+        host: str | None = None,
+        query: Mapping[str, str | None] | None = None,
+    ):
         """Initialize the rewrite configuration.
 
         Args:
             rfrom: The path pattern to match and replace.
             rto: The replacement path pattern.
-
-        Raises:
-            ValueError: If only one of rfrom or rto is provided.
+            host: Optional value of the Host header to send when the rule matches.
+            query: Optional query parameters to set when the rule matches.
         """
         self.rfrom = rfrom
         self.rto = rto
+        self.host = host
+        self.query = dict(query) if query else None
+
+    @property
+    def index_prefix(self) -> str:
+        """The path prefix every path matched by the rule starts with.
+
+        Used to index the rule in `RewriteRules`, the root matches any path.
+        """
+        return "/"
+
+    def rewrite_path(self, path: str) -> str | None:
+        """Rewrite the path if the rule matches it.
+
+        Args:
+            path: The path to rewrite
+
+        Returns:
+            The rewritten path, or None if the rule doesn't match.
+        """
+        if self.rfrom not in path:
+            return None
+        return path.replace(self.rfrom, self.rto)
+
+    def reverse_path(self, path: str) -> str | None:
+        """Map a target path back to the path the client would request.
+
+        Used to rewrite paths in response headers like `Location` or `Set-Cookie`.
+        Replacing every occurrence can't be reversed reliably, e.g. with `rto="/"`,
+        so this rule never reverses paths, see `PrefixRewrite` and `RegexRewrite`.
+
+        Args:
+            path: The target path
+
+        Returns:
+            The client path, or None if the rule can't be reversed for the path.
+        """
+        return None
 
-    def execute(self, url: yarl.URL):
+    def execute(self, url: yarl.URL) -> yarl.URL:
         """Rewrite the path of the request URL from current to new value.
 
         Args:
             url: The url to apply the rewrite to
         """
-        return url.with_path(url.path.replace(self.rfrom, self.rto))
+        path = self.rewrite_path(url.path)
+        if path is None:
+            return url
+        return url.with_path(path)
+
+    def apply(self, request: ProxyRequest) -> bool:
+        """Rewrite the path, host and query parameters of the proxy request.
+
+        Args:
+            request: The proxy request to rewrite
+
+        Returns:
+            True if the rule matched, False otherwise.
+        """
+        path = self.rewrite_path(request.url.path)
+        if path is None:
+            return False
+        self._update_request(request, path)
+        return True
+
+    def _update_request(self, request: ProxyRequest, path: str):
+        """Update the proxy request with the rewritten path, host and query.
+
+        Args:
+            request: The proxy request to update
+            path: The rewritten path
+        """
+        request.url = request.url.with_path(path)
+        if self.host is not None:
+            request.headers["Host"] = self.host
+        if self.query:
+            for key, value in self.query.items():
+                if value is None:
+                    request.params.pop(key, None)
+                else:
+                    request.params[key] = value
+
+
+class PrefixRewrite(Rewrite):
+    """Rewrites the path prefix, matching on path segment boundaries.
+
+    `PrefixRewrite("/api", "/v1")` rewrites `/api/users` to `/v1/users`,
+    but leaves `/api-docs` and `/v2/api` untouched.
+
+    Args:
+        prefix: The path prefix to match.
+        replacement: The prefix to replace it with, an empty string strips the prefix.
+        host: Optional value of the Host header to send when the rule matches.
+        query: Optional query parameters to set when the rule matches,
+            parameters set to None are removed.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        replacement: str,
+        host: str | None = None,
+        query: Mapping[str, str | None] | None = None,
+    ):
+        super().__init__(
+            rfrom=prefix.rstrip("/"),
+            rto=replacement.rstrip("/"),
+            host=host,
+            query=query,
+        )
+
+    @property
+    def index_prefix(self) -> str:
+        return self.rfrom or "/"
+
+    def rewrite_path(self, path: str) -> str | None:
+        if not path.startswith(self.rfrom):
+            return None
+        rest = path[len(self.rfrom) :]
+        if rest and not rest.startswith("/"):
+            return None
+        return (self.rto + rest) or "/"
+
+    def reverse_path(self, path: str) -> str | None:
+        if not path.startswith(self.rto):
+            return None
+        rest = path[len(self.rto) :]
+        if rest and not rest.startswith("/"):
+            return None
+        if rest == "/" and not self.rto:
+            rest = ""
+        return (self.rfrom + rest) or "/"
+
+
+class RegexRewrite(Rewrite):
+    """Rewrites the path using a precompiled regular expression.
+
+    The first match of the pattern is replaced, and the replacement can reference
+    capture groups, e.g. `RegexRewrite(r"^/users/(\\d+)", r"/accounts/\\1")`.
+    Regular expressions can't be reversed automatically, so a reverse pattern and
+    replacement have to be provided for rewriting paths in response headers.
+
+    Args:
+        pattern: The regular expression to match.
+        replacement: The replacement, as accepted by `re.sub`.
+        host: Optional value of the Host header to send when the rule matches.
+        query: Optional query parameters to set when the rule matches,
+            parameters set to None are removed.
+        reverse: Optional pattern and replacement mapping target paths back
+            to client paths.
+    """
+
+    def __init__(
+        self,
+        pattern: str | re.Pattern,
+        replacement: str,
+        host: str | None = None,
+        query: Mapping[str, str | None] | None = None,
+        reverse: tuple[str | re.Pattern, str] | None = None,
+    ):
+        self.pattern = re.compile(pattern)
+        self.reverse = (re.compile(reverse[0]), reverse[1]) if reverse else None
+        super().__init__(
+            rfrom=self.pattern.pattern, rto=replacement, host=host, query=query
+        )
+
+    @property
+    def index_prefix(self) -> str:
+        # Only patterns anchored to the start of the path have a known prefix,
+        # take the full segments of its leading literal part. Alternatives and
+        # flags changing how literals match make any prefix unreliable.
+        pattern = self.pattern.pattern
+        if (
+            not pattern.startswith("^")
+            or "|" in pattern
+            or self.pattern.flags & (re.IGNORECASE | re.VERBOSE)
+        ):
+            return "/"
+        literal = ""
+        for char in pattern[1:]:
+            if char in _REGEX_SPECIAL:
+                if char in _REGEX_QUANTIFIERS:
+                    # The quantifier applies to the last character, e.g. `/?`
+                    literal = literal[:-1]
+                break
+            literal += char
+        return literal[: literal.rfind("/") + 1] or "/"
+
+    def rewrite_path(self, path: str) -> str | None:
+        path, count = self.pattern.subn(self.rto, path, count=1)
+        if not count:
+            return None
+        return path
+
+    def reverse_path(self, path: str) -> str | None:
+        if self.reverse is None:
+            return None
+        pattern, replacement = self.reverse
+        path, count = pattern.subn(replacement, path, count=1)
+        if not count:
+            return None
+        return path
+
+
+class RewriteRules:
+    """An ordered list of rewrite rules, of which the first matching one is applied.
+
+    Rules are indexed by their path prefix, so only the rules which can
+    match the path are evaluated, keeping the cost of a rewrite flat as the
+    number of rules grows.
+
+    Args:
+        rules: The rewrite rules, in order of priority.
+    """
+
+    def __init__(self, rules: List[Rewrite]):
+        self.rules = list(rules)
+        self._trie: PathTrie[int] = PathTrie()
+        for index, rule in enumerate(self.rules):
+            self._trie.insert(rule.index_prefix, index)
+
+    def match(self, path: str) -> Rewrite | None:
+        """Find the first rule matching the path.
+
+        Args:
+            path: The path to match
+
+        Returns:
+            The first matching rule, or None if no rule matches.
+        """
+        matched = self._first_match(path)
+        return matched[0] if matched else None
+
+    def _first_match(self, path: str) -> tuple[Rewrite, str] | None:
+        for index in merge(*self._trie.walk(path)):
+            rule = self.rules[index]
+            rewritten = rule.rewrite_path(path)
+            if rewritten is not None:
+                return rule, rewritten
+        return None
+
+    def reverse_path(self, path: str) -> str | None:
+        """Map a target path back to the client path with the first reversible rule.
+
+        Args:
+            path: The target path
+
+        Returns:
+            The client path, or None if no rule can be reversed for the path.
+        """
+        for rule in self.rules:
+            reversed_path = rule.reverse_path(path)
+            if reversed_path is not None:
+                return reversed_path
+        return None
+
+    def execute(self, url: yarl.URL) -> yarl.URL:
+        """Rewrite the path of the URL with the first matching rule.
+
+        Args:
+            url: The url to apply the rewrite to
+        """
+        matched = self._first_match(url.path)
+        if matched is None:
+            return url
+        return url.with_path(matched[1])
+
+    def apply(self, request: ProxyRequest) -> bool:
+        """Rewrite the proxy request with the first matching rule.
+
+        Args:
+            request: The proxy request to rewrite
+
+        Returns:
+            True if a rule matched, False otherwise.
+        """
+        matched = self._first_match(request.url.path)
+        if matched is None:
+            return False
+        rule, path = matched
+        rule._update_request(request, path)
+        return True
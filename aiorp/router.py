@@ -0,0 +1,158 @@
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Mapping
+
+from aiohttp import web
+
+from aiorp.trie import PathTrie
+
+ProxyHandler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+@dataclass
+class ProxyRoute:
+    """A route of the proxy router
+
+    Args:
+        prefix: The path prefix to match, on path segment boundaries.
+        handler: The handler requests matching the route are passed to.
+        host: Optional host the route is restricted to. Routes without a host
+            match requests for any host.
+    """
+
+    prefix: str
+    handler: ProxyHandler
+    host: str | None = None
+
+
+class _RouteTable:
+    """Routes indexed by host and path prefix"""
+
+    def __init__(self, routes: Iterable[ProxyRoute]):
+        self.routes: list[ProxyRoute] = []
+        self._tries: dict[str | None, PathTrie[ProxyRoute]] = {}
+        self._keys: set[tuple[str | None, tuple[str, ...]]] = set()
+        for route in routes:
+            self.add(route)
+
+    def add(self, route: ProxyRoute):
+        host = route.host.lower() if route.host else None
+        key = (host, tuple(PathTrie.split(route.prefix)))
+        if key in self._keys:
+            raise ValueError(
+                f"Route for prefix {route.prefix!r} and host {route.host!r} "
+                "is already registered"
+            )
+        self._keys.add(key)
+        self._tries.setdefault(host, PathTrie()).insert(route.prefix, route)
+        self.routes.append(route)
+
+    def resolve(self, host: str | None, path: str) -> ProxyRoute | None:
+        if host is not None and (trie := self._tries.get(host.lower())):
+            if routes := trie.longest(path):
+                return routes[0]
+        if trie := self._tries.get(None):
+            if routes := trie.longest(path):
+                return routes[0]
+        return None
+
+
+class ProxyRouter:
+    """Routes requests to proxy handlers by path prefix and host.
+
+    The routes are matched with a trie of path segments, so the cost of routing a
+    request depends on the depth of the path and not the number of routes. The route
+    with the longest matching prefix wins, and routes registered for the request host
+    take precedence over routes for any host.
+
+    The router is a request handler itself, it can be registered as a catch-all
+    route with `setup`. The routes can be replaced at runtime with `reload`.
+
+    Args:
+        routes: Optional mapping of path prefixes to handlers, or a list of routes.
+    """
+
+    def __init__(
+        self,
+        routes: Mapping[str, ProxyHandler] | Iterable[ProxyRoute] | None = None,
+    ):
+        self._table = _RouteTable(self._to_routes(routes or []))
+
+    @staticmethod
+    def _to_routes(
+        routes: Mapping[str, ProxyHandler] | Iterable[ProxyRoute],
+    ) -> Iterable[ProxyRoute]:
+        if isinstance(routes, Mapping):
+            return [ProxyRoute(prefix, handler) for prefix, handler in routes.items()]
+        return routes
+
+    @property
+    def routes(self) -> list[ProxyRoute]:
+        """The currently registered routes"""
+        return list(self._table.routes)
+
+    def add(self, prefix: str, handler: ProxyHandler, host: str | None = None):
+        """Register a route.
+
+        Args:
+            prefix: The path prefix to match.
+            handler: The handler to pass the matching requests to.
+            host: Optional host to restrict the route to.
+
+        Raises:
+            ValueError: If a route with the same prefix and host is already registered.
+        """
+        self._table.add(ProxyRoute(prefix=prefix, handler=handler, host=host))
+
+    def reload(self, routes: Mapping[str, ProxyHandler] | Iterable[ProxyRoute]):
+        """Replace all routes at once.
+
+        The new routing table is built before replacing the current one, so
+        requests are never routed with a partially built table.
+
+        Args:
+            routes: Mapping of path prefixes to handlers, or a list of routes.
+
+        Raises:
+            ValueError: If the routes contain duplicates.
+        """
+        self._table = _RouteTable(self._to_routes(routes))
+
+    def resolve(self, request: web.Request) -> ProxyRoute | None:
+        """Find the route for the request.
+
+        Args:
+            request: The incoming request
+
+        Returns:
+            The matching route, or None if no route matches.
+        """
+        return self._table.resolve(request.url.host, request.path)
+
+    async def __call__(self, request: web.Request) -> web.StreamResponse:
+        """Pass the request to the handler of the matching route.
+
+        Args:
+            request: The incoming request
+
+        Returns:
+            The response of the route handler.
+
+        Raises:
+            HTTPNotFound: If no route matches the request.
+        """
+        route = self.resolve(request)
+        if route is None:
+            raise web.HTTPNotFound()
+        return await route.handler(request)
+
+    def setup(self, app: web.Application, path: str = "/{tail:.*}"):
+        """Register the router as a catch-all route of the application.
+
+        Register it after the other routes of the application,
+        since aiohttp matches routes in the order they were added.
+
+        Args:
+            app: The application to register the router with
+            path: The path pattern of the route, matches everything by default
+        """
+        app.router.add_route("*", path, self)
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict
+
+from aiohttp import web
+
+from aiorp.workers import AppFactory, WorkerSupervisor
+
+logger = logging.getLogger(__name__)
+
+LoopFactory = Callable[[], asyncio.AbstractEventLoop]
+
+
+#  pylint: disable=too-many-instance-attributes
+@dataclass
+class RunConfig:
+    """Settings of the server running the proxy
+
+    Args:
+        host: The host to listen on
+        port: The port to listen on
+        workers: The number of worker processes, the number of CPUs if None.
+            With more than one, the workers share the port, see `WorkerSupervisor`.
+        uvloop: Run the event loop of uvloop when it's installed
+        backlog: The maximum number of connections waiting to be accepted
+        keepalive_timeout: Seconds an idle keep-alive connection is kept open
+        access_log: Whether to log every request
+        access_log_format: Format of the access log lines, aiohttp's by default
+        reuse_port: Bind with `SO_REUSEPORT`, always enabled with several workers
+        handler_cancellation: Cancel the handler when the client disconnects,
+            which stops proxying the requests of clients that went away
+        shutdown_timeout: Seconds to wait for pending requests on shutdown
+    """
+
+    host: str = "0.0.0.0"
+    port: int = 8080
+    workers: int | None = 1
+    uvloop: bool = True
+    backlog: int = 1024
+    keepalive_timeout: float = 75.0
+    access_log: bool = True
+    access_log_format: str | None = None
+    reuse_port: bool = False
+    handler_cancellation: bool = True
+    shutdown_timeout: float = 60.0
+
+    def run_app_options(self) -> Dict[str, Any]:
+        """Options of `aiohttp.web.run_app` shared by every process
+
+        Returns:
+            The keyword arguments
+        """
+        options: Dict[str, Any] = {
+            "backlog": self.backlog,
+            "keepalive_timeout": self.keepalive_timeout,
+            "handler_cancellation": self.handler_cancellation,
+        }
+        if not self.access_log:
+            options["access_log"] = None
+        elif self.access_log_format is not None:
+            options["access_log_format"] = self.access_log_format
+        return options
+
+
+def loop_factory(use_uvloop: bool = True) -> LoopFactory | None:
+    """Get the function creating the fastest event loop available.
+
+    Args:
+        use_uvloop: Whether to use uvloop when it's installed
+
+    Returns:
+        `uvloop.new_event_loop`, or None for the default asyncio loop
+    """
+    if not use_uvloop:
+        return None
+    try:
+        import uvloop  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        logger.debug("uvloop isn't installed, using the asyncio event loop")
+        return None
+    return uvloop.new_event_loop
+
+
+def run(app: web.Application | AppFactory, config: RunConfig | None = None):
+    """Run the proxy application until interrupted.
+
+    Applies the same server settings to every service: the event loop, the listen
+    backlog, keep-alive, access logging and handler cancellation. With several
+    workers, the application runs in supervised worker processes sharing the port.
+
+    Args:
+        app: The application, or a function building it. Use a function with
+            several workers, so every worker builds its own application.
+        config: The server settings, `RunConfig` defaults if not given
+    """
+    config = config or RunConfig()
+    new_loop = loop_factory(config.uvloop)
+
+    if config.workers != 1:
+        WorkerSupervisor(
+            app,
+            host=config.host,
+            port=config.port,
+            workers=config.workers,
+            shutdown_timeout=config.shutdown_timeout,
+            loop_factory=new_loop,
+            **config.run_app_options(),
+        ).run()
+        return
+
+    web.run_app(
+        app if isinstance(app, web.Application) else app(),
+        host=config.host,
+        port=config.port,
+        reuse_port=config.reuse_port,
+        shutdown_timeout=config.shutdown_timeout,
+        loop=new_loop() if new_loop else None,
+        **config.run_app_options(),
+    )
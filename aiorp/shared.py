@@ -0,0 +1,199 @@
+import hashlib
+import math
+import mmap
+import multiprocessing
+import time
+from contextlib import contextmanager
+from typing import Callable, Hashable, Iterator, List
+
+Clock = Callable[[], float]
+
+# Number of consecutive slots a key can be stored in
+_BUCKET_SIZE = 8
+
+
+#  pylint: disable=too-many-instance-attributes
+class SharedTable:
+    """Fixed-size table of numbers shared by the worker processes.
+
+    The table lives in anonymous shared memory, so it must be created before the
+    workers are forked, e.g. before calling `run_workers`, and is then seen by all
+    of them. Every key maps to `width` floats, which can be updated atomically.
+
+    Keys are stored by a 64 bit hash in one of the slots of a small bucket. Entries
+    expire `ttl` seconds after their last update; when all the slots of a bucket hold
+    live entries, the one closest to expiring is evicted, so the table never grows
+    and never fails to store a key.
+
+    Updates lock the bucket of the key with a process shared lock, which is held
+    for the few microseconds of the update and never across an await.
+
+    Args:
+        slots: The number of entries the table can hold, rounded up to a multiple
+            of the bucket size.
+        width: The number of floats stored for every key.
+        locks: The number of locks the buckets are spread over.
+        clock: Optional monotonic clock returning the time in seconds, which must
+            be the same in all the processes.
+    """
+
+    def __init__(
+        self,
+        slots: int = 65536,
+        width: int = 3,
+        locks: int = 64,
+        clock: Clock = time.monotonic,
+    ):
+        if slots <= 0 or width <= 0 or locks <= 0:
+            raise ValueError("Slots, width and locks of the table must be positive")
+        self.width = width
+        self._buckets = math.ceil(slots / _BUCKET_SIZE)
+        self.slots = self._buckets * _BUCKET_SIZE
+        self._clock = clock
+        # Every slot holds the hash of the key, its expiry time and the values
+        self._stride = 2 + width
+        self._mmap = mmap.mmap(-1, self.slots * self._stride * 8)
+        self._hashes = memoryview(self._mmap).cast("Q")
+        self._floats = memoryview(self._mmap).cast("d")
+        mp = multiprocessing.get_context("fork")
+        self._locks = [mp.Lock() for _ in range(locks)]
+
+    def __len__(self) -> int:
+        now = self._clock()
+        return sum(
+            1
+            for base in range(0, len(self._floats), self._stride)
+            if self._hashes[base] and self._floats[base + 1] > now
+        )
+
+    @staticmethod
+    def _digest(key: Hashable) -> int:
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+        # Zero marks the empty slots
+        return int.from_bytes(digest, "little") or 1
+
+    def _find(self, digest: int, now: float) -> tuple[int, bool]:
+        """Find the slot of the key, or the slot to store it in.
+
+        Must be called with the lock of the bucket held.
+
+        Returns:
+            The offset of the slot and whether it holds a live entry of the key
+        """
+        hashes, floats, stride = self._hashes, self._floats, self._stride
+        start = digest % self._buckets * _BUCKET_SIZE * stride
+        free = None
+        oldest = start
+        for base in range(start, start + _BUCKET_SIZE * stride, stride):
+            expires = floats[base + 1]
+            if expires <= now:
+                if free is None:
+                    free = base
+            elif hashes[base] == digest:
+                return base, True
+            elif expires < floats[oldest + 1]:
+                oldest = base
+        return (oldest if free is None else free), False
+
+    @contextmanager
+    def _locked(self, key: Hashable) -> Iterator[tuple[int, int, bool]]:
+        digest = self._digest(key)
+        with self._locks[digest % self._buckets % len(self._locks)]:
+            yield digest, *self._find(digest, self._clock())
+
+    def _store(self, digest: int, base: int, values: List[float], ttl: float | None):
+        floats = self._floats
+        self._hashes[base] = digest
+        floats[base + 1] = math.inf if ttl is None else self._clock() + ttl
+        for index in range(self.width):
+            floats[base + 2 + index] = values[index] if index < len(values) else 0.0
+
+    @contextmanager
+    def entry(self, key: Hashable, ttl: float | None = None) -> Iterator[List[float]]:
+        """Update the values of a key atomically.
+
+        Yields the values of the key, or an empty list if the key isn't stored.
+        The list is stored back when the block exits, unless it's left empty, and
+        the table stays locked for other updates of the key in the meantime:
+
+            with table.entry(key, ttl=60) as entry:
+                if not entry:
+                    entry[:] = [0.0, 0.0]
+                entry[0] += 1
+
+        Args:
+            key: The key to update
+            ttl: Seconds after which the entry expires, never by default
+
+        Yields:
+            The values of the key
+        """
+        with self._locked(key) as (digest, base, found):
+            start = base + 2
+            values = list(self._floats[start : start + self.width]) if found else []
+            try:
+                yield values
+            finally:
+                if values:
+                    self._store(digest, base, values, ttl)
+
+    def add(
+        self,
+        key: Hashable,
+        amount: float = 1.0,
+        index: int = 0,
+        ttl: float | None = None,
+    ) -> float:
+        """Add to a value of a key atomically, starting from 0 for new keys.
+
+        Args:
+            key: The key to update
+            amount: The amount to add, negative to subtract
+            index: The index of the value
+            ttl: Seconds after which the entry expires, never by default
+
+        Returns:
+            The updated value
+        """
+        with self.entry(key, ttl) as entry:
+            if not entry:
+                entry[:] = [0.0] * self.width
+            entry[index] += amount
+            return entry[index]
+
+    def get(self, key: Hashable) -> List[float] | None:
+        """Get the values of a key.
+
+        Args:
+            key: The key
+
+        Returns:
+            The values, or None if the key isn't stored or expired
+        """
+        with self._locked(key) as (_, base, found):
+            if not found:
+                return None
+            return list(self._floats[base + 2 : base + 2 + self.width])
+
+    def set(self, key: Hashable, values: List[float], ttl: float | None = None):
+        """Set the values of a key, missing values are set to 0.
+
+        Args:
+            key: The key
+            values: The values
+            ttl: Seconds after which the entry expires, never by default
+        """
+        if len(values) > self.width:
+            raise ValueError(f"The table holds {self.width} values per key")
+        with self._locked(key) as (digest, base, _):
+            self._store(digest, base, values, ttl)
+
+    def delete(self, key: Hashable):
+        """Remove a key from the table.
+
+        Args:
+            key: The key
+        """
+        with self._locked(key) as (_, base, found):
+            if found:
+                self._floats[base + 1] = 0.0
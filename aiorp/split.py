@@ -0,0 +1,180 @@
+import hashlib
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Mapping
+
+from aiohttp import web
+
+from aiorp.context import ProxyContext
+
+
+@dataclass
+class SplitTarget:
+    """A target of a traffic split
+
+    Args:
+        name: The name of the target, used to force it with the override header.
+        context: The context of the target.
+        weight: The relative share of the traffic sent to the target, 0 to only
+            send requests forcing it.
+    """
+
+    name: str
+    context: ProxyContext
+    weight: float
+
+
+class _AliasTable:
+    """Walker's alias table, picking a target by weight in constant time.
+
+    Every column holds the probability of its own target and an alias target
+    receiving the rest of the column, built with Vose's method.
+    """
+
+    def __init__(self, weights: List[float]):
+        count = len(weights)
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError("At least one target must have a positive weight")
+        scaled = [weight * count / total for weight in weights]
+        self.probabilities = [1.0] * count
+        self.aliases = list(range(count))
+        small = [index for index, value in enumerate(scaled) if value < 1]
+        large = [index for index, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        # Leftovers are full columns, up to rounding errors
+
+    def pick(self, point: float) -> int:
+        """Pick the index of a target for a point uniformly distributed in [0, 1)"""
+        point *= len(self.probabilities)
+        column = int(point)
+        if point - column < self.probabilities[column]:
+            return column
+        return self.aliases[column]
+
+
+class TrafficSplit:
+    """Splits the traffic of a handler between weighted targets, e.g. for canaries.
+
+    Without a sticky key, every request picks a target at random by weight. With
+    a header or cookie to hash, requests with the same value always go to the same
+    target as long as the weights don't change, e.g. to keep a user on the canary.
+    Requests without the value are picked at random.
+
+    The override header forces the target by its name, e.g. for testing the canary.
+
+    ```python
+    split = TrafficSplit(
+        [
+            SplitTarget("stable", stable_ctx, weight=95),
+            SplitTarget("canary", canary_ctx, weight=5),
+        ],
+        cookie="session",
+        override_header="X-Target",
+    )
+    handler = HTTPProxyHandler(split=split)
+    configure_contexts(app, split.contexts)
+    ```
+
+    Args:
+        targets: The targets to split the traffic between.
+        header: Optional request header to hash for sticky assignment.
+        cookie: Optional cookie to hash for sticky assignment, when the header
+            isn't set.
+        override_header: Optional request header forcing the target by its name.
+            Unknown names are ignored.
+
+    Raises:
+        ValueError: If there are no targets, the names aren't unique or no
+            weight is positive.
+    """
+
+    def __init__(
+        self,
+        targets: List[SplitTarget],
+        header: str | None = None,
+        cookie: str | None = None,
+        override_header: str | None = None,
+    ):
+        if not targets:
+            raise ValueError("The traffic split requires at least one target")
+        self._targets: Dict[str, SplitTarget] = {}
+        for target in targets:
+            if target.name in self._targets:
+                raise ValueError(f"Target {target.name!r} is defined more than once")
+            if target.weight < 0:
+                raise ValueError(f"Weight of target {target.name!r} is negative")
+            self._targets[target.name] = target
+        self.header = header
+        self.cookie = cookie
+        self.override_header = override_header
+        self._contexts = [target.context for target in targets]
+        self._table = _AliasTable([target.weight for target in targets])
+
+    @property
+    def targets(self) -> List[SplitTarget]:
+        """The targets of the split"""
+        return list(self._targets.values())
+
+    @property
+    def contexts(self) -> List[ProxyContext]:
+        """The contexts of the targets, e.g. to manage them with `configure_contexts`"""
+        return list(self._contexts)
+
+    def set_weights(self, weights: Mapping[str, float]):
+        """Change the weights of some targets, e.g. to advance a rollout.
+
+        The new table is built before replacing the current one, so requests are
+        never split with a partially built table. Keys of sticky requests may
+        move to another target.
+
+        Args:
+            weights: The new weights by target name
+
+        Raises:
+            ValueError: If a target is unknown, a weight is negative or no weight
+                would be positive.
+        """
+        for name, weight in weights.items():
+            if name not in self._targets:
+                raise ValueError(f"Unknown target {name!r}")
+            if weight < 0:
+                raise ValueError(f"Weight of target {name!r} is negative")
+        new_weights = [
+            weights.get(target.name, target.weight) for target in self.targets
+        ]
+        self._table = _AliasTable(new_weights)
+        for target, weight in zip(self.targets, new_weights):
+            target.weight = weight
+
+    def _sticky_point(self, request: web.Request) -> float | None:
+        value = request.headers.get(self.header) if self.header else None
+        if value is None and self.cookie:
+            value = request.cookies.get(self.cookie)
+        if value is None:
+            return None
+        digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+        # 53 bits fit a float exactly, so the point stays below 1
+        return (int.from_bytes(digest, "big") >> 11) / 2**53
+
+    def select(self, request: web.Request) -> ProxyContext:
+        """Select the context of the target to proxy the request to.
+
+        Args:
+            request: The incoming request
+
+        Returns:
+            The context of the selected target
+        """
+        if self.override_header and (name := request.headers.get(self.override_header)):
+            if target := self._targets.get(name):
+                return target.context
+        point = self._sticky_point(request)
+        if point is None:
+            point = random.random()
+        return self._contexts[self._table.pick(point)]
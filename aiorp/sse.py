@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Hashable, Set
+
+from aiohttp import ClientError, ClientTimeout, client, streams
+
+from aiorp.context import ProxyContext
+
+logger = logging.getLogger(__name__)
+
+EVENT_STREAM = "text/event-stream"
+# A comment line, ignored by the clients but keeping the connection busy
+HEARTBEAT = b":\n\n"
+# Requests carrying these are only shared with a key function saying so
+CREDENTIAL_HEADERS = ("Authorization", "Proxy-Authorization", "Cookie")
+
+StreamKey = Callable[[ProxyContext], Hashable | None]
+
+
+def default_stream_key(ctx: ProxyContext) -> Hashable | None:
+    """Share GET streams by target URL, unless the request carries credentials.
+
+    A stream opened with the credentials of a client would otherwise be relayed to
+    clients the target never authorized.
+
+    Args:
+        ctx: The proxy context of the request
+
+    Returns:
+        The target URL, None if the stream can't be shared
+    """
+    request = ctx.request
+    if request.method != "GET":
+        return None
+    if any(header in request.headers for header in CREDENTIAL_HEADERS):
+        return None
+    return str(request.url.with_query(request.params))
+
+
+@dataclass
+class EventStreaming:
+    """Settings for proxying Server-Sent Events and long-polling requests
+
+    Requests of the handler are sent without a total timeout, since streams and
+    long polls stay open for as long as they have something to send, but fail when
+    the target doesn't send anything for `idle_timeout` seconds.
+
+    Responses with the `text/event-stream` content type are streamed to the client
+    event by event as they arrive, instead of being read whole.
+
+    Args:
+        idle_timeout: Seconds without data from the target after which the request
+            fails, or the stream ends. None to wait forever.
+        connect_timeout: Seconds to wait for the connection to the target.
+        heartbeat: Optional interval in seconds for sending a comment to the client
+            when no event was sent, so intermediaries don't close an idle stream.
+        fan_out: Whether clients of the same stream share a single target stream.
+            `Last-Event-ID` of the clients is only sent with the request opening
+            the stream.
+        key: Optional function computing the key streams are shared by from the
+            context, None to not share the stream. Defaults to `default_stream_key`,
+            which shares GET streams by target URL, and never shares the streams of
+            requests with credential headers.
+        queue_size: Maximum number of events waiting to be sent to a single client.
+            A client falling further behind is disconnected.
+    """
+
+    idle_timeout: float | None = 300.0
+    connect_timeout: float | None = 30.0
+    heartbeat: float | None = 15.0
+    fan_out: bool = False
+    queue_size: int = 100
+    key: StreamKey = default_stream_key
+
+    @property
+    def timeout(self) -> ClientTimeout:
+        """The timeout of the requests to the target"""
+        return ClientTimeout(
+            total=None, sock_connect=self.connect_timeout, sock_read=self.idle_timeout
+        )
+
+
+async def read_events(content: streams.StreamReader) -> AsyncIterator[bytes]:
+    """Read a stream of events, yielding every complete event as it arrives.
+
+    Args:
+        content: The body of the target response
+
+    Yields:
+        The raw bytes of each event, the blank line ending it included
+    """
+    event = bytearray()
+    async for line in content:
+        event += line
+        if line in (b"\n", b"\r\n"):
+            yield bytes(event)
+            event.clear()
+    if event:
+        yield bytes(event)
+
+
+class _Subscriber:
+    """A client of an event channel, receiving the events through a queue.
+
+    The queue is bounded by hand so the end of the stream can always be queued.
+
+    Args:
+        queue_size: Maximum number of queued events
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue()
+        self.evicted = False
+
+    def offer(self, event: bytes) -> bool:
+        """Queue an event without waiting.
+
+        Returns:
+            False if the queue was full and the client got evicted, True otherwise.
+        """
+        if self.evicted:
+            return False
+        if self.queue.qsize() >= self.queue_size:
+            self.evicted = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+        self.queue.put_nowait(event)
+        return True
+
+
+class EventChannel:
+    """A single target event stream relayed to one or more clients.
+
+    The events are read by a dedicated task and queued for every subscriber, so
+    a slow client never delays the others. The target response is closed once the
+    stream ends or the last subscriber leaves.
+
+    Args:
+        key: The key of the channel
+        in_resp: The target response streaming the events
+        queue_size: Maximum number of events queued per subscriber
+        on_close: Callback invoked with the channel once it's closed
+    """
+
+    def __init__(
+        self,
+        key: Hashable,
+        in_resp: client.ClientResponse,
+        queue_size: int,
+        on_close: Callable[["EventChannel"], None] | None = None,
+    ):
+        self.key = key
+        self.in_resp = in_resp
+        self.closed = False
+        self._queue_size = queue_size
+        self._on_close = on_close
+        self._subscribers: Set[_Subscriber] = set()
+        self._task = asyncio.create_task(self._relay_events())
+
+    @property
+    def subscribers(self) -> int:
+        """Number of clients subscribed to the channel"""
+        return len(self._subscribers)
+
+    def subscribe(self) -> _Subscriber:
+        """Subscribe a client to the events of the channel.
+
+        Returns:
+            The subscriber, its queue ends with None when the stream ends
+        """
+        subscriber = _Subscriber(self._queue_size)
+        if self.closed:
+            subscriber.queue.put_nowait(None)
+        else:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber):
+        """Remove a client, closing the channel when it was the last one.
+
+        Args:
+            subscriber: The subscriber to remove
+        """
+        self._subscribers.discard(subscriber)
+        if not self._subscribers:
+            self.close()
+
+    def close(self):
+        """Stop relaying the events and close the target response."""
+        if not self.closed:
+            self._task.cancel()
+            self._mark_closed()
+
+    def _mark_closed(self):
+        self.closed = True
+        self.in_resp.close()
+        for subscriber in self._subscribers:
+            subscriber.queue.put_nowait(None)
+        self._subscribers.clear()
+        if self._on_close is not None:
+            self._on_close(self)
+
+    async def _relay_events(self):
+        try:
+            async for event in read_events(self.in_resp.content):
+                for subscriber in list(self._subscribers):
+                    if not subscriber.offer(event):
+                        self._subscribers.discard(subscriber)
+        except (ClientError, asyncio.TimeoutError, ValueError) as e:
+            # Idle timeout, lost connection or an event line over the buffer limit
+            logger.debug("Event stream %s ended: %r", self.key, e)
+        finally:
+            if not self.closed:
+                self._mark_closed()
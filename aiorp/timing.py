@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from aiorp.context import ProxyContext
+
+
+@dataclass
+class MiddlewareTime:
+    """Time spent in a single middleware of the chain.
+
+    Args:
+        name: The name of the middleware function, `proxy` for the request to the target.
+        phase: The phase the middleware was registered in, None for the request
+            to the target.
+        pre: Time in seconds spent in the code before the yield.
+        post: Time in seconds spent in the code after the yield.
+    """
+
+    name: str
+    phase: int | None
+    pre: float = 0.0
+    post: float = 0.0
+
+    @property
+    def total(self) -> float:
+        """Time in seconds spent in the middleware in total"""
+        return self.pre + self.post
+
+
+@dataclass
+class UpstreamTiming:
+    """Time spent in each phase of the request to the target, in seconds.
+
+    Phases that didn't happen stay at 0, e.g. there is no DNS resolution or
+    connecting when a pooled connection is reused. Redirects followed by the
+    session add up.
+
+    Args:
+        queue: Waiting for a free connection in the pool of the session.
+        dns: Resolving the host name, cached resolutions excluded.
+        connect: Establishing a new connection, TLS handshake included.
+        server: From sending the request headers until receiving the response headers.
+        total: From starting the request until receiving the response headers.
+        reused: Whether the request was sent on a pooled connection.
+    """
+
+    queue: float = 0.0
+    dns: float = 0.0
+    connect: float = 0.0
+    server: float = 0.0
+    total: float = 0.0
+    reused: bool = False
+
+
+TimingHook = Callable[["ProxyContext"], None]
+
+
+@dataclass
+class ChainTiming:
+    """Settings for timing the middleware chain of an HTTP handler.
+
+    When set, the time spent in each middleware is stored in `ctx.timings`
+    once the chain has finished.
+
+    Args:
+        server_timing: Whether to report the timings to the client
+            in the `Server-Timing` response header.
+        hook: Optional callable called with the context once the timings are recorded.
+    """
+
+    server_timing: bool = True
+    hook: TimingHook | None = None
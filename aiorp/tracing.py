@@ -0,0 +1,253 @@
+import json
+import logging
+import re
+import secrets
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List
+
+from aiohttp import web
+
+from aiorp.batching import Batcher
+from aiorp.context import ProxyContext
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+_SAMPLED = 0x01
+
+
+#  pylint: disable=too-many-instance-attributes
+@dataclass
+class Span:
+    """A span recorded for a proxied request.
+
+    Args:
+        trace_id: The trace ID, 32 hex characters.
+        span_id: The span ID, 16 hex characters.
+        parent_id: The span ID of the caller, if the request was part of a trace.
+        name: The name of the span.
+        start: Start time as a UNIX timestamp in seconds.
+        end: End time as a UNIX timestamp in seconds, None while in progress.
+        sampled: Whether the span is recorded and exported.
+        error: Whether the request failed.
+        attributes: Additional attributes of the span.
+    """
+
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    start: float
+    end: float | None = None
+    sampled: bool = True
+    error: bool = False
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def traceparent(self) -> str:
+        """The traceparent header value propagating the span"""
+        flags = _SAMPLED if self.sampled else 0
+        return f"00-{self.trace_id}-{self.span_id}-{flags:02x}"
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str, bool] | None:
+    """Parse a W3C traceparent header value.
+
+    Args:
+        value: The header value
+
+    Returns:
+        The trace ID, the parent span ID and the sampled flag, or None if the
+        value is missing or invalid.
+    """
+    if not value:
+        return None
+    match = _TRACEPARENT.match(value.strip())
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags = match.groups()
+    # Version 00 has exactly four fields, later versions may add more
+    if version == "ff" or (version == "00" and len(value.strip()) != 55):
+        return None
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & _SAMPLED)
+
+
+class SpanExporter(ABC):
+    """Interface of the exporters sending the recorded spans to a tracing backend."""
+
+    @abstractmethod
+    async def export(self, spans: List[Span]):
+        """Export a batch of spans.
+
+        Args:
+            spans: The spans to export
+        """
+
+
+class LoggingExporter(SpanExporter):
+    """Exports the spans as JSON log records, mostly useful for debugging.
+
+    Args:
+        logger_name: The name of the logger to log the spans with.
+    """
+
+    def __init__(self, logger_name: str = __name__):
+        self._logger = logging.getLogger(logger_name)
+
+    async def export(self, spans: List[Span]):
+        for span in spans:
+            self._logger.info(json.dumps(asdict(span), default=str))
+
+
+class BatchExporter(Batcher[Span]):
+    """Queues the spans and exports them in batches in the background.
+
+    Adding a span never waits for the exporter. When the queue is full, new spans
+    are dropped and counted in `dropped`.
+
+    Args:
+        exporter: The exporter to send the batches to.
+        max_batch_size: Maximum number of spans exported at once.
+        max_queue_size: Maximum number of spans waiting to be exported.
+        interval: Maximum time in seconds a span waits before being exported.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        max_batch_size: int = 512,
+        max_queue_size: int = 2048,
+        interval: float = 5.0,
+    ):
+        super().__init__(self._export, max_batch_size, max_queue_size, interval)
+        self.exporter = exporter
+
+    async def _export(self, batch: List[Span]):
+        try:
+            await self.exporter.export(batch)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to export %d spans", len(batch))
+
+
+class Tracer:
+    """Records a span for every proxied request and propagates it to the target.
+
+    The incoming `traceparent` header is parsed, and the request is forwarded to the
+    target with the proxy span as the new parent, while `tracestate` is passed on
+    unchanged. Requests without a valid `traceparent` start a new trace.
+
+    ```python
+    tracer = Tracer(LoggingExporter(), sample_rate=0.1)
+    handler.client_edge(tracer.trace)
+    tracer.setup(app)  # Exports the remaining spans on shutdown
+    ```
+
+    The span is stored in the context state, so other middlewares can add attributes
+    to it or log the trace ID.
+
+    Args:
+        exporter: The exporter to send the spans to.
+        sample_rate: Share of the new traces to record. Requests which are part of a
+            trace follow the sampling decision of the caller.
+        name: The name of the spans.
+        state_key: The key of the span in the context state.
+        max_batch_size: Maximum number of spans exported at once.
+        max_queue_size: Maximum number of spans waiting to be exported.
+        export_interval: Maximum time in seconds a span waits before being exported.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        sample_rate: float = 1.0,
+        name: str = "proxy",
+        state_key: str = "span",
+        max_batch_size: int = 512,
+        max_queue_size: int = 2048,
+        export_interval: float = 5.0,
+    ):
+        self.sample_rate = sample_rate
+        self.name = name
+        self.state_key = state_key
+        self.batch = BatchExporter(
+            exporter, max_batch_size, max_queue_size, export_interval
+        )
+
+    def _should_sample(self, trace_id: str) -> bool:
+        # Decide on the trace ID, so every proxy in the trace decides alike
+        return int(trace_id[16:], 16) < self.sample_rate * 2**64
+
+    async def trace(self, ctx: ProxyContext):
+        """The tracing middleware, register it in the client edge phase.
+
+        Args:
+            ctx: The proxy context of the request
+        """
+        headers = ctx.request.headers
+        parent = parse_traceparent(headers.get("traceparent"))
+        if parent is None:
+            # The trace state is meaningless without a valid parent
+            headers.pop("tracestate", None)
+            trace_id = secrets.token_hex(16)
+            parent_id, sampled = None, self._should_sample(trace_id)
+        else:
+            trace_id, parent_id, sampled = parent
+
+        span = Span(
+            trace_id=trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent_id,
+            name=self.name,
+            start=time.time(),
+            sampled=sampled,
+            attributes={
+                "http.request.method": ctx.request.method,
+                "url.path": ctx.request.in_req.path,
+                "server.address": ctx.request.url.host,
+            },
+        )
+        headers["traceparent"] = span.traceparent
+        if ctx.state is None:
+            ctx.state = {}
+        ctx.state[self.state_key] = span
+
+        # The generator is closed without resuming if the request fails,
+        # the finally block still records the span in that case
+        resumed = False
+        try:
+            yield
+            resumed = True
+        finally:
+            if span.sampled:
+                self._finish(ctx, span, error=not resumed)
+
+    def _finish(self, ctx: ProxyContext, span: Span, error: bool):
+        span.end = time.time()
+        span.error = error
+        try:
+            span.attributes["http.response.status_code"] = ctx.response.in_resp.status
+        except ValueError:
+            pass
+        if ctx.upstream_timing is not None:
+            for phase in ("queue", "dns", "connect", "server"):
+                span.attributes[f"upstream.{phase}"] = getattr(
+                    ctx.upstream_timing, phase
+                )
+            span.attributes["upstream.reused"] = ctx.upstream_timing.reused
+        self.batch.add(span)
+
+    def setup(self, app: web.Application):
+        """Export the remaining spans when the application shuts down.
+
+        Args:
+            app: The application the tracer is used in
+        """
+
+        async def _cleanup(_):
+            await self.batch.flush()
+
+        app.on_cleanup.append(_cleanup)
@@ -0,0 +1,75 @@
+from typing import Generic, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+class PathTrie(Generic[T]):
+    """Trie of URL path prefixes keyed by path segments.
+
+    Prefixes only match on segment boundaries, so `/api` matches `/api` and
+    `/api/users`, but not `/api-docs`. Looking up a path costs one dictionary
+    lookup per path segment, regardless of the number of stored prefixes.
+    """
+
+    __slots__ = ("_children", "_values")
+
+    def __init__(self):
+        self._children: dict[str, PathTrie[T]] = {}
+        self._values: List[T] = []
+
+    @staticmethod
+    def split(path: str) -> List[str]:
+        """Split the path into its non-empty segments.
+
+        Args:
+            path: The path to split
+
+        Returns:
+            The list of path segments
+        """
+        return [segment for segment in path.split("/") if segment]
+
+    def insert(self, prefix: str, value: T):
+        """Store a value under the given prefix.
+
+        Args:
+            prefix: The path prefix
+            value: The value to store
+        """
+        node = self
+        for segment in self.split(prefix):
+            node = node._children.setdefault(segment, PathTrie())
+        node._values.append(value)
+
+    def walk(self, path: str) -> Iterator[List[T]]:
+        """Iterate over the values of all prefixes matching the path.
+
+        Args:
+            path: The path to match
+
+        Yields:
+            The values stored under each matching prefix, shortest prefix first.
+        """
+        node = self
+        if node._values:
+            yield node._values
+        for segment in self.split(path):
+            node = node._children.get(segment)
+            if node is None:
+                return
+            if node._values:
+                yield node._values
+
+    def longest(self, path: str) -> List[T]:
+        """Get the values stored under the longest prefix matching the path.
+
+        Args:
+            path: The path to match
+
+        Returns:
+            The values of the longest matching prefix, empty if none matches.
+        """
+        values: List[T] = []
+        for values in self.walk(path):
+            pass
+        return values
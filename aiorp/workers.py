@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from multiprocessing.connection import wait
+from typing import Any, Awaitable, Callable, Dict
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+AppFactory = Callable[[], web.Application | Awaitable[web.Application]]
+
+
+#  pylint: disable=too-many-instance-attributes
+class WorkerSupervisor:
+    """Runs the application in worker processes sharing the listening port.
+
+    Every worker runs its own event loop with its own copy of the application,
+    and binds its own socket with `SO_REUSEPORT`, so the kernel spreads the
+    connections between them. Sessions of contexts managed with `configure_contexts`
+    are created on startup, so every worker gets its own connection pools.
+
+    Workers which exit unexpectedly are restarted. When the supervisor receives
+    SIGINT or SIGTERM, it forwards SIGTERM to the workers, which shut down
+    gracefully, and kills the ones still running after `shutdown_timeout`.
+
+    Args:
+        app: The application, or a function building it. With a factory every
+            worker builds its own application, otherwise the application is
+            inherited by the forked workers.
+        host: The host to listen on.
+        port: The port to listen on.
+        workers: The number of worker processes, the number of CPUs by default.
+        restart_delay: Time in seconds to wait before restarting a crashed worker,
+            doubled for every crash within the delay, up to a minute.
+        shutdown_timeout: Maximum time in seconds to wait for the workers to exit.
+        loop_factory: Optional function creating the event loop of every worker,
+            e.g. `uvloop.new_event_loop`.
+        **run_app_options: Additional options passed to `aiohttp.web.run_app`
+            in the workers.
+
+    Raises:
+        RuntimeError: If the platform doesn't support forking or `SO_REUSEPORT`.
+    """
+
+    def __init__(
+        self,
+        app: web.Application | AppFactory,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        workers: int | None = None,
+        restart_delay: float = 1.0,
+        shutdown_timeout: float = 60.0,
+        loop_factory: Callable[[], asyncio.AbstractEventLoop] | None = None,
+        **run_app_options: Any,
+    ):
+        if not hasattr(socket, "SO_REUSEPORT") or not hasattr(os, "fork"):
+            raise RuntimeError("Worker processes require fork and SO_REUSEPORT support")
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.restart_delay = restart_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.loop_factory = loop_factory
+        self.run_app_options = run_app_options
+        self._mp = multiprocessing.get_context("fork")
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._stopping = False
+
+    @property
+    def pids(self) -> list[int]:
+        """The process IDs of the running workers"""
+        return [process.pid for process in self._processes.values()]
+
+    def _run_worker(self):
+        # The supervisor's handlers are inherited by the fork, restore the defaults
+        # so run_app can install its own
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        app = self.app if isinstance(self.app, web.Application) else self.app()
+        web.run_app(
+            app,
+            host=self.host,
+            port=self.port,
+            reuse_port=True,
+            shutdown_timeout=self.shutdown_timeout,
+            print=None,
+            loop=self.loop_factory() if self.loop_factory else None,
+            **self.run_app_options,
+        )
+
+    def _start(self, index: int):
+        process = self._mp.Process(
+            target=self._run_worker, name=f"aiorp-worker-{index}", daemon=False
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info("Started worker %d with pid %d", index, process.pid)
+
+    def _stop(self, *_):
+        self._stopping = True
+
+    def run(self):
+        """Start the workers and supervise them until asked to stop."""
+        previous = {
+            sig: signal.signal(sig, self._stop)
+            for sig in (signal.SIGINT, signal.SIGTERM)
+        }
+        started: Dict[int, float] = {}
+        delays: Dict[int, float] = {}
+        # Crashed workers waiting to be restarted, with the time to restart them at
+        pending: Dict[int, float] = {}
+        try:
+            for index in range(self.workers):
+                self._start(index)
+                started[index] = time.monotonic()
+
+            while not self._stopping:
+                now = time.monotonic()
+                for index, restart_at in list(pending.items()):
+                    if restart_at <= now:
+                        del pending[index]
+                        self._start(index)
+                        started[index] = now
+
+                sentinels = {
+                    process.sentinel: index
+                    for index, process in self._processes.items()
+                    if index not in pending
+                }
+                for sentinel in wait(list(sentinels), timeout=0.5):
+                    index = sentinels[sentinel]
+                    process = self._processes[index]
+                    process.join()
+                    # Back off when the worker keeps crashing right after starting
+                    delay = delays.get(index, self.restart_delay)
+                    if time.monotonic() - started[index] < delay:
+                        delays[index] = min(delay * 2, 60.0)
+                    else:
+                        delays[index] = self.restart_delay
+                    pending[index] = time.monotonic() + delays[index]
+                    logger.error(
+                        "Worker %d (pid %d) exited with code %s, restarting in %.1fs",
+                        index,
+                        process.pid,
+                        process.exitcode,
+                        delays[index],
+                    )
+        finally:
+            self._shutdown()
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+    def _shutdown(self):
+        """Ask the workers to shut down gracefully, killing them after the timeout."""
+        for process in self._processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process in self._processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker pid %d didn't shut down, killing", process.pid)
+                process.kill()
+                process.join()
+        self._processes.clear()
+
+
+def run_workers(
+    app: web.Application | AppFactory,
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    workers: int | None = None,
+    **options: Any,
+):
+    """Run the application in supervised worker processes sharing the port.
+
+    See `WorkerSupervisor` for the options.
+
+    Args:
+        app: The application, or a function building it
+        host: The host to listen on
+        port: The port to listen on
+        workers: The number of worker processes, the number of CPUs by default
+        **options: Additional supervisor and `aiohttp.web.run_app` options
+    """
+    WorkerSupervisor(app, host=host, port=port, workers=workers, **options).run()
@@ -0,0 +1,250 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Hashable
+
+from aiohttp import WSCloseCode, WSMessage, WSMsgType, client, web
+
+from aiorp.context import ProxyContext
+
+BroadcastKey = Callable[[ProxyContext], Hashable]
+Forward = Callable[[WSMessage], Awaitable]
+
+
+@dataclass
+class WsBroadcast:
+    """Broadcast mode settings for the websocket handler
+
+    In broadcast mode clients with the same key share a single target socket,
+    and every message from the target is fanned out to all of them.
+
+    Args:
+        key: Optional function computing the channel key from the context.
+            Defaults to the target URL.
+        queue_size: Maximum number of messages waiting to be sent to a single client.
+            A client falling further behind is disconnected.
+    """
+
+    key: BroadcastKey | None = None
+    queue_size: int = 100
+
+
+class _Subscriber:
+    """A client socket subscribed to a broadcast channel.
+
+    Messages are queued for the client and sent by a dedicated task, so a slow
+    client never blocks the other subscribers.
+
+    Args:
+        ws: The client socket
+        queue_size: Maximum number of queued messages
+        forward: Coroutine function sending a message to the client
+    """
+
+    def __init__(self, ws: web.WebSocketResponse, queue_size: int, forward: Forward):
+        self.ws = ws
+        self.closing = False
+        self._close_code: int = WSCloseCode.GOING_AWAY
+        self._close_message = b""
+        self._sending = False
+        self._queue: asyncio.Queue[WSMessage | None] = asyncio.Queue(queue_size)
+        self._task = asyncio.create_task(self._write(forward))
+
+    def offer(self, msg: WSMessage) -> bool:
+        """Queue a message for the client without waiting.
+
+        Args:
+            msg: The message to queue
+
+        Returns:
+            False if the queue was full and the client got evicted, True otherwise.
+        """
+        if self.closing:
+            return True
+        try:
+            self._queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            self.close(
+                WSCloseCode.TRY_AGAIN_LATER, b"Client too slow, try again later."
+            )
+            return False
+        return True
+
+    def close(self, code: int, message: bytes):
+        """Close the client socket as soon as possible.
+
+        Pending messages are dropped and a send in progress is interrupted,
+        so a stuck client can't hold on to the close.
+
+        Args:
+            code: The close code to send
+            message: The close message to send
+        """
+        if self.closing:
+            return
+        self.closing = True
+        self._close_code, self._close_message = code, message
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+        if self._sending:
+            self._task.cancel()
+
+    async def stop(self):
+        """Stop the writer task"""
+        if not self._task.done():
+            self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _write(self, forward: Forward):
+        while (msg := await self._queue.get()) is not None:
+            self._sending = True
+            try:
+                await forward(msg)
+            except asyncio.CancelledError:
+                # Interrupted by the close, proceed with closing the socket
+                if not self.closing:
+                    raise
+                break
+            finally:
+                self._sending = False
+        if not self.ws.closed:
+            await self.ws.close(code=self._close_code, message=self._close_message)
+
+
+#  pylint: disable=too-many-instance-attributes
+class BroadcastChannel:
+    """A single target socket shared between multiple client sockets.
+
+    The channel connects to the target once, relays every message received from the
+    target to all subscribers, and closes the target socket when the last subscriber
+    leaves.
+
+    Args:
+        key: The key the channel is registered under
+        queue_size: Maximum number of queued messages per subscriber
+        on_close: Callback invoked with the channel once it is closed
+    """
+
+    def __init__(
+        self,
+        key: Hashable,
+        queue_size: int,
+        on_close: Callable[["BroadcastChannel"], None],
+    ):
+        self.key = key
+        self.queue_size = queue_size
+        self.target: client.ClientWebSocketResponse | None = None
+        self.closed = False
+        self.evicted = 0
+        self._on_close = on_close
+        self._subscribers: dict[web.WebSocketResponse, _Subscriber] = {}
+        self._connecting: asyncio.Task | None = None
+        self._relay: asyncio.Task | None = None
+
+    @property
+    def subscribers(self) -> int:
+        """Number of clients currently subscribed to the channel"""
+        return len(self._subscribers)
+
+    async def connect(
+        self, connect: Callable[[], Awaitable[client.ClientWebSocketResponse]]
+    ):
+        """Connect the channel to the target, if it isn't connected already.
+
+        Concurrent callers share the same connection attempt.
+
+        Args:
+            connect: Coroutine function connecting to the target
+
+        Raises:
+            Exception: Any exception raised while connecting to the target.
+        """
+        if self._connecting is None:
+            self._connecting = asyncio.create_task(connect())
+        try:
+            target = await asyncio.shield(self._connecting)
+        except Exception:
+            self._mark_closed()
+            raise
+        if self.target is None:
+            self.target = target
+            self._relay = asyncio.create_task(self._relay_messages())
+
+    def subscribe(self, ws: web.WebSocketResponse, forward: Forward):
+        """Subscribe a client socket to the channel.
+
+        Args:
+            ws: The client socket
+            forward: Coroutine function sending a message to the client
+        """
+        self._subscribers[ws] = _Subscriber(ws, self.queue_size, forward)
+
+    async def unsubscribe(self, ws: web.WebSocketResponse):
+        """Unsubscribe a client socket, closing the channel if it was the last one.
+
+        Args:
+            ws: The client socket
+        """
+        subscriber = self._subscribers.pop(ws, None)
+        if subscriber is not None:
+            await subscriber.stop()
+        if not self._subscribers:
+            await self.close()
+
+    def publish(self, msg: WSMessage):
+        """Queue a message for every subscriber, evicting the ones that can't keep up.
+
+        Args:
+            msg: The message to publish
+        """
+        for subscriber in self._subscribers.values():
+            if not subscriber.offer(msg):
+                self.evicted += 1
+
+    async def close(self):
+        """Close the target socket and stop relaying messages"""
+        self._mark_closed()
+        if self._relay is not None and not self._relay.done():
+            self._relay.cancel()
+            try:
+                await self._relay
+            except asyncio.CancelledError:
+                pass
+        if self.target is not None and not self.target.closed:
+            await self.target.close()
+
+    def _mark_closed(self):
+        if not self.closed:
+            self.closed = True
+            self._on_close(self)
+
+    async def _relay_messages(self):
+        """Relay messages from the target to all subscribers until the target closes"""
+        code, message = (
+            WSCloseCode.GOING_AWAY,
+            b"Other socket will not communicate any further, going away.",
+        )
+        try:
+            while True:
+                msg = await self.target.receive()
+                if msg.type in (WSMsgType.TEXT, WSMsgType.BINARY):
+                    self.publish(msg)
+                elif msg.type in (
+                    WSMsgType.CLOSE,
+                    WSMsgType.CLOSING,
+                    WSMsgType.CLOSED,
+                    WSMsgType.ERROR,
+                ):
+                    break
+        except asyncio.TimeoutError:
+            message = b"Other socket timed out, going away."
+        except Exception as e:  # pylint: disable=broad-except
+            code, message = WSCloseCode.INTERNAL_ERROR, str(e).encode()
+        self._mark_closed()
+        for subscriber in self._subscribers.values():
+            subscriber.close(code, message)
+        if not self.target.closed:
+            await self.target.close()
@@ -1,12 +1,17 @@
 import asyncio
+import contextlib
 import copy
-from typing import Awaitable, Callable, Union
+from dataclasses import dataclass
+from enum import Enum
+from typing import Awaitable, Callable, Hashable, List, Union
 
-from aiohttp import WSCloseCode, client, web
+from aiohttp import WSCloseCode, WSMessage, client, web
 from aiohttp.client_exceptions import ClientConnectorSSLError
 
 from aiorp.base_handler import BaseHandler
 from aiorp.context import ProxyContext
+from aiorp.registry import ConnectionLimit
+from aiorp.ws_broadcast import BroadcastChannel, WsBroadcast
 
 SocketResponse = Union[web.WebSocketResponse, client.ClientWebSocketResponse]
 MessageHandler = Callable[[SocketResponse, SocketResponse], Awaitable]
@@ -16,8 +21,79 @@ ClientMessageHandler = Callable[
 WebMessageHandler = Callable[
     [client.ClientWebSocketResponse, web.WebSocketResponse], Awaitable
 ]
+MessageMiddleware = Callable[[ProxyContext, WSMessage], Awaitable[WSMessage | None]]
+MessageTransform = Callable[[WSMessage], Awaitable[WSMessage | None]]
 
+DEFAULT_RECEIVE_TIMEOUT = 30
 
+
+class MessageDirection(Enum):
+    """Direction in which a websocket message is being proxied."""
+
+    CLIENT_TO_TARGET = "CLIENT_TO_TARGET"
+    TARGET_TO_CLIENT = "TARGET_TO_CLIENT"
+
+
+@dataclass
+class WsCompression:
+    """Permessage-deflate settings for both legs of a proxied websocket
+
+    Args:
+        client: Whether compression should be negotiated with the client.
+        target: Window bits to request when connecting to the target,
+            0 disables compression on the internal leg.
+        threshold: Size in bytes below which messages are sent uncompressed,
+            even when compression was negotiated. 0 compresses every message.
+            Messages over the threshold are each compressed with a new compressor,
+            which costs setting up a zlib stream per message and loses the
+            compression context shared between messages.
+    """
+
+    client: bool = True
+    target: int = 0
+    threshold: int = 0
+
+
+@dataclass
+class MessageMiddlewareDef:
+    """A message middleware definition used to set the middleware for a ws handler
+
+    A message middleware receives the context and the message and returns the
+    message that should be forwarded. It may return a new message to transform
+    the original one, or None to drop it.
+
+    Args:
+        direction: The direction of messages the middleware applies to
+        middleware: The middleware function
+    """
+
+    direction: MessageDirection
+    middleware: MessageMiddleware
+
+
+class _IdleWatch:
+    """Tracks the last time a message was proxied on a connection.
+
+    Args:
+        timeout: Time in seconds without messages after which the connection is idle
+    """
+
+    def __init__(self, timeout: float):
+        self._loop = asyncio.get_running_loop()
+        self.timeout = timeout
+        self.last_activity = self._loop.time()
+
+    def touch(self):
+        """Mark the connection as active"""
+        self.last_activity = self._loop.time()
+
+    async def wait(self):
+        """Wait until the connection becomes idle"""
+        while (remaining := self.last_activity + self.timeout - self._loop.time()) > 0:
+            await asyncio.sleep(remaining)
+
+
+#  pylint: disable=too-many-instance-attributes
 class WsProxyHandler(BaseHandler):
     """WebSocket handler in charge of proxying socket messages
 
@@ -25,9 +101,22 @@ class WsProxyHandler(BaseHandler):
 
     Args:
         *args: Variable length argument list.
-        message_handler: Optional handler for all message types.
-        client_message_handler: Optional handler for client messages.
-        web_message_handler: Optional handler for web messages.
+        proxy_tunnel: Optional coroutine replacing the default message tunneling.
+        receive_timeout: Optional timeout for receiving a message from the target
+            socket. Defaults to 30 seconds, or to no timeout if `idle_timeout` or
+            `target_heartbeat` is set, so quiet sockets are only closed by those.
+        message_middlewares: Optional list of message middlewares applied to
+            each data message (text or binary) passing through the default tunnel.
+        compression: Optional compression settings for both socket legs.
+        broadcast: Optional broadcast settings. When set, clients with the same
+            channel key share a single target socket.
+        client_heartbeat: Optional interval in seconds for pinging the client socket.
+        target_heartbeat: Optional interval in seconds for pinging the target socket.
+        idle_timeout: Optional time in seconds after which the sockets are closed if
+            no message was proxied in either direction.
+        max_connections: Optional maximum number of concurrently proxied sockets,
+            or a `ConnectionLimit` shared with other handlers. Connections over the
+            limit are rejected with 503 before the upgrade.
         **kwargs: Arbitrary keyword arguments.
 
     Raises:
@@ -38,7 +127,14 @@ class WsProxyHandler(BaseHandler):
         self,
         *args,
         proxy_tunnel: Callable[[ProxyContext], Awaitable] | None = None,
-        receive_timeout: int = 30,
+        receive_timeout: float | None = None,
+        message_middlewares: List[MessageMiddlewareDef] | None = None,
+        compression: WsCompression | None = None,
+        broadcast: WsBroadcast | None = None,
+        client_heartbeat: float | None = None,
+        target_heartbeat: float | None = None,
+        idle_timeout: float | None = None,
+        max_connections: int | ConnectionLimit | None = None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
@@ -48,8 +144,31 @@ class WsProxyHandler(BaseHandler):
                 "The connection options cannot contain the 'url', set it through context instead"
             )
 
+        if receive_timeout is None and not (idle_timeout or target_heartbeat):
+            receive_timeout = DEFAULT_RECEIVE_TIMEOUT
         self._default_timeout = client.ClientWSTimeout(ws_receive=receive_timeout)
+        self._compression = compression or WsCompression()
+        self._connect_options = {
+            "compress": self._compression.target,
+            "heartbeat": target_heartbeat,
+            **self.request_options,
+        }
+        self._client_heartbeat = client_heartbeat
+        self._idle_timeout = idle_timeout
+        if isinstance(max_connections, int):
+            max_connections = ConnectionLimit(max_connections)
+        self._connection_limit = max_connections
+        self._active_connections = 0
         self._proxy_tunnel = proxy_tunnel or self._default_proxy_tunnel
+        # Chains are kept as tuples per direction, so they are built once on
+        # registration and only iterated when proxying messages
+        self._message_chains: dict[MessageDirection, tuple[MessageMiddleware, ...]] = {}
+
+        for item in message_middlewares or []:
+            self.add_message_middleware(item)
+
+        self._broadcast = broadcast
+        self._channels: dict[Hashable, BroadcastChannel] = {}
 
     async def __call__(self, request: web.Request):
         """The handler that should be set on an endpoint
@@ -66,44 +185,198 @@ class WsProxyHandler(BaseHandler):
 
         Raises:
             ValueError: If context is not set
+            HTTPServiceUnavailable: If the maximum number of connections is reached
+                or the proxy is shutting down
         """
         # Make sure the context is set up
-        if self.context is None:
-            raise ValueError("Proxy context must be set before the handler is invoked.")
+        context = self._select_context(request)
+
+        # Reject before the upgrade so the client can retry elsewhere
+        slot = (
+            self._connection_limit.track()
+            if self._connection_limit is not None
+            else contextlib.nullcontext()
+        )
+        with slot, context.registry.track_request():
+            self._active_connections += 1
+            if self.metrics is not None:
+                self.metrics.websockets_active += 1
+            try:
+                return await self._tunnel(request, context)
+            finally:
+                self._active_connections -= 1
+                if self.metrics is not None:
+                    self.metrics.websockets_active -= 1
+
+    async def _tunnel(
+        self, request: web.Request, context: ProxyContext
+    ) -> web.WebSocketResponse:
+        """Set up both sockets and tunnel the messages between them.
+
+        Args:
+            request: The incoming web Request object.
+            context: The context to proxy the socket with.
 
+        Returns:
+            The WebSocketResponse
+        """
         # Copy the context so it is separate per request
-        ctx = copy.copy(self.context)
+        ctx = copy.copy(context)
         ctx.set_request(request)
 
         # Rewrite path if specified
         if self._rewrite:
-            ctx.request.url = self._rewrite.execute(ctx.request.url)
+            self._rewrite.apply(ctx.request)
 
         # Prepare the source websocket
-        ws_source = web.WebSocketResponse()
+        ws_source = web.WebSocketResponse(
+            compress=self._compression.client, heartbeat=self._client_heartbeat
+        )
         await ws_source.prepare(ctx.request.in_req)
 
+        # Register the client socket so it can be closed on shutdown
+        with ctx.registry.track_socket(ws_source):
+            if self._broadcast is not None:
+                await self._broadcast_tunnel(ctx, ws_source)
+                return ws_source
+
+            ws_target = await self._connect_target(ctx)
+            if self._compression.threshold:
+                self._defer_compression(ws_source)
+
+            # Set the socket pair in the context
+            ctx.set_socket_pair(ws_source=ws_source, ws_target=ws_target)
+
+            # Use the default proxy tunnel
+            await self._proxy_tunnel(ctx)
+            # Terminate the sockets
+            await ctx.terminate_sockets()
+
+        return ws_source
+
+    @property
+    def active_connections(self) -> int:
+        """Number of sockets currently proxied by the handler"""
+        return self._active_connections
+
+    async def _connect_target(
+        self, ctx: ProxyContext
+    ) -> client.ClientWebSocketResponse:
+        """Connect to the target socket, preferring wss over ws.
+
+        Args:
+            ctx: The ProxyContext holding the request to connect with
+
+        Returns:
+            The connected target socket
+        """
         try:
             # Attempt to connect with wss
             ctx.request.url = ctx.request.url.with_scheme("wss")
             ws_target = await ctx.session.ws_connect(
-                ctx.request.url, timeout=self._default_timeout, **self.request_options
+                ctx.request.url, timeout=self._default_timeout, **self._connect_options
             )
         except ClientConnectorSSLError:
             # Fallback to ws
             ctx.request.url = ctx.request.url.with_scheme("ws")
             ws_target = await ctx.session.ws_connect(
-                ctx.request.url, timeout=self._default_timeout, **self.request_options
+                ctx.request.url, timeout=self._default_timeout, **self._connect_options
             )
-        # Set the socket pair in the context
-        ctx.set_socket_pair(ws_source=ws_source, ws_target=ws_target)
+        if self._compression.threshold:
+            self._defer_compression(ws_target)
+        return ws_target
+
+    async def _broadcast_tunnel(
+        self, ctx: ProxyContext, ws_source: web.WebSocketResponse
+    ):
+        """Subscribe the client socket to a shared target socket.
 
-        # Use the default proxy tunnel
-        await self._proxy_tunnel(ctx)
-        # Terminate the sockets
-        await ctx.terminate_sockets()
+        Messages from the target are fanned out to the client through the channel,
+        while messages from the client are sent to the shared target socket.
 
-        return ws_source
+        Args:
+            ctx: The ProxyContext of the client connection
+            ws_source: The prepared client socket
+        """
+        key = (
+            self._broadcast.key(ctx)
+            if self._broadcast.key is not None
+            else str(ctx.request.url)
+        )
+        # The channel can close while we wait for it to connect, retry with a new one
+        while True:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = BroadcastChannel(
+                    key, self._broadcast.queue_size, self._remove_channel
+                )
+                self._channels[key] = channel
+            await channel.connect(lambda: self._connect_target(ctx))
+            if not channel.closed:
+                break
+
+        ctx.set_socket_pair(ws_source=ws_source, ws_target=channel.target)
+        idle = _IdleWatch(self._idle_timeout) if self._idle_timeout else None
+        transform = self._compile_message_chain(
+            ctx, MessageDirection.TARGET_TO_CLIENT, idle
+        )
+
+        async def _forward(msg: WSMessage):
+            if transform is not None:
+                msg = await transform(msg)
+                if msg is None:
+                    return
+            await self._send_data(ws_source, msg)
+
+        channel.subscribe(ws_source, _forward)
+        # Only the client socket is closed when idle, the target socket is shared
+        idle_task = (
+            asyncio.create_task(self._close_when_idle(idle, ws_source))
+            if idle is not None
+            else None
+        )
+        try:
+            await self._publish_messages(ctx, ws_source, channel, idle)
+        finally:
+            if idle_task is not None:
+                idle_task.cancel()
+            await channel.unsubscribe(ws_source)
+
+    async def _publish_messages(
+        self,
+        ctx: ProxyContext,
+        ws_source: web.WebSocketResponse,
+        channel: BroadcastChannel,
+        idle: _IdleWatch | None = None,
+    ):
+        """Forward messages from a subscribed client to the shared target socket.
+
+        Unlike the default tunnel, the client going away never closes the target socket.
+
+        Args:
+            ctx: The ProxyContext of the client connection
+            ws_source: The client socket
+            channel: The channel the client is subscribed to
+            idle: Optional idle watch of the client connection
+        """
+        transform = self._compile_message_chain(
+            ctx, MessageDirection.CLIENT_TO_TARGET, idle
+        )
+        while True:
+            msg = await ws_source.receive()
+            if msg.type not in (web.WSMsgType.TEXT, web.WSMsgType.BINARY):
+                break
+            if transform is not None:
+                msg = await transform(msg)
+                if msg is None:
+                    continue
+            if channel.closed:
+                break
+            await self._send_data(channel.target, msg)
+
+    def _remove_channel(self, channel: BroadcastChannel):
+        if self._channels.get(channel.key) is channel:
+            del self._channels[channel.key]
 
     async def _default_proxy_tunnel(self, ctx: ProxyContext):
         """The default logic for forwarding messages between two sockets
@@ -114,16 +387,37 @@ class WsProxyHandler(BaseHandler):
             ValueError: When the tunneling starts before sockets are set (very unlikely)
         """
 
+        idle = _IdleWatch(self._idle_timeout) if self._idle_timeout else None
+
         # Create and run message forwarding tasks
         source_to_target = asyncio.create_task(
-            self._sock_to_sock(ctx.ws_source, ctx.ws_target)
+            self._sock_to_sock(
+                ctx.ws_source,
+                ctx.ws_target,
+                self._compile_message_chain(
+                    ctx, MessageDirection.CLIENT_TO_TARGET, idle
+                ),
+            )
         )
         target_to_source = asyncio.create_task(
-            self._sock_to_sock(ctx.ws_target, ctx.ws_source)
+            self._sock_to_sock(
+                ctx.ws_target,
+                ctx.ws_source,
+                self._compile_message_chain(
+                    ctx, MessageDirection.TARGET_TO_CLIENT, idle
+                ),
+            )
         )
+        tasks = [source_to_target, target_to_source]
+        if idle is not None:
+            tasks.append(
+                asyncio.create_task(
+                    self._close_when_idle(idle, ctx.ws_source, ctx.ws_target)
+                )
+            )
         # Wait for first task to complete
         _, pending = await asyncio.wait(
-            [source_to_target, target_to_source],
+            tasks,
             return_when=asyncio.FIRST_COMPLETED,
         )
 
@@ -135,7 +429,97 @@ class WsProxyHandler(BaseHandler):
             except asyncio.CancelledError:
                 pass
 
-    async def _sock_to_sock(self, ws_source: SocketResponse, ws_target: SocketResponse):
+    @staticmethod
+    def _defer_compression(ws: SocketResponse):
+        """Stop the socket writer from compressing every frame by default.
+
+        aiohttp has no public way to send a frame uncompressed once compression was
+        negotiated, the `compress` argument of the send methods can only request it.
+        The default of the writer is switched off instead, and compression requested
+        per frame for messages over the threshold. If the writer can't be reached,
+        every message stays compressed.
+
+        Args:
+            ws: The socket for which compression was negotiated
+        """
+        writer = getattr(ws, "_writer", None)
+        if ws.compress and writer is not None:
+            writer.compress = 0
+
+    def _frame_compression(self, ws: SocketResponse, payload: bytes) -> int | None:
+        """Get the compression to request for a frame sent on the socket.
+
+        Args:
+            ws: The socket the frame is sent on
+            payload: The encoded frame payload
+
+        Returns:
+            The window bits to compress the frame with, None for the socket default.
+        """
+        threshold = self._compression.threshold
+        if threshold and ws.compress and len(payload) >= threshold:
+            return ws.compress
+        return None
+
+    def _compile_message_chain(
+        self,
+        ctx: ProxyContext,
+        direction: MessageDirection,
+        idle: _IdleWatch | None = None,
+    ) -> MessageTransform | None:
+        """Bind the message middleware chain of a direction to the context.
+
+        Args:
+            ctx: The ProxyContext passed to each of the message middlewares
+            direction: The direction of the chain
+            idle: Optional idle watch to mark active on every message
+
+        Returns:
+            A callable applying the whole chain to a message, or None if no
+            middleware is registered for the direction, there is no idle watch
+            and no metrics are recorded.
+        """
+        chain = self._message_chains.get(direction, ())
+        metrics = self.metrics
+        if not chain and idle is None and metrics is None:
+            return None
+        label = direction.value.lower()
+
+        async def _transform(msg: WSMessage) -> WSMessage | None:
+            if idle is not None:
+                idle.touch()
+            if metrics is not None:
+                metrics.observe_message(label)
+            for middleware in chain:
+                msg = await middleware(ctx, msg)
+                if msg is None:
+                    return None
+            return msg
+
+        return _transform
+
+    @staticmethod
+    async def _close_when_idle(idle: _IdleWatch, *sockets: SocketResponse):
+        """Close the sockets once the connection becomes idle.
+
+        Args:
+            idle: The idle watch of the connection
+            *sockets: The sockets to close
+        """
+        await idle.wait()
+        for ws in sockets:
+            if not ws.closed:
+                await ws.close(
+                    code=WSCloseCode.GOING_AWAY,
+                    message=b"Connection idle for too long, going away.",
+                )
+
+    async def _sock_to_sock(
+        self,
+        ws_source: SocketResponse,
+        ws_target: SocketResponse,
+        transform: MessageTransform | None = None,
+    ):
         """Forwards messages from source socket to target socket.
 
         When this function is finished, both sockets will be closed.
@@ -143,13 +527,14 @@ class WsProxyHandler(BaseHandler):
         Args:
             ws_source: Source socket.
             ws_target: Target socket.
+            transform: Optional compiled message middleware chain.
 
         Raises:
             Exception: If an unexpected exception occurs (not a timeout or connection error).
         """
         try:
             # Forward messages from source to target
-            await self._proxy_messages(ws_source, ws_target)
+            await self._proxy_messages(ws_source, ws_target, transform)
         except asyncio.TimeoutError as e:
             # Connection might be broken, so we should close the target
             if not ws_target.closed:
@@ -166,20 +551,32 @@ class WsProxyHandler(BaseHandler):
             raise
 
     async def _proxy_messages(
-        self, ws_source: SocketResponse, ws_target: SocketResponse
+        self,
+        ws_source: SocketResponse,
+        ws_target: SocketResponse,
+        transform: MessageTransform | None = None,
     ):
         """Forwards messages from source socket to target socket.
 
+        Data messages are passed through the transform before being forwarded,
+        if one is set. Control messages are never passed to the transform.
+
         Args:
             ws_source: Source socket.
             ws_target: Target socket.
+            transform: Optional compiled message middleware chain.
         """
         while True:
             msg = await ws_source.receive()
-            if msg.type == web.WSMsgType.TEXT:
-                await ws_target.send_str(msg.data)
-            elif msg.type == web.WSMsgType.BINARY:
-                await ws_target.send_bytes(msg.data)
+            if transform is not None and msg.type in (
+                web.WSMsgType.TEXT,
+                web.WSMsgType.BINARY,
+            ):
+                msg = await transform(msg)
+                if msg is None:
+                    continue
+            if msg.type in (web.WSMsgType.TEXT, web.WSMsgType.BINARY):
+                await self._send_data(ws_target, msg)
             elif msg.type in (
                 web.WSMsgType.CLOSE,
                 web.WSMsgType.CLOSING,
@@ -192,3 +589,63 @@ class WsProxyHandler(BaseHandler):
                         message=b"Other socket will not communicate any further, going away.",
                     )
                 break
+
+    async def _send_data(self, ws: SocketResponse, msg: WSMessage):
+        """Send a data message on the socket, ignoring other message types.
+
+        Args:
+            ws: The socket to send the message on
+            msg: The message to send
+        """
+        if msg.type == web.WSMsgType.TEXT:
+            # Encode once, the threshold applies to the bytes sent
+            payload = msg.data.encode("utf-8")
+            await ws.send_frame(
+                payload, web.WSMsgType.TEXT, self._frame_compression(ws, payload)
+            )
+        elif msg.type == web.WSMsgType.BINARY:
+            await ws.send_bytes(
+                msg.data, compress=self._frame_compression(ws, msg.data)
+            )
+
+    def add_message_middleware(self, middleware_def: MessageMiddlewareDef):
+        """Register a message middleware for the given direction.
+
+        Middlewares are executed in the order they were registered.
+
+        Args:
+            middleware_def: The message middleware definition to add
+        """
+        direction = middleware_def.direction
+        self._message_chains[direction] = (
+            *self._message_chains.get(direction, ()),
+            middleware_def.middleware,
+        )
+
+    def client_to_target(self, func: MessageMiddleware) -> MessageMiddleware:
+        """Register a middleware for messages sent from the client to the target.
+
+        Args:
+            func: The message middleware function.
+
+        Returns:
+            The decorated middleware function.
+        """
+        self.add_message_middleware(
+            MessageMiddlewareDef(MessageDirection.CLIENT_TO_TARGET, func)
+        )
+        return func
+
+    def target_to_client(self, func: MessageMiddleware) -> MessageMiddleware:
+        """Register a middleware for messages sent from the target to the client.
+
+        Args:
+            func: The message middleware function.
+
+        Returns:
+            The decorated middleware function.
+        """
+        self.add_message_middleware(
+            MessageMiddlewareDef(MessageDirection.TARGET_TO_CLIENT, func)
+        )
+        return func
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from aiohttp import ClientSession, TCPConnector
+
+
+@dataclass
+class LoadResult:
+    """Outcome of a load run
+
+    Args:
+        duration: The measured duration in seconds
+        latencies: The latency of every successful operation in seconds
+        errors: The number of failed operations
+    """
+
+    duration: float
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self) -> Dict[str, float]:
+        """Summarize the run
+
+        Returns:
+            The throughput, latency percentiles in milliseconds and error count
+        """
+        latencies = sorted(self.latencies)
+        return {
+            "ops": len(latencies),
+            "ops_per_s": round(len(latencies) / self.duration, 1),
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+            "errors": self.errors,
+        }
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def http_load(
+    url: str,
+    method: str = "GET",
+    data: bytes | None = None,
+    concurrency: int = 50,
+    duration: float = 5.0,
+    warmup: float = 1.0,
+) -> LoadResult:
+    """Send requests from `concurrency` workers over keep-alive connections.
+
+    Requests completed during the warmup are not measured.
+
+    Args:
+        url: The URL to request
+        method: The HTTP method
+        data: Optional request body
+        concurrency: The number of concurrent workers
+        duration: The measured duration in seconds
+        warmup: The duration in seconds before measuring starts
+
+    Returns:
+        The result of the run
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time() + warmup
+    deadline = start + duration
+    result = LoadResult(duration=duration)
+
+    async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+
+        async def _worker():
+            while (now := loop.time()) < deadline:
+                sent = time.perf_counter()
+                try:
+                    async with session.request(method, url, data=data) as resp:
+                        await resp.read()
+                        ok = resp.status < 400
+                except Exception:  # pylint: disable=broad-except
+                    ok = False
+                if now < start:
+                    continue
+                if ok:
+                    result.latencies.append(time.perf_counter() - sent)
+                else:
+                    result.errors += 1
+
+        await asyncio.gather(*[_worker() for _ in range(concurrency)])
+    return result
+
+
+async def ws_load(
+    url: str,
+    connections: int = 10,
+    message_size: int = 128,
+    duration: float = 5.0,
+    warmup: float = 1.0,
+) -> LoadResult:
+    """Exchange messages with an echo server, one in flight per connection.
+
+    The latency is the round trip time of a message.
+
+    Args:
+        url: The websocket URL
+        connections: The number of concurrent connections
+        message_size: The size of each message in bytes
+        duration: The measured duration in seconds
+        warmup: The duration in seconds before measuring starts
+
+    Returns:
+        The result of the run
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time() + warmup
+    deadline = start + duration
+    result = LoadResult(duration=duration)
+    payload = "x" * message_size
+
+    async with ClientSession() as session:
+
+        async def _connection():
+            try:
+                async with session.ws_connect(url) as ws:
+                    while (now := loop.time()) < deadline:
+                        sent = time.perf_counter()
+                        await ws.send_str(payload)
+                        await ws.receive()
+                        if now >= start:
+                            result.latencies.append(time.perf_counter() - sent)
+            except Exception:  # pylint: disable=broad-except
+                result.errors += 1
+
+        await asyncio.gather(*[_connection() for _ in range(connections)])
+    return result
@@ -0,0 +1,284 @@
+"""Micro-benchmarks of the per-request hot paths.
+
+Measures the time and memory of the objects built for every proxied request,
+in isolation from the network:
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --filter rewrite --output micro.json
+"""
+
+import argparse
+import asyncio
+import copy
+import gc
+import json
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiohttp.test_utils import make_mocked_request
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from aiorp import (
+    HTTPProxyHandler,
+    MiddlewarePhase,
+    PrefixRewrite,
+    ProxyContext,
+    ProxyMiddlewareDef,
+    ProxyRequest,
+    ProxyResponse,
+    RegexRewrite,
+    Rewrite,
+    RewriteRules,
+)
+
+TARGET = URL("http://target.local:8080")
+HEADERS = {
+    "Host": "proxy.local",
+    "User-Agent": "benchmark/1.0",
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "Authorization": "Bearer token",
+    "Connection": "keep-alive",
+    "Cookie": "session=abc; theme=dark",
+    "X-Forwarded-For": "10.0.0.1",
+    "X-Request-Id": "7f1c6a5e-3b0e-4c1a-9f1e-2a6c8b7d9e01",
+}
+
+
+@dataclass
+class MicroResult:
+    """Cost of a single operation
+
+    Args:
+        name: The name of the benchmark
+        ns_per_op: The best mean time of an operation over the repeats, in nanoseconds
+        peak_bytes: The most memory allocated at once while running an operation
+        retained_bytes: The memory still allocated after an operation, on average
+    """
+
+    name: str
+    ns_per_op: float
+    peak_bytes: int
+    retained_bytes: float
+
+
+class _FakeClientResponse:
+    """Stands in for the aiohttp client response of the target"""
+
+    def __init__(self):
+        self.status = 200
+        self.reason = "OK"
+        self.headers = CIMultiDictProxy(
+            CIMultiDict(
+                {
+                    "Content-Type": "application/json",
+                    "Content-Length": "27",
+                    "Location": "http://target.local:8080/shops/1",
+                    "Set-Cookie": "session=abc; Path=/shops",
+                }
+            )
+        )
+        self._body = b'{"id": 1, "name": "bench"}'
+
+    async def read(self) -> bytes:
+        return self._body
+
+
+class _ChainOnlyHandler(HTTPProxyHandler):
+    """Runs the middleware chain without sending the request"""
+
+    async def _proxy_middleware(self, ctx: ProxyContext):
+        pass
+
+
+async def _noop_middleware(ctx: ProxyContext):
+    yield
+
+
+Operation = Callable[[], Any] | Callable[[], Awaitable[Any]]
+
+
+def _run(func: Operation, number: int, is_async: bool):
+    if not is_async:
+        for _ in range(number):
+            func()
+        return
+
+    async def _loop():
+        for _ in range(number):
+            await func()
+
+    asyncio.run(_loop())
+
+
+def _trace(func: Callable[[], Any], number: int) -> tuple[int, float]:
+    """Trace the peak memory of one operation, and the average retained over many"""
+    func()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+        for _ in range(number):
+            func()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before, (after - current) / number
+
+
+async def _trace_async(
+    func: Callable[[], Awaitable[Any]], number: int
+) -> tuple[int, float]:
+    """Trace the memory like `_trace`, within the running event loop"""
+    await func()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        await func()
+        current, peak = tracemalloc.get_traced_memory()
+        for _ in range(number):
+            await func()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before, (after - current) / number
+
+
+def measure(
+    name: str,
+    func: Operation,
+    is_async: bool = False,
+    repeat: int = 5,
+    min_time: float = 0.2,
+) -> MicroResult:
+    """Measure the time and memory of an operation.
+
+    The number of operations per repeat is calibrated to take at least `min_time`
+    seconds, and the best repeat is kept. Memory is traced in a separate run,
+    since tracing slows down allocations.
+
+    Args:
+        name: The name of the benchmark
+        func: The operation, a function or a coroutine function without arguments
+        is_async: Whether the operation is a coroutine function
+        repeat: The number of timed repeats
+        min_time: Minimum duration of a repeat in seconds
+
+    Returns:
+        The measured cost of the operation
+    """
+    number = 1
+    while True:
+        start = time.perf_counter_ns()
+        _run(func, number, is_async)
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9:
+            break
+        number *= 10
+
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        best = elapsed
+        for _ in range(repeat - 1):
+            start = time.perf_counter_ns()
+            _run(func, number, is_async)
+            best = min(best, time.perf_counter_ns() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    traced = min(number, 1000)
+    if is_async:
+        peak, retained = asyncio.run(_trace_async(func, traced))
+    else:
+        peak, retained = _trace(func, traced)
+
+    return MicroResult(
+        name=name,
+        ns_per_op=round(best / number, 1),
+        peak_bytes=peak,
+        retained_bytes=round(retained, 1),
+    )
+
+
+def _benchmarks() -> Dict[str, tuple[Operation, bool]]:
+    in_req = make_mocked_request(
+        "GET", "/inventory/shops/1?page=2&size=50", headers=HEADERS
+    )
+    ctx = ProxyContext(url=TARGET, state={"resource": "inventory"})
+    proxy_request = ProxyRequest(url=TARGET, in_req=in_req)
+    in_resp = _FakeClientResponse()
+    url = TARGET.with_path("/inventory/shops/1")
+
+    async def _build_response():
+        response = ProxyResponse(in_resp, request=proxy_request)
+        await response.set_response()
+
+    rewrite = Rewrite("/inventory", "/shops")
+    prefix = PrefixRewrite("/inventory", "/shops")
+    regex = RegexRewrite(r"^/inventory/(\w+)", r"/\1")
+    rules = RewriteRules(
+        [PrefixRewrite(f"/service{i}", f"/v{i}") for i in range(100)]
+        + [PrefixRewrite("/inventory", "/shops")]
+    )
+
+    benchmarks: Dict[str, tuple[Operation, bool]] = {
+        "context_copy": (lambda: copy.copy(ctx), False),
+        "proxy_request": (lambda: ProxyRequest(url=TARGET, in_req=in_req), False),
+        "proxy_response": (_build_response, True),
+        "rewrite_execute": (lambda: rewrite.execute(url), False),
+        "rewrite_prefix": (lambda: prefix.execute(url), False),
+        "rewrite_regex": (lambda: regex.execute(url), False),
+        "rewrite_rules_101": (lambda: rules.execute(url), False),
+    }
+
+    for count in (0, 1, 10, 50):
+        handler = _ChainOnlyHandler(
+            context=ctx,
+            middlewares=[
+                ProxyMiddlewareDef(MiddlewarePhase.PROXY, _noop_middleware)
+                for _ in range(count)
+            ],
+        )
+        benchmarks[f"middleware_chain_{count}"] = (
+            lambda handler=handler: handler._execute_middleware_chain(ctx),
+            True,
+        )
+    return benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--filter", default="", help="Only run benchmarks containing this text."
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="File to write the JSON results to.")
+    args = parser.parse_args()
+
+    results: List[MicroResult] = []
+    print(f"{'benchmark':<22} {'ns/op':>12} {'peak B':>10} {'retained B':>11}")
+    for name, (func, is_async) in _benchmarks().items():
+        if args.filter not in name:
+            continue
+        result = measure(name, func, is_async=is_async, repeat=args.repeat)
+        results.append(result)
+        print(
+            f"{name:<22} {result.ns_per_op:>12,.1f} {result.peak_bytes:>10,}"
+            f" {result.retained_bytes:>11,.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump([asdict(result) for result in results], file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
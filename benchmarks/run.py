@@ -0,0 +1,172 @@
+"""Benchmark the proxy against local targets.
+
+Every scenario starts a target and an aiorp proxy in separate processes and drives
+the proxy with the built-in load generator:
+
+    python -m benchmarks.run --duration 10 --output results.json
+    python -m benchmarks.run --scenario small_json --compare results.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+import aiohttp
+
+from benchmarks.load import LoadResult, http_load, ws_load
+from benchmarks.servers import ServerProcess, proxy_app, target_app
+
+
+@dataclass
+class Scenario:
+    """A benchmark scenario
+
+    Args:
+        path: The path requested through the proxy
+        method: The HTTP method, or WS for a websocket message exchange
+        body_size: Size of the request body in bytes
+        middlewares: The number of no-op middlewares registered on the proxy
+        load: Additional arguments of the load generator
+    """
+
+    path: str
+    method: str = "GET"
+    body_size: int = 0
+    middlewares: int = 0
+    load: Dict[str, Any] = field(default_factory=dict)
+
+
+SCENARIOS = {
+    "small_json": Scenario("/json"),
+    "large_download": Scenario("/download?size=1048576", load={"concurrency": 10}),
+    "upload": Scenario("/upload", method="POST", body_size=1024 * 1024),
+    "many_middlewares": Scenario("/json", middlewares=20),
+    "ws_messages": Scenario("/ws", method="WS"),
+}
+
+
+async def _drive(scenario: Scenario, url: str, args: argparse.Namespace) -> LoadResult:
+    if scenario.method == "WS":
+        return await ws_load(
+            url.replace("http", "ws", 1),
+            connections=args.connections,
+            duration=args.duration,
+            warmup=args.warmup,
+            **scenario.load,
+        )
+    options = {
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        **scenario.load,
+    }
+    return await http_load(
+        url,
+        method=scenario.method,
+        data=b"x" * scenario.body_size if scenario.body_size else None,
+        **options,
+    )
+
+
+def run_scenario(scenario: Scenario, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run a scenario through the proxy, and directly against the target if requested.
+
+    Args:
+        scenario: The scenario to run
+        args: The command line arguments
+
+    Returns:
+        The results of the scenario
+    """
+    with ServerProcess(target_app) as target:
+        with ServerProcess(
+            proxy_app, target_url=target.url, middlewares=scenario.middlewares
+        ) as proxy:
+            result = asyncio.run(_drive(scenario, proxy.url + scenario.path, args))
+        results = {**result.summary(), "proxy": proxy.usage}
+        if args.direct:
+            direct = asyncio.run(_drive(scenario, target.url + scenario.path, args))
+            results["direct"] = direct.summary()
+    return results
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\nCompared to {baseline.get('revision') or 'baseline'}:")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        changes = []
+        for key in ("ops_per_s", "p50_ms", "p99_ms"):
+            if previous[key]:
+                change = (current[key] - previous[key]) / previous[key] * 100
+                changes.append(f"{key} {change:+.1f}%")
+        print(f"  {name:<20} {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="Scenario to run, can be repeated. Runs all scenarios by default.",
+    )
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument(
+        "--direct",
+        action="store_true",
+        help="Also run each scenario directly against the target, as a baseline.",
+    )
+    parser.add_argument("--output", help="File to write the JSON results to.")
+    parser.add_argument("--compare", help="JSON results of a previous run.")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "aiohttp": aiohttp.__version__,
+        "settings": {
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "connections": args.connections,
+        },
+        "scenarios": {},
+    }
+    for name in args.scenario or SCENARIOS:
+        print(f"Running {name}...", file=sys.stderr)
+        results["scenarios"][name] = run_scenario(SCENARIOS[name], args)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            _compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import asyncio
+import multiprocessing
+import resource
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict
+
+from aiohttp import web
+from yarl import URL
+
+from aiorp import (
+    HTTPProxyHandler,
+    MiddlewarePhase,
+    ProxyContext,
+    ProxyMiddlewareDef,
+    WsProxyHandler,
+    configure_contexts,
+)
+
+SMALL_JSON = {"id": 1, "name": "benchmark", "tags": ["a", "b", "c"], "active": True}
+
+
+async def small_json(request: web.Request) -> web.Response:
+    return web.json_response(SMALL_JSON)
+
+
+async def download(request: web.Request) -> web.Response:
+    size = int(request.query.get("size", 1024 * 1024))
+    return web.Response(body=b"x" * size, content_type="application/octet-stream")
+
+
+async def upload(request: web.Request) -> web.Response:
+    await request.read()
+    return web.Response(status=204)
+
+
+async def echo(request: web.Request) -> web.WebSocketResponse:
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    async for msg in ws:
+        if msg.type == web.WSMsgType.TEXT:
+            await ws.send_str(msg.data)
+        elif msg.type == web.WSMsgType.BINARY:
+            await ws.send_bytes(msg.data)
+    return ws
+
+
+def target_app() -> web.Application:
+    """The target the proxy forwards the benchmark traffic to"""
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_get("/json", small_json)
+    app.router.add_get("/download", download)
+    app.router.add_post("/upload", upload)
+    app.router.add_get("/ws", echo)
+    return app
+
+
+async def _noop_middleware(ctx: ProxyContext):
+    yield
+
+
+def proxy_app(target_url: str, middlewares: int = 0) -> web.Application:
+    """The proxy under benchmark
+
+    Args:
+        target_url: The URL of the target
+        middlewares: The number of no-op middlewares to register on the HTTP handler
+    """
+    ctx = ProxyContext(url=URL(target_url))
+    http_handler = HTTPProxyHandler(
+        context=ctx,
+        middlewares=[
+            ProxyMiddlewareDef(MiddlewarePhase.PROXY, _noop_middleware)
+            for _ in range(middlewares)
+        ],
+    )
+    ws_handler = WsProxyHandler(context=ctx)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_get("/ws", ws_handler)
+    app.router.add_route("*", "/{path:.*}", http_handler)
+    configure_contexts(app, [ctx])
+    return app
+
+
+def _serve(
+    factory: Callable[..., web.Application], kwargs: Dict[str, Any], conn: Connection
+):
+    """Run the application until told to stop, then report the resource usage."""
+
+    async def _run():
+        runner = web.AppRunner(factory(**kwargs), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        conn.send(runner.addresses[0][1])
+        # Measure only the traffic, not the startup
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        await runner.cleanup()
+        conn.send(
+            {
+                "cpu_s": round(
+                    (after.ru_utime - before.ru_utime)
+                    + (after.ru_stime - before.ru_stime),
+                    3,
+                ),
+                "max_rss_mb": round(after.ru_maxrss / 1024, 1),
+            }
+        )
+
+    asyncio.run(_run())
+
+
+class ServerProcess:
+    """Runs an application in a separate process, so it doesn't share the CPU
+    with the load generator and its resource usage can be measured on its own.
+
+    Args:
+        factory: Function building the application
+        **kwargs: Arguments passed to the factory
+    """
+
+    def __init__(self, factory: Callable[..., web.Application], **kwargs: Any):
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(factory, kwargs, child_conn), daemon=True
+        )
+        self.port: int | None = None
+        self.usage: Dict[str, float] = {}
+
+    def __enter__(self) -> "ServerProcess":
+        self._process.start()
+        self.port = self._conn.recv()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._conn.send("stop")
+        self.usage = self._conn.recv()
+        self._process.join()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
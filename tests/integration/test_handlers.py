@@ -3,7 +3,7 @@ from aiohttp import WSCloseCode, WSMsgType
 from aiohttp.test_utils import TestClient
 
 from aiorp.http_handler import MiddlewarePhase, ProxyMiddlewareDef
-from aiorp.rewrite import Rewrite
+from aiorp.rewrite import PrefixRewrite, Rewrite
 from tests.utils.proxy_middlewares import (
     RESPONSE_MODIFIED_VALUE,
     modify_both,
@@ -127,6 +127,46 @@ async def test_modify_request_and_response(aiohttp_client, proxy_server):
     assert "X-Response-Added-Header" in resp.headers
 
 
+@pytest.mark.http_handler
+@pytest.mark.asyncio
+async def test_http_handler_reverse_rewrite(aiohttp_client, proxy_server):
+    server = await proxy_server(
+        http={
+            "rewrite": PrefixRewrite("/http", ""),
+            "request_options": {"allow_redirects": False},
+        }
+    )
+    client: TestClient = await aiohttp_client(server.app)
+
+    resp = await client.get("/http/redirect", allow_redirects=False)
+
+    assert resp.status == 302
+    assert resp.headers["Location"] == str(client.make_url("/http/yell_path?loud=1"))
+    assert resp.headers["Refresh"] == "0; url=/http/yell_path"
+    cookie = resp.headers["Set-Cookie"]
+    assert "Path=/http" in cookie
+    assert f"Domain={client.host}" in cookie
+
+
+@pytest.mark.http_handler
+@pytest.mark.asyncio
+async def test_http_handler_plain_rewrite_keeps_paths(aiohttp_client, proxy_server):
+    server = await proxy_server(
+        http={
+            "rewrite": Rewrite("/http/", "/"),
+            "request_options": {"allow_redirects": False},
+        }
+    )
+    client: TestClient = await aiohttp_client(server.app)
+
+    resp = await client.get("/http/redirect", allow_redirects=False)
+
+    # Only the target address is mapped back, the paths aren't reversed
+    assert resp.headers["Location"] == str(client.make_url("/yell_path?loud=1"))
+    assert resp.headers["Refresh"] == "0; url=/yell_path"
+    assert resp.headers["Set-Cookie"].endswith("Path=/")
+
+
 @pytest.mark.websocket_handler
 @pytest.mark.asyncio
 async def test_ws_handler_proxy(aiohttp_client, proxy_server):
@@ -0,0 +1,75 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+
+import pytest
+from aiohttp import ClientSession, TCPConnector, web
+
+from aiorp.workers import run_workers
+
+pytestmark = [pytest.mark.integration]
+
+
+async def _pid(request: web.Request) -> web.Response:
+    return web.Response(text=str(os.getpid()))
+
+
+def _app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/pid", _pid)
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _collect_pids(url: str, attempts: int = 100) -> set[int]:
+    pids = set()
+    # A new connection per request, so the kernel picks a worker every time
+    async with ClientSession(connector=TCPConnector(force_close=True)) as session:
+        for _ in range(attempts):
+            try:
+                async with session.get(url) as resp:
+                    pids.add(int(await resp.text()))
+            except OSError:
+                await asyncio.sleep(0.1)
+    return pids
+
+
+async def test_workers_share_port_and_restart():
+    port = _free_port()
+    supervisor = multiprocessing.get_context("fork").Process(
+        target=run_workers,
+        args=(_app,),
+        kwargs={
+            "host": "127.0.0.1",
+            "port": port,
+            "workers": 2,
+            "restart_delay": 0.1,
+            "shutdown_timeout": 5,
+        },
+    )
+    supervisor.start()
+    url = f"http://127.0.0.1:{port}/pid"
+    try:
+        pids = await _collect_pids(url)
+        assert len(pids) == 2
+
+        crashed = pids.pop()
+        os.kill(crashed, signal.SIGKILL)
+        await asyncio.sleep(0.5)
+
+        restarted = await _collect_pids(url)
+        assert crashed not in restarted
+        assert len(restarted) == 2
+    finally:
+        supervisor.terminate()
+        supervisor.join(10)
+
+    assert supervisor.exitcode == 0
+    assert not await _collect_pids(url, attempts=1)
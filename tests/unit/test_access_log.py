@@ -0,0 +1,70 @@
+import asyncio
+import io
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from aioresponses import aioresponses
+
+from aiorp.access_log import AccessLog, format_json
+from aiorp.http_handler import HTTPProxyHandler
+
+pytestmark = [pytest.mark.unit]
+
+
+async def test_access_log_records_proxied_request(target_ctx):
+    stream = io.StringIO()
+    access_log = AccessLog(stream, formatter=format_json)
+    handler = HTTPProxyHandler(context=target_ctx, access_log=access_log)
+
+    with aioresponses() as mocked:
+        mocked.get(f"{target_ctx.url}/yell_path?a=1", status=201, body="Created")
+        await handler(make_mocked_request("GET", "/yell_path?a=1"))
+
+    # Nothing is written while handling the request
+    assert stream.getvalue() == ""
+    await access_log.flush()
+    record = json.loads(stream.getvalue())
+    assert record["method"] == "GET"
+    assert record["path"] == "/yell_path?a=1"
+    assert record["target"] == f"{target_ctx.url}/yell_path"
+    assert record["status"] == 201
+    assert record["upstream_status"] == 201
+    assert record["upstream_time"] <= record["request_time"]
+    assert record["bytes_out"] == len("Created")
+
+
+async def test_access_log_records_failed_requests(target_ctx):
+    stream = io.StringIO()
+    access_log = AccessLog(stream, sample_rate=0)
+    handler = HTTPProxyHandler(context=target_ctx, access_log=access_log)
+
+    with aioresponses() as mocked:
+        mocked.get(f"{target_ctx.url}/yell_path", status=200, body="OK")
+        mocked.get(f"{target_ctx.url}/yell_path", status=503)
+        await handler(make_mocked_request("GET", "/yell_path"))
+        with pytest.raises(web.HTTPInternalServerError):
+            await handler(make_mocked_request("GET", "/yell_path"))
+
+    await access_log.flush()
+    # Server errors are logged regardless of the sampling
+    (line,) = stream.getvalue().splitlines()
+    assert '"GET /yell_path" 500' in line
+    assert f"-> {target_ctx.url}/yell_path 503 " in line
+    assert access_log.skipped == 1
+
+
+async def test_access_log_batches_and_drops(target_ctx):
+    stream = io.StringIO()
+    access_log = AccessLog(stream, max_batch_size=2, max_queue_size=3, interval=10)
+    target_ctx.set_request(make_mocked_request("GET", "/"))
+
+    for _ in range(4):
+        access_log.record(target_ctx, 200, 0.001)
+    assert access_log.dropped == 1
+
+    # A full batch is written without waiting for the interval
+    await asyncio.sleep(0.05)
+    assert len(stream.getvalue().splitlines()) == 3
+    await access_log.flush()
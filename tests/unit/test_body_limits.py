@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+import yarl
+from aiohttp import web
+
+from aiorp.body_limits import BodyLimits, BodyReader, MemoryBudget
+from aiorp.context import ProxyContext
+from aiorp.http_handler import HTTPProxyHandler
+
+pytestmark = [pytest.mark.unit]
+
+
+@pytest.fixture
+async def proxy(aiohttp_server, aiohttp_client):
+    async def echo(request: web.Request) -> web.Response:
+        return web.Response(body=await request.read())
+
+    async def large(request: web.Request) -> web.StreamResponse:
+        # Chunked, so the size is only known while reading
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for _ in range(4):
+            await response.write(b"x" * 1024)
+        await response.write_eof()
+        return response
+
+    target_app = web.Application()
+    target_app.router.add_post("/echo", echo)
+    target_app.router.add_get("/large", large)
+    server = await aiohttp_server(target_app)
+    ctx = ProxyContext(url=yarl.URL(f"http://localhost:{server.port}"))
+
+    async def _client(limits: BodyLimits, on_prepare=None):
+        handler = HTTPProxyHandler(context=ctx, body_limits=limits)
+        app = web.Application()
+        if on_prepare is not None:
+            app.on_response_prepare.append(on_prepare)
+        app.router.add_route("*", "/{path:.*}", handler)
+        return await aiohttp_client(app)
+
+    yield _client
+    await ctx.close_session()
+
+
+async def _chunks(count: int):
+    for _ in range(count):
+        yield b"x" * 1024
+
+
+async def test_bodies_under_the_limits_are_proxied(proxy):
+    client = await proxy(BodyLimits(max_request_size=4096, max_response_size=4096))
+
+    resp = await client.post("/echo", data=b"hello")
+    assert resp.status == 200
+    assert await resp.read() == b"hello"
+
+
+async def test_declared_response_size_is_a_bad_gateway(proxy):
+    client = await proxy(BodyLimits(max_response_size=1024))
+
+    resp = await client.post("/echo", data=b"x" * 2048)
+    assert resp.status == 502
+
+
+async def test_declared_request_size_is_rejected_upfront(proxy):
+    client = await proxy(BodyLimits(max_request_size=1024))
+
+    resp = await client.post("/echo", data=b"x" * 2048)
+    assert resp.status == 413
+
+
+async def test_application_size_limit_applies_by_default(proxy):
+    client = await proxy(BodyLimits(max_response_size=10**6))
+
+    # Over the default client_max_size of 1 MiB
+    resp = await client.post("/echo", data=b"x" * (3 * 1024 * 1024))
+    assert resp.status == 413
+
+
+async def test_streamed_request_is_rejected_while_reading(proxy):
+    client = await proxy(BodyLimits(max_request_size=2048, chunk_size=512))
+
+    resp = await client.post("/echo", data=_chunks(4))
+    assert resp.status == 413
+
+
+async def test_large_response_is_a_bad_gateway(proxy):
+    client = await proxy(BodyLimits(max_response_size=2048))
+
+    resp = await client.get("/large")
+    assert resp.status == 502
+
+
+async def test_budget_is_released_after_the_request(proxy):
+    budget = MemoryBudget(8192)
+    held = []
+
+    async def on_prepare(request, response):
+        held.append(budget.used)
+
+    client = await proxy(BodyLimits(budget=budget), on_prepare)
+
+    resp = await client.post("/echo", data=b"x" * 1024)
+    assert resp.status == 200
+    assert await resp.read() == b"x" * 1024
+    # Still held while the response was being sent
+    assert held == [2048]
+    # Released once the server finished sending the response
+    for _ in range(100):
+        if budget.used == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert budget.used == 0
+    assert budget.rejected == 0
+
+
+async def test_exhausted_budget_rejects_the_request(proxy):
+    budget = MemoryBudget(2048)
+    client = await proxy(BodyLimits(budget=budget))
+
+    resp = await client.get("/large")
+    assert resp.status == 503
+    assert resp.headers["Retry-After"] == "1"
+    assert budget.rejected == 1
+    assert budget.used == 0
+
+
+async def test_reader_reserves_until_released():
+    budget = MemoryBudget(100)
+    reader = BodyReader(BodyLimits(budget=budget, chunk_size=10))
+    stream = asyncio.StreamReader()
+    stream.feed_data(b"x" * 30)
+    stream.feed_eof()
+
+    # asyncio and aiohttp streams share the read signature
+    body = await reader.read(stream, None, None, web.HTTPRequestEntityTooLarge)
+    assert body == b"x" * 30
+    assert budget.used == reader.reserved == 30
+
+    reader.release()
+    assert budget.used == reader.reserved == 0
+
+
+def test_budget_must_be_positive():
+    with pytest.raises(ValueError):
+        MemoryBudget(0)
@@ -0,0 +1,89 @@
+import pytest
+import yarl
+from aiohttp import ClientSession, TraceConfig
+from aiohttp.test_utils import make_mocked_request
+
+from aiorp.client_trace import client_trace_config
+from aiorp.context import ProxyContext
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.metrics import ProxyMetrics
+from tests.utils.target import app as target_app
+
+pytestmark = [pytest.mark.unit]
+
+
+@pytest.fixture
+async def traced_ctx(aiohttp_server):
+    server = await aiohttp_server(target_app())
+    context = ProxyContext(
+        url=yarl.URL(f"http://localhost:{server.port}"),
+        session_factory=lambda: ClientSession(trace_configs=[client_trace_config()]),
+    )
+    yield context
+
+    await context.close_session()
+
+
+async def test_client_trace_records_timing(traced_ctx):
+    metrics = ProxyMetrics()
+    target = metrics.target("traced")
+    handler = HTTPProxyHandler(context=traced_ctx, metrics=target)
+    timings = []
+
+    @handler.proxy
+    async def _collect(ctx):
+        yield
+        timings.append(ctx.upstream_timing)
+
+    await handler(make_mocked_request("GET", "/yell_path"))
+    await handler(make_mocked_request("GET", "/yell_path"))
+
+    first, second = timings
+    assert not first.reused
+    assert first.connect > 0
+    assert first.server > 0
+    assert first.total >= first.connect + first.server
+    assert second.reused
+    assert second.connect == 0
+
+    assert target.connections == {"new": 1, "reused": 1}
+    assert target.connection_latency["server"].count == 2
+    assert 'connection="reused"} 1' in metrics.render()
+
+
+async def test_client_trace_ignores_other_requests(traced_ctx):
+    async with traced_ctx.session.get(traced_ctx.url.with_path("/yell_path")) as resp:
+        assert resp.status == 200
+    assert traced_ctx.upstream_timing is None
+
+
+async def test_client_trace_keeps_trace_request_ctx(aiohttp_server):
+    server = await aiohttp_server(target_app())
+    received = []
+
+    async def _on_request_start(_session, trace_ctx, _):
+        received.append(trace_ctx.trace_request_ctx)
+
+    user_config = TraceConfig()
+    user_config.on_request_start.append(_on_request_start)
+    context = ProxyContext(
+        url=yarl.URL(f"http://localhost:{server.port}"),
+        session_factory=lambda: ClientSession(
+            trace_configs=[client_trace_config(), user_config]
+        ),
+    )
+    handler = HTTPProxyHandler(
+        context=context, request_options={"trace_request_ctx": {"user": 1}}
+    )
+    timings = []
+
+    @handler.proxy
+    async def _collect(ctx):
+        yield
+        timings.append(ctx.upstream_timing)
+
+    await handler(make_mocked_request("GET", "/yell_path"))
+    await context.close_session()
+
+    assert received == [{"user": 1}]
+    assert timings[0].server > 0
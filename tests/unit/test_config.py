@@ -0,0 +1,168 @@
+import json
+
+import pytest
+from aiohttp import web
+
+from aiorp.config import ProxyConfig, read_config
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.registry import ConnectionLimit
+from aiorp.rewrite import PrefixRewrite, RewriteRules
+from aiorp.ws_handler import WsProxyHandler
+from tests.utils.target import app as target_app
+
+pytestmark = [pytest.mark.unit]
+
+
+@pytest.fixture
+async def target_url(aiohttp_server):
+    server = await aiohttp_server(target_app())
+    return f"http://localhost:{server.port}"
+
+
+def _write(path, config):
+    path.write_text(json.dumps(config))
+
+
+def _config(url, **route):
+    return {
+        "contexts": {"target": {"url": url}},
+        "routes": [
+            {
+                "prefix": "/target",
+                "context": "target",
+                "rewrite": {"prefix": "/target", "replacement": ""},
+                **route,
+            }
+        ],
+    }
+
+
+def test_read_config_toml(tmp_path):
+    path = tmp_path / "proxy.toml"
+    path.write_text('[contexts.target]\nurl = "http://localhost:8000"\n')
+    assert read_config(path) == {
+        "contexts": {"target": {"url": "http://localhost:8000"}}
+    }
+
+
+def test_read_config_unsupported(tmp_path):
+    path = tmp_path / "proxy.ini"
+    path.write_text("")
+    with pytest.raises(ValueError):
+        read_config(path)
+
+
+async def test_config_builds_routes(tmp_path, target_url):
+    path = tmp_path / "proxy.json"
+    _write(
+        path,
+        {
+            "contexts": {"target": {"url": target_url}},
+            "routes": [
+                {
+                    "prefix": "/a",
+                    "context": "target",
+                    "rewrite": [{"prefix": "/a", "replacement": ""}],
+                    "middlewares": [
+                        {
+                            "phase": "proxy",
+                            "middleware": "tests.utils.proxy_middlewares:modify_request",
+                        }
+                    ],
+                },
+                {"prefix": "/ws", "context": "target", "type": "ws"},
+            ],
+        },
+    )
+    config = ProxyConfig(path)
+    config.load()
+
+    http_route, ws_route = config.router.routes
+    assert isinstance(http_route.handler, HTTPProxyHandler)
+    assert isinstance(http_route.handler._rewrite, RewriteRules)
+    assert http_route.handler.context is config.contexts["target"]
+    assert isinstance(ws_route.handler, WsProxyHandler)
+
+
+async def test_config_shares_connection_limit(tmp_path, target_url):
+    path = tmp_path / "proxy.json"
+    _write(
+        path,
+        {
+            "contexts": {"target": {"url": target_url}},
+            "routes": [
+                {"prefix": "/a", "context": "target", "type": "ws"},
+                {"prefix": "/b", "context": "target", "type": "ws"},
+                {
+                    "prefix": "/c",
+                    "context": "target",
+                    "type": "ws",
+                    "options": {"max_connections": 5},
+                },
+            ],
+        },
+    )
+    limit = ConnectionLimit(10)
+    config = ProxyConfig(path, connection_limit=limit)
+    config.load()
+
+    a, b, c = [route.handler for route in config.router.routes]
+    assert a._connection_limit is limit
+    assert b._connection_limit is limit
+    assert c._connection_limit.max_connections == 5
+
+    # Handlers rebuilt on reload keep the shared limit
+    path.write_text(path.read_text() + "\n")
+    assert await config.reload()
+    assert config.router.routes[0].handler is not a
+    assert config.router.routes[0].handler._connection_limit is limit
+    await config.contexts["target"].close_session()
+
+
+async def test_config_proxies(aiohttp_client, tmp_path, target_url):
+    path = tmp_path / "proxy.json"
+    _write(path, _config(target_url))
+    config = ProxyConfig(path)
+    app = web.Application()
+    config.setup(app)
+    client = await aiohttp_client(app)
+
+    resp = await client.get("/target/yell_path")
+    assert await resp.text() == "/yell_path!!!"
+
+
+async def test_config_reload_reuses_contexts(tmp_path, target_url):
+    path = tmp_path / "proxy.json"
+    _write(path, _config(target_url))
+    config = ProxyConfig(path)
+    config.load()
+    ctx = config.contexts["target"]
+    session = ctx.session
+
+    _write(path, _config(target_url, request_options={"allow_redirects": False}))
+    assert await config.reload()
+
+    route = config.router.routes[0]
+    assert config.contexts["target"] is ctx
+    assert route.handler.request_options == {"allow_redirects": False}
+    assert not session.closed
+
+    _write(path, _config("http://localhost:1"))
+    assert await config.reload()
+
+    assert config.contexts["target"] is not ctx
+    assert session.closed
+    await config.contexts["target"].close_session()
+
+
+async def test_config_reload_invalid(tmp_path, target_url):
+    path = tmp_path / "proxy.json"
+    _write(path, _config(target_url))
+    config = ProxyConfig(path)
+    config.load()
+    routes = config.router.routes
+
+    _write(path, {**_config(target_url), "routes": [{"prefix": "/", "context": "x"}]})
+    assert not await config.reload()
+    assert config.router.routes == routes
+    assert isinstance(routes[0].handler._rewrite, PrefixRewrite)
@@ -1,3 +1,4 @@
+import asyncio
 import unittest.mock
 from unittest.mock import MagicMock
 
@@ -9,6 +10,7 @@ from aiorp.base_handler import Rewrite
 from aiorp.context import ProxyContext
 from aiorp.http_handler import HTTPProxyHandler
 from aiorp.response import ResponseType
+from aiorp.timing import ChainTiming
 
 pytestmark = [
     pytest.mark.http_handler,
@@ -127,3 +129,70 @@ async def test_handler_raises_err(target_ctx):
     req = make_mocked_request(method="GET", path="/yell_path")
     with pytest.raises(HTTPUnauthorized):
         await handler(req)
+
+
+@pytest.mark.asyncio
+async def test_handler_closes_started_middlewares_on_error(target_ctx):
+    handler = HTTPProxyHandler(context=target_ctx)
+    closed = []
+
+    async def cleanup_middleware(context: ProxyContext):
+        try:
+            yield
+        finally:
+            closed.append(True)
+
+    handler.client_edge(cleanup_middleware)
+    handler.proxy(_error_raising_middleware)
+
+    req = make_mocked_request(method="GET", path="/yell_path")
+    with pytest.raises(HTTPUnauthorized):
+        await handler(req)
+    # Closed before the error reached the caller, not when garbage collected
+    assert closed == [True]
+
+
+@pytest.mark.asyncio
+async def test_handler_timing(target_ctx):
+    reported = []
+    handler = HTTPProxyHandler(
+        context=target_ctx, timing=ChainTiming(hook=lambda ctx: reported.append(ctx))
+    )
+
+    @handler.client_edge
+    async def auth(context: ProxyContext):
+        await asyncio.sleep(0.01)
+        yield
+
+    @handler.proxy
+    async def compress(context: ProxyContext):
+        yield
+        await asyncio.sleep(0.01)
+
+    req = make_mocked_request(method="GET", path="/yell_path")
+    resp = await handler(req)
+
+    ctx = reported[0]
+    assert [(t.name, t.phase) for t in ctx.timings] == [
+        ("auth", 0),
+        ("compress", 500),
+        ("proxy", None),
+    ]
+    assert ctx.timings[0].pre >= 0.01 > ctx.timings[0].post
+    assert ctx.timings[1].post >= 0.01 > ctx.timings[1].pre
+
+    entries = resp.headers["Server-Timing"].split(", ")
+    assert entries[0].startswith("auth;dur=")
+    assert entries[0].endswith(';desc="client_edge"')
+    assert entries[2].startswith("proxy;dur=")
+
+
+@pytest.mark.asyncio
+async def test_handler_timing_disabled(target_ctx):
+    handler = HTTPProxyHandler(context=target_ctx)
+    handler.proxy(_get_sample_middleware(0))
+
+    req = make_mocked_request(method="GET", path="/yell_path")
+    resp = await handler(req)
+
+    assert "Server-Timing" not in resp.headers
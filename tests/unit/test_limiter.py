@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from aioresponses import aioresponses
+
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.limiter import AdaptiveLimit, ConcurrencyLimiter
+
+pytestmark = [pytest.mark.unit]
+
+
+def _request(priority: int = 0) -> web.Request:
+    return make_mocked_request("GET", "/", headers={"X-Priority": str(priority)})
+
+
+async def _hold(
+    limiter: ConcurrencyLimiter, release: asyncio.Event, admitted: list, name
+):
+    async with limiter.acquire(_request(name if isinstance(name, int) else 0)):
+        admitted.append(name)
+        await release.wait()
+
+
+async def test_limiter_rejects_without_queue():
+    limiter = ConcurrencyLimiter(max_in_flight=1)
+    release, admitted = asyncio.Event(), []
+
+    task = asyncio.create_task(_hold(limiter, release, admitted, "a"))
+    await asyncio.sleep(0)
+    assert limiter.in_flight == 1
+
+    with pytest.raises(web.HTTPServiceUnavailable):
+        async with limiter.acquire(_request()):
+            pass
+
+    release.set()
+    await task
+    assert limiter.in_flight == 0
+
+
+async def test_limiter_queue_timeout():
+    limiter = ConcurrencyLimiter(max_in_flight=1, queue_size=1, queue_timeout=0.05)
+    release, admitted = asyncio.Event(), []
+
+    task = asyncio.create_task(_hold(limiter, release, admitted, "a"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(web.HTTPServiceUnavailable):
+        async with limiter.acquire(_request()):
+            pass
+    assert limiter.queued == 0
+
+    release.set()
+    await task
+
+
+@pytest.mark.parametrize(
+    "options, expected",
+    [
+        ({}, [1, 2, 3]),
+        ({"lifo": True}, [3, 2, 1]),
+        ({"priority": lambda req: -int(req.headers["X-Priority"])}, [3, 2, 1]),
+    ],
+)
+async def test_limiter_queue_order(options, expected):
+    limiter = ConcurrencyLimiter(max_in_flight=1, queue_size=3, **options)
+    release, admitted = asyncio.Event(), []
+
+    first = asyncio.create_task(_hold(limiter, release, admitted, 0))
+    await asyncio.sleep(0)
+    waiting = []
+    for name in [1, 2, 3]:
+        waiting.append(asyncio.create_task(_hold(limiter, release, admitted, name)))
+        await asyncio.sleep(0)
+    assert limiter.queued == 3
+
+    release.set()
+    await asyncio.gather(first, *waiting)
+    assert admitted == [0, *expected]
+    assert limiter.in_flight == 0
+    assert limiter.queued == 0
+
+
+async def test_limiter_cancelled_waiter():
+    limiter = ConcurrencyLimiter(max_in_flight=1, queue_size=1)
+    release, admitted = asyncio.Event(), []
+
+    first = asyncio.create_task(_hold(limiter, release, admitted, "a"))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(_hold(limiter, release, admitted, "b"))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    assert limiter.queued == 0
+
+    release.set()
+    await first
+    assert admitted == ["a"]
+    assert limiter.in_flight == 0
+
+
+async def test_limiter_queue_stays_bounded_while_stuck():
+    limiter = ConcurrencyLimiter(max_in_flight=1, queue_size=5)
+    release, admitted = asyncio.Event(), []
+
+    stuck = asyncio.create_task(_hold(limiter, release, admitted, "stuck"))
+    await asyncio.sleep(0)
+    for _ in range(200):
+        waiting = [
+            asyncio.create_task(_hold(limiter, release, admitted, "w"))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+    assert limiter.queued == 0
+    # The entries of the cancelled waiters don't pile up
+    assert len(limiter._queue) <= 10
+
+    release.set()
+    await stuck
+    assert admitted == ["stuck"]
+
+
+async def test_limiter_adaptive():
+    limiter = ConcurrencyLimiter(
+        max_in_flight=10,
+        adaptive=AdaptiveLimit(latency_threshold=0.01, min_limit=2, max_limit=11),
+    )
+
+    async with limiter.acquire(_request()):
+        pass
+    assert limiter.limit == 10
+
+    async def _slow():
+        async with limiter.acquire(_request()):
+            await asyncio.sleep(0.02)
+
+    # Concurrent slow requests back off only once
+    await asyncio.gather(*[_slow() for _ in range(5)])
+    assert limiter.limit == 9
+
+    await _slow()
+    assert limiter.limit == 8
+
+    for _ in range(50):
+        async with limiter.acquire(_request()):
+            pass
+    assert limiter.limit == 11
+
+
+async def test_http_handler_limiter(target_ctx):
+    target_ctx.limiter = ConcurrencyLimiter(max_in_flight=1)
+    handler = HTTPProxyHandler(context=target_ctx)
+    release = asyncio.Event()
+
+    @handler.client_edge
+    async def _wait(ctx):
+        await release.wait()
+        yield
+
+    with aioresponses() as mocked:
+        mocked.get(f"{target_ctx.url}/yell_path", status=200, body="OK", repeat=True)
+
+        first = asyncio.create_task(handler(make_mocked_request("GET", "/yell_path")))
+        await asyncio.sleep(0)
+        with pytest.raises(web.HTTPServiceUnavailable):
+            await handler(make_mocked_request("GET", "/yell_path"))
+
+        release.set()
+        resp = await first
+        assert resp.status == 200
+        assert len(mocked.requests) == 1
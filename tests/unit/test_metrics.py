@@ -0,0 +1,120 @@
+import pytest
+import yarl
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from aioresponses import aioresponses
+
+from aiorp.context import ProxyContext
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.metrics import Histogram, ProxyMetrics
+from aiorp.sse import EventStreaming
+from aiorp.ws_handler import WsProxyHandler
+
+pytestmark = [pytest.mark.unit]
+
+
+def test_histogram_buckets():
+    histogram = Histogram([0.1, 1.0])
+    for value in [0.05, 0.1, 0.5, 2]:
+        histogram.observe(value)
+
+    assert list(histogram.cumulative()) == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert histogram.sum == pytest.approx(2.65)
+    assert histogram.count == 4
+
+
+async def test_http_handler_metrics(target_ctx):
+    metrics = ProxyMetrics()
+    target = metrics.target("inventory")
+    handler = HTTPProxyHandler(context=target_ctx, metrics=target)
+
+    @handler.client_edge
+    async def _middleware(ctx):
+        yield
+
+    with aioresponses() as mocked:
+        mocked.get(f"{target_ctx.url}/yell_path", status=200, body="OK")
+        mocked.get(f"{target_ctx.url}/missing", status=404)
+
+        await handler(make_mocked_request("GET", "/yell_path"))
+        with pytest.raises(web.HTTPInternalServerError):
+            await handler(make_mocked_request("GET", "/missing"))
+
+    assert target.requests["2xx"] == 1
+    assert target.requests["5xx"] == 1
+    assert target.latency.count == 2
+    assert target.upstream_latency.count == 2
+    assert target.phase_latency["client_edge"].count == 1
+    assert target.bytes_out == 2
+
+    output = metrics.render()
+    assert 'aiorp_requests_total{target="inventory",status="2xx"} 1' in output
+    assert 'aiorp_request_duration_seconds_count{target="inventory"} 2' in output
+    assert (
+        'aiorp_middleware_duration_seconds_bucket{target="inventory",'
+        'phase="client_edge",le="+Inf"} 1'
+    ) in output
+
+
+async def test_http_handler_metrics_count_streamed_bytes(
+    aiohttp_server, aiohttp_client
+):
+    async def echo(request: web.Request) -> web.Response:
+        return web.Response(body=await request.read())
+
+    async def events(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b"data: first\n\n")
+        await response.write_eof()
+        return response
+
+    target_app = web.Application()
+    target_app.router.add_post("/echo", echo)
+    target_app.router.add_get("/events", events)
+    server = await aiohttp_server(target_app)
+    ctx = ProxyContext(url=yarl.URL(f"http://localhost:{server.port}"))
+    target = ProxyMetrics().target("stream")
+    handler = HTTPProxyHandler(
+        context=ctx, metrics=target, streaming=EventStreaming(heartbeat=None)
+    )
+    app = web.Application()
+    app.router.add_route("*", "/{path:.*}", handler)
+    client = await aiohttp_client(app)
+
+    async def _chunks():
+        for _ in range(3):
+            yield b"x" * 100
+
+    # Neither the chunked upload nor the event stream have a content length
+    resp = await client.post("/echo", data=_chunks())
+    assert await resp.read() == b"x" * 300
+    assert target.bytes_in == 300
+    assert target.bytes_out == 300
+
+    resp = await client.get("/events")
+    assert await resp.read() == b"data: first\n\n"
+    # The headers and chunk framing written for the stream are counted as well
+    assert target.bytes_out > 300 + len(b"data: first\n\n")
+    await ctx.close_session()
+
+
+async def test_ws_handler_metrics(aiohttp_client, ws_target_ctx):
+    metrics = ProxyMetrics()
+    target = metrics.target("live")
+    app = web.Application()
+    app.router.add_get("/", WsProxyHandler(context=ws_target_ctx, metrics=target))
+    metrics.setup(app)
+    client = await aiohttp_client(app)
+
+    async with client.ws_connect("/") as ws:
+        await ws.send_str("test")
+        await ws.receive()
+        assert target.websockets_active == 1
+
+        resp = await client.get("/metrics")
+        output = await resp.text()
+        assert 'aiorp_websockets_active{target="live"} 1' in output
+
+    assert target.websocket_messages["client_to_target"] == 1
+    assert target.websocket_messages["target_to_client"] == 1
@@ -0,0 +1,78 @@
+import asyncio
+from unittest import mock
+
+import pytest
+import yarl
+from aiohttp import StreamReader, web
+from aiohttp.test_utils import make_mocked_request
+
+from aiorp.context import ProxyContext
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.mirror import Mirror
+
+pytestmark = [pytest.mark.unit]
+
+
+@pytest.fixture
+async def shadow(aiohttp_server):
+    received = []
+    release = asyncio.Event()
+
+    async def _record(request: web.Request) -> web.Response:
+        received.append(
+            (request.method, request.path_qs, request.host, await request.read())
+        )
+        if request.method == "GET":
+            await release.wait()
+        return web.Response(status=500)
+
+    app = web.Application()
+    app.router.add_route("*", "/{path:.*}", _record)
+    server = await aiohttp_server(app)
+    context = ProxyContext(url=yarl.URL(f"http://localhost:{server.port}"))
+    yield context, received, release
+
+    release.set()
+    await context.close_session()
+
+
+async def test_mirror_copies_requests(target_ctx, shadow):
+    context, received, _ = shadow
+    mirror = Mirror(context)
+    handler = HTTPProxyHandler(context=target_ctx)
+    handler.target_edge(mirror.mirror)
+
+    payload = StreamReader(protocol=mock.Mock(), limit=1024**2)
+    payload.feed_data(b'{"id": 1}')
+    payload.feed_eof()
+    req = make_mocked_request("POST", "/upload?a=1", payload=payload)
+    # The failing shadow target doesn't affect the response
+    assert (await handler(req)).status == 204
+
+    await asyncio.gather(*mirror._tasks)
+    assert received == [("POST", "/upload?a=1", "localhost", b'{"id": 1}')]
+    assert mirror.sent == 1
+
+
+async def test_mirror_drops_over_limit_and_samples(target_ctx, shadow):
+    context, received, release = shadow
+    mirror = Mirror(context, max_in_flight=1)
+    handler = HTTPProxyHandler(context=target_ctx)
+    handler.target_edge(mirror.mirror)
+
+    for _ in range(3):
+        # Responding doesn't wait for the slow shadow target
+        resp = await asyncio.wait_for(
+            handler(make_mocked_request("GET", "/yell_path")), timeout=1
+        )
+        assert resp.status == 200
+    assert mirror.in_flight == 1
+    assert mirror.dropped == 2
+
+    mirror.fraction = 0
+    await handler(make_mocked_request("GET", "/yell_path"))
+    assert mirror.dropped == 2
+
+    await mirror.close()
+    assert mirror.in_flight == 0
+    assert mirror.sent == 0
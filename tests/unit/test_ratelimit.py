@@ -0,0 +1,118 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from aioresponses import aioresponses
+
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.ratelimit import (
+    SlidingWindow,
+    TokenBucket,
+    by_client_ip,
+    by_header,
+    by_state,
+    rate_limit,
+)
+
+pytestmark = [pytest.mark.unit]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def test_token_bucket_burst_and_refill():
+    clock = _Clock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+    for _ in range(3):
+        assert await bucket.acquire("a") == 0
+    assert await bucket.acquire("a") == pytest.approx(0.5)
+    # Other keys have their own bucket
+    assert await bucket.acquire("b") == 0
+
+    clock.now += 0.5
+    assert await bucket.acquire("a") == 0
+    assert await bucket.acquire("a") > 0
+
+
+async def test_token_bucket_evicts_idle_keys():
+    clock = _Clock()
+    bucket = TokenBucket(rate=1, burst=2, clock=clock)
+
+    await bucket.acquire("a")
+    clock.now += 1
+    await bucket.acquire("b")
+    assert len(bucket) == 2
+
+    clock.now += 1.5
+    await bucket.acquire("b")
+    assert len(bucket) == 1
+
+
+async def test_sliding_window():
+    clock = _Clock()
+    window = SlidingWindow(limit=4, window=10, clock=clock)
+
+    for _ in range(4):
+        assert await window.acquire("a") == 0
+    assert await window.acquire("a") == pytest.approx(10)
+
+    # Half way through the next window, half of the previous count still counts
+    clock.now += 15
+    assert await window.acquire("a") == 0
+    assert await window.acquire("a") == 0
+    assert await window.acquire("a") == pytest.approx(2.5)
+
+    clock.now += 20
+    assert await window.acquire("a") == 0
+    assert len(window) == 1
+
+
+def test_backend_validation():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, burst=1)
+    with pytest.raises(ValueError):
+        SlidingWindow(limit=1, window=0)
+
+
+async def test_rate_limit_middleware(target_ctx):
+    handler = HTTPProxyHandler(context=target_ctx)
+    handler.client_edge(
+        rate_limit(TokenBucket(rate=0.1, burst=1), key=by_header("X-Api-Key"))
+    )
+
+    with aioresponses() as mocked:
+        mocked.get(f"{target_ctx.url}/yell_path", status=200, body="OK", repeat=True)
+
+        req = make_mocked_request("GET", "/yell_path", headers={"X-Api-Key": "key"})
+        resp = await handler(req)
+        assert resp.status == 200
+
+        with pytest.raises(web.HTTPTooManyRequests) as exc:
+            await handler(req)
+        assert exc.value.headers["Retry-After"] == "10"
+        assert len(mocked.requests) == 1
+
+        # Requests without a key are not limited
+        resp = await handler(make_mocked_request("GET", "/yell_path"))
+        assert resp.status == 200
+
+
+def test_key_functions(target_ctx):
+    ctx = target_ctx
+    ctx.state = {"user": {"sub": "alice"}}
+    ctx.set_request(
+        make_mocked_request(
+            "GET", "/", headers={"X-Forwarded-For": "10.0.0.1, 10.0.0.2"}
+        )
+    )
+
+    assert by_client_ip(forwarded=True)(ctx) == "10.0.0.1"
+    assert by_client_ip()(ctx) == ctx.request.in_req.remote
+    assert by_state("user", "sub")(ctx) == "alice"
+    assert by_state("user", "missing")(ctx) is None
+    assert by_header("X-Forwarded-For")(ctx) == "10.0.0.1, 10.0.0.2"
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from aiohttp import WSCloseCode, WSMsgType, web
+from aiohttp.test_utils import make_mocked_request
+
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.registry import ConnectionRegistry
+from aiorp.ws_handler import WsProxyHandler
+
+pytestmark = [pytest.mark.unit]
+
+
+async def test_registry_rejects_when_closing():
+    registry = ConnectionRegistry()
+    assert await registry.drain(timeout=0.1)
+
+    with pytest.raises(web.HTTPServiceUnavailable):
+        with registry.track_request():
+            pass
+
+
+async def test_registry_drain_waits_for_requests():
+    registry = ConnectionRegistry()
+
+    async def _request():
+        with registry.track_request():
+            await asyncio.sleep(0.1)
+
+    task = asyncio.create_task(_request())
+    await asyncio.sleep(0)
+    assert registry.in_flight == 1
+
+    assert await registry.drain(timeout=1)
+    assert registry.in_flight == 0
+    await task
+
+
+async def test_registry_drain_timeout():
+    registry = ConnectionRegistry()
+
+    async def _request():
+        with registry.track_request():
+            await asyncio.sleep(1)
+
+    task = asyncio.create_task(_request())
+    await asyncio.sleep(0)
+
+    assert not await registry.drain(timeout=0.05)
+    task.cancel()
+
+
+async def test_registry_drain_http_handler(target_ctx):
+    handler = HTTPProxyHandler(context=target_ctx)
+    await target_ctx.registry.drain(timeout=0.1)
+
+    req = make_mocked_request(method="GET", path="/yell_path")
+    with pytest.raises(web.HTTPServiceUnavailable):
+        await handler(req)
+
+
+async def test_registry_drain_closes_sockets(aiohttp_client, ws_target_ctx):
+    app = web.Application()
+    app.router.add_get("/", WsProxyHandler(context=ws_target_ctx))
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/") as ws:
+        await ws.send_str("test")
+        await ws.receive()
+        assert ws_target_ctx.registry.sockets == 1
+
+        drained = asyncio.create_task(ws_target_ctx.registry.drain(timeout=1))
+        msg = await ws.receive()
+
+    assert msg.type == WSMsgType.CLOSE
+    assert msg.data == WSCloseCode.GOING_AWAY
+    assert await drained
+    assert ws_target_ctx.registry.sockets == 0
@@ -1,9 +1,11 @@
+import re
+
 import pytest
 import yarl
 from aiohttp.test_utils import make_mocked_request
 
 from aiorp.request import ProxyRequest
-from aiorp.rewrite import Rewrite
+from aiorp.rewrite import PrefixRewrite, RegexRewrite, Rewrite, RewriteRules
 
 pytestmark = [
     pytest.mark.unit,
@@ -27,3 +29,113 @@ def test_rewrite_path():
     rewrite = Rewrite(rfrom="new", rto="old")
     proxy_request.url = rewrite.execute(proxy_request.url)
     assert proxy_request.url.path == "/old/path"
+
+
+def test_prefix_rewrite_segment_boundaries():
+    """Test that the prefix is only matched on segment boundaries"""
+    rewrite = PrefixRewrite("/api", "/v1")
+    assert rewrite.execute(yarl.URL("http://x/api/users")).path == "/v1/users"
+    assert rewrite.execute(yarl.URL("http://x/api")).path == "/v1"
+    assert rewrite.execute(yarl.URL("http://x/api-docs")).path == "/api-docs"
+    assert rewrite.execute(yarl.URL("http://x/v1/api")).path == "/v1/api"
+
+
+def test_prefix_rewrite_strip():
+    """Test that an empty replacement strips the prefix"""
+    rewrite = PrefixRewrite("/http/", "")
+    assert rewrite.execute(yarl.URL("http://x/http/yell")).path == "/yell"
+    assert rewrite.execute(yarl.URL("http://x/http")).path == "/"
+
+
+def test_regex_rewrite_groups():
+    """Test that regex rewrites can reference capture groups"""
+    rewrite = RegexRewrite(r"^/users/(\d+)/posts", r"/posts/by/\1")
+    assert rewrite.index_prefix == "/users/"
+    url = rewrite.execute(yarl.URL("http://x/users/42/posts/1"))
+    assert url.path == "/posts/by/42/1"
+    assert rewrite.execute(yarl.URL("http://x/users/me")).path == "/users/me"
+
+
+def test_regex_rewrite_index_prefix():
+    """Test that regex rules are indexed under a prefix of every path they match"""
+    assert RegexRewrite(r"^/api/v1|^/legacy/v1", "/v1").index_prefix == "/"
+    assert RegexRewrite(re.compile(r"^/API/(\w+)", re.I), "/x").index_prefix == "/"
+    assert RegexRewrite(r"^/api/?x", "/x").index_prefix == "/"
+    assert RegexRewrite(r"^/api/items+", "/x").index_prefix == "/api/"
+
+    rules = RewriteRules(
+        [
+            RegexRewrite(r"^/api/v1|^/legacy/v1", "/v1"),
+            RegexRewrite(re.compile(r"^/API/(\w+)", re.I), r"/upper/\1"),
+            RegexRewrite(r"^/api/?x", "/x"),
+        ]
+    )
+    assert rules.execute(yarl.URL("http://x/legacy/v1/a")).path == "/v1/a"
+    assert rules.execute(yarl.URL("http://x/api/items")).path == "/upper/items"
+    assert rules.execute(yarl.URL("http://x/apix/a")).path == "/x/a"
+
+
+def test_rewrite_apply_host_and_query():
+    """Test that the host and query parameters are rewritten on match"""
+    mock_request = make_mocked_request("GET", "/api/items?debug=1&page=2")
+    proxy_request = ProxyRequest(yarl.URL("http://localhost:8000"), mock_request)
+    rewrite = PrefixRewrite(
+        "/api", "", host="internal.local", query={"debug": None, "source": "proxy"}
+    )
+
+    assert rewrite.apply(proxy_request)
+    assert proxy_request.url.path == "/items"
+    assert proxy_request.headers["Host"] == "internal.local"
+    assert proxy_request.params == {"page": "2", "source": "proxy"}
+
+
+def test_rewrite_rules_first_match_wins():
+    """Test that the rules are evaluated in order"""
+    rules = RewriteRules(
+        [
+            PrefixRewrite("/api/v2", "/new"),
+            RegexRewrite(r"^/api/(\w+)", r"/legacy/\1"),
+            PrefixRewrite("/api", "/fallback"),
+            Rewrite("/static", "/assets"),
+        ]
+    )
+    assert rules.execute(yarl.URL("http://x/api/v2/items")).path == "/new/items"
+    assert rules.execute(yarl.URL("http://x/api/items")).path == "/legacy/items"
+    assert rules.execute(yarl.URL("http://x/api")).path == "/fallback"
+    assert rules.execute(yarl.URL("http://x/web/static/a")).path == "/web/assets/a"
+    assert rules.execute(yarl.URL("http://x/other")).path == "/other"
+
+
+def test_rewrite_rules_many():
+    """Test that only matching rules are evaluated"""
+    rules = RewriteRules([PrefixRewrite(f"/service{i}", f"/s{i}") for i in range(500)])
+    assert rules.match("/service321/x") is rules.rules[321]
+    assert rules.execute(yarl.URL("http://x/service499")).path == "/s499"
+    assert rules.match("/unknown") is None
+
+
+def test_reverse_path():
+    """Test that the rewrites map target paths back to client paths"""
+    assert PrefixRewrite("/inventory", "/shops").reverse_path("/shops/1") == (
+        "/inventory/1"
+    )
+    assert PrefixRewrite("/inventory", "/shops").reverse_path("/shopsx") is None
+    assert PrefixRewrite("/http", "").reverse_path("/") == "/http"
+    assert PrefixRewrite("/http", "").reverse_path("/a") == "/http/a"
+    # Replacing every occurrence isn't reversible, the paths are left as is
+    assert Rewrite("/old", "/new").reverse_path("/x/new") is None
+    assert Rewrite("/mytarget", "/").reverse_path("/foo/bar") is None
+    assert Rewrite("/inventory", "/shops").reverse_path("/shops/1/shops") is None
+    assert PrefixRewrite("/inventory", "/shops").reverse_path("/shops/1/shops") == (
+        "/inventory/1/shops"
+    )
+    assert RegexRewrite(r"^/u/(\d+)", r"/users/\1").reverse_path("/users/1") is None
+
+    rewrite = RegexRewrite(
+        r"^/u/(\d+)", r"/users/\1", reverse=(r"^/users/(\d+)", r"/u/\1")
+    )
+    assert rewrite.reverse_path("/users/1/posts") == "/u/1/posts"
+
+    rules = RewriteRules([PrefixRewrite("/a", "/x"), PrefixRewrite("/b", "/y")])
+    assert rules.reverse_path("/y/1") == "/b/1"
+    assert rules.reverse_path("/z") is None
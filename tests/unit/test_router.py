@@ -0,0 +1,86 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.rewrite import PrefixRewrite
+from aiorp.router import ProxyRoute, ProxyRouter
+
+pytestmark = [pytest.mark.unit]
+
+
+def _handler(name: str):
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(text=name)
+
+    return handler
+
+
+async def test_router_longest_prefix():
+    router = ProxyRouter(
+        {
+            "/api": _handler("api"),
+            "/api/v2": _handler("v2"),
+            "/": _handler("root"),
+        }
+    )
+
+    for path, expected in [
+        ("/api/users", "api"),
+        ("/api/v2/users", "v2"),
+        ("/api-docs", "root"),
+        ("/other", "root"),
+    ]:
+        resp = await router(make_mocked_request("GET", path))
+        assert resp.text == expected
+
+
+async def test_router_host_routes():
+    router = ProxyRouter(
+        [
+            ProxyRoute("/", _handler("any")),
+            ProxyRoute("/", _handler("shop"), host="shop.example.com"),
+        ]
+    )
+
+    req = make_mocked_request("GET", "/", headers={"Host": "Shop.example.com:8080"})
+    assert (await router(req)).text == "shop"
+    req = make_mocked_request("GET", "/", headers={"Host": "other.example.com"})
+    assert (await router(req)).text == "any"
+
+
+async def test_router_not_found():
+    router = ProxyRouter({"/api": _handler("api")})
+    with pytest.raises(web.HTTPNotFound):
+        await router(make_mocked_request("GET", "/apix"))
+
+
+def test_router_duplicate_route():
+    router = ProxyRouter({"/api": _handler("api")})
+    with pytest.raises(ValueError):
+        router.add("/api/", _handler("api"))
+
+
+async def test_router_reload():
+    router = ProxyRouter({"/a": _handler("a")})
+    router.reload({"/b": _handler("b")})
+
+    assert router.resolve(make_mocked_request("GET", "/a")) is None
+    assert (await router(make_mocked_request("GET", "/b/1"))).text == "b"
+
+
+async def test_router_setup(aiohttp_client, target_ctx):
+    app = web.Application()
+    router = ProxyRouter()
+    router.add(
+        "/target",
+        HTTPProxyHandler(context=target_ctx, rewrite=PrefixRewrite("/target", "")),
+    )
+    router.setup(app)
+    client = await aiohttp_client(app)
+
+    resp = await client.get("/target/yell_path")
+    assert await resp.text() == "/yell_path!!!"
+
+    resp = await client.get("/unknown")
+    assert resp.status == 404
@@ -0,0 +1,71 @@
+import sys
+import types
+
+import pytest
+from aiohttp import web
+
+from aiorp import runner
+from aiorp.runner import RunConfig, loop_factory, run
+
+pytestmark = [pytest.mark.unit]
+
+
+def test_run_app_options():
+    assert RunConfig(backlog=10, keepalive_timeout=5).run_app_options() == {
+        "backlog": 10,
+        "keepalive_timeout": 5,
+        "handler_cancellation": True,
+    }
+    options = RunConfig(access_log_format="%a %s").run_app_options()
+    assert options["access_log_format"] == "%a %s"
+    options = RunConfig(access_log=False, access_log_format="%a").run_app_options()
+    assert options["access_log"] is None
+    assert "access_log_format" not in options
+
+
+def test_loop_factory(monkeypatch):
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    assert loop_factory() is None
+
+    fake_uvloop = types.ModuleType("uvloop")
+    fake_uvloop.new_event_loop = object()
+    monkeypatch.setitem(sys.modules, "uvloop", fake_uvloop)
+    assert loop_factory() is fake_uvloop.new_event_loop
+    assert loop_factory(use_uvloop=False) is None
+
+
+def test_run_single_process(monkeypatch):
+    calls = []
+    monkeypatch.setattr(runner, "loop_factory", lambda _: None)
+    monkeypatch.setattr(web, "run_app", lambda app, **kwargs: calls.append(kwargs))
+
+    run(web.Application, RunConfig(port=9000, reuse_port=True, access_log=False))
+
+    assert calls == [
+        {
+            "host": "0.0.0.0",
+            "port": 9000,
+            "reuse_port": True,
+            "shutdown_timeout": 60.0,
+            "loop": None,
+            "backlog": 1024,
+            "keepalive_timeout": 75.0,
+            "handler_cancellation": True,
+            "access_log": None,
+        }
+    ]
+
+
+def test_run_workers(monkeypatch):
+    supervisors = []
+    monkeypatch.setattr(
+        runner.WorkerSupervisor, "run", lambda self: supervisors.append(self)
+    )
+
+    run(web.Application, RunConfig(workers=3, shutdown_timeout=5, uvloop=False))
+
+    (supervisor,) = supervisors
+    assert supervisor.workers == 3
+    assert supervisor.shutdown_timeout == 5
+    assert supervisor.loop_factory is None
+    assert supervisor.run_app_options["backlog"] == 1024
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+
+import pytest
+
+from aiorp.ratelimit import SlidingWindow, TokenBucket
+from aiorp.shared import SharedTable
+
+pytestmark = [pytest.mark.unit]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_table_values_and_expiry():
+    clock = _Clock()
+    table = SharedTable(slots=16, width=2, clock=clock)
+
+    assert table.get("a") is None
+    assert table.add("a", 2, ttl=10) == 2
+    assert table.add("a", -0.5, index=1, ttl=10) == -0.5
+    assert table.get("a") == [2, -0.5]
+
+    table.set("b", [1])
+    assert table.get("b") == [1, 0]
+    assert len(table) == 2
+
+    clock.now += 10
+    assert table.get("a") is None
+    # Entries without a ttl never expire
+    assert table.get("b") == [1, 0]
+
+    table.delete("b")
+    assert table.get("b") is None
+    assert len(table) == 0
+
+    with pytest.raises(ValueError):
+        table.set("c", [1, 2, 3])
+
+
+def test_table_entry_left_empty_is_not_stored():
+    table = SharedTable(slots=16, width=2)
+
+    with table.entry("a") as entry:
+        assert entry == []
+    assert table.get("a") is None
+
+    with table.entry("a") as entry:
+        entry[:] = [1.0, 2.0]
+    with table.entry("a") as entry:
+        entry[0] += 1
+    assert table.get("a") == [2, 2]
+
+
+def test_table_evicts_entries_closest_to_expiry():
+    clock = _Clock()
+    # A single bucket of 8 slots
+    table = SharedTable(slots=8, width=1, clock=clock)
+
+    for index in range(8):
+        table.set(index, [index], ttl=10 + index)
+    table.set("new", [1], ttl=100)
+
+    assert len(table) == 8
+    assert table.get(0) is None
+    assert table.get(1) == [1]
+    assert table.get("new") == [1]
+
+
+def _increment(table: SharedTable, count: int):
+    for _ in range(count):
+        table.add("counter")
+
+
+def test_table_is_shared_by_forked_processes():
+    table = SharedTable(slots=64, width=1)
+    mp = multiprocessing.get_context("fork")
+    processes = [mp.Process(target=_increment, args=(table, 500)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    _increment(table, 500)
+    for process in processes:
+        process.join()
+
+    assert table.get("counter") == [2500]
+
+
+def _drain(bucket: TokenBucket, results):
+    async def _acquire():
+        return sum([await bucket.acquire("client") == 0 for _ in range(50)])
+
+    results.put(asyncio.run(_acquire()))
+
+
+def test_shared_token_bucket_limits_across_processes():
+    bucket = TokenBucket(rate=0.001, burst=60, store=SharedTable(slots=64, width=2))
+    mp = multiprocessing.get_context("fork")
+    results = mp.Queue()
+    processes = [mp.Process(target=_drain, args=(bucket, results)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    allowed = sum(results.get(timeout=10) for _ in processes)
+    for process in processes:
+        process.join()
+
+    assert allowed == 60
+
+
+async def test_shared_sliding_window():
+    clock = _Clock()
+    window = SlidingWindow(
+        limit=2, window=10, clock=clock, store=SharedTable(width=3, clock=clock)
+    )
+
+    assert await window.acquire("a") == 0
+    assert await window.acquire("a") == 0
+    assert await window.acquire("a") > 0
+    clock.now += 20
+    assert await window.acquire("a") == 0
+
+
+def test_shared_backend_requires_table_width():
+    with pytest.raises(ValueError):
+        SlidingWindow(limit=2, window=10, store=SharedTable(width=2))
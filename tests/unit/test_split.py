@@ -0,0 +1,108 @@
+from collections import Counter
+
+import pytest
+import yarl
+from aiohttp.test_utils import make_mocked_request
+from aioresponses import aioresponses
+
+from aiorp.context import ProxyContext
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.split import SplitTarget, TrafficSplit, _AliasTable
+from aiorp.ws_handler import WsProxyHandler
+
+pytestmark = [pytest.mark.unit]
+
+
+@pytest.mark.parametrize(
+    "weights", [[1], [1, 3], [5, 0, 95], [2, 2, 2], [0.1, 0.7, 0.2, 1e-3]]
+)
+def test_alias_table_matches_weights(weights):
+    table = _AliasTable(weights)
+    points = 100_000
+    picks = Counter(table.pick(i / points) for i in range(points))
+
+    total = sum(weights)
+    for index, weight in enumerate(weights):
+        assert picks[index] / points == pytest.approx(weight / total, abs=1e-4)
+
+
+def _split(**kwargs) -> TrafficSplit:
+    return TrafficSplit(
+        [
+            SplitTarget("stable", ProxyContext(url=yarl.URL("http://stable")), 9),
+            SplitTarget("canary", ProxyContext(url=yarl.URL("http://canary")), 1),
+        ],
+        **kwargs,
+    )
+
+
+def _host(split: TrafficSplit, **kwargs) -> str:
+    return split.select(make_mocked_request("GET", "/", **kwargs)).url.host
+
+
+def test_split_is_sticky_by_header_or_cookie():
+    split = _split(header="X-User", cookie="session")
+
+    hosts = {
+        user: _host(split, headers={"X-User": f"user-{user}"}) for user in range(1000)
+    }
+    assert 50 < Counter(hosts.values())["canary"] < 150
+    for user, host in hosts.items():
+        assert _host(split, headers={"X-User": f"user-{user}"}) == host
+
+    # The cookie is used without the header, hashed the same way
+    assert _host(split, headers={"Cookie": "session=user-1"}) == hosts[1]
+
+
+def test_split_override_header():
+    split = _split(override_header="X-Target")
+
+    for _ in range(20):
+        assert _host(split, headers={"X-Target": "canary"}) == "canary"
+    # Unknown targets are ignored
+    assert _host(split, headers={"X-Target": "other"}) in ("stable", "canary")
+
+
+def test_split_set_weights():
+    split = _split()
+
+    split.set_weights({"stable": 0})
+    assert {_host(split) for _ in range(20)} == {"canary"}
+    assert [target.weight for target in split.targets] == [0, 1]
+
+    with pytest.raises(ValueError):
+        split.set_weights({"canary": 0})
+    with pytest.raises(ValueError):
+        split.set_weights({"other": 1})
+    # The split is unchanged by the failed updates
+    assert _host(split) == "canary"
+
+
+def test_split_validation():
+    ctx = ProxyContext(url=yarl.URL("http://stable"))
+    with pytest.raises(ValueError):
+        TrafficSplit([])
+    with pytest.raises(ValueError):
+        TrafficSplit([SplitTarget("a", ctx, 1), SplitTarget("a", ctx, 1)])
+    with pytest.raises(ValueError):
+        TrafficSplit([SplitTarget("a", ctx, -1)])
+    with pytest.raises(ValueError):
+        TrafficSplit([SplitTarget("a", ctx, 0)])
+
+
+async def test_handlers_proxy_to_selected_context():
+    split = _split(override_header="X-Target")
+    handler = HTTPProxyHandler(split=split)
+
+    with aioresponses() as mocked:
+        mocked.get("http://canary/yell_path", status=200, body="canary")
+        resp = await handler(
+            make_mocked_request("GET", "/yell_path", headers={"X-Target": "canary"})
+        )
+    assert resp.body == b"canary"
+
+    for ctx in split.contexts:
+        await ctx.close_session()
+
+    with pytest.raises(ValueError):
+        await WsProxyHandler()(make_mocked_request("GET", "/"))
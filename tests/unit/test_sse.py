@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+import yarl
+from aiohttp import web
+
+from aiorp.context import ProxyContext
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.sse import EventStreaming, read_events
+
+pytestmark = [pytest.mark.unit]
+
+
+class _EventTarget:
+    """Target streaming an event, then the next ones once released"""
+
+    def __init__(self):
+        self.opened = 0
+        self.release = asyncio.Event()
+
+    async def events(self, request: web.Request) -> web.StreamResponse:
+        self.opened += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b"id: 1\ndata: first\n\n")
+        await self.release.wait()
+        await response.write(b"data: second\r\ndata: line\r\n\r\n")
+        await response.write_eof()
+        return response
+
+    async def idle(self, request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await self.release.wait()
+        return response
+
+
+@pytest.fixture
+async def proxy(aiohttp_server, aiohttp_client):
+    target = _EventTarget()
+    target_app = web.Application()
+    target_app.router.add_get("/events", target.events)
+    target_app.router.add_get("/idle", target.idle)
+    server = await aiohttp_server(target_app)
+    ctx = ProxyContext(url=yarl.URL(f"http://localhost:{server.port}"))
+
+    async def _client(streaming: EventStreaming):
+        app = web.Application()
+        app.router.add_get(
+            "/{path:.*}", HTTPProxyHandler(context=ctx, streaming=streaming)
+        )
+        return await aiohttp_client(app)
+
+    yield target, _client
+    target.release.set()
+    await ctx.close_session()
+
+
+async def _read(resp, count: int) -> list:
+    events = []
+    async for event in read_events(resp.content):
+        events.append(event)
+        if len(events) == count:
+            break
+    return events
+
+
+async def test_events_are_streamed_as_they_arrive(proxy):
+    target, client = proxy
+    client = await client(EventStreaming())
+
+    resp = await client.get("/events")
+    assert resp.headers["Content-Type"] == "text/event-stream"
+    assert resp.headers["Cache-Control"] == "no-cache"
+    # The first event arrives while the target still holds the stream open
+    assert await asyncio.wait_for(_read(resp, 1), 1) == [b"id: 1\ndata: first\n\n"]
+
+    target.release.set()
+    assert await resp.content.read() == b"data: second\r\ndata: line\r\n\r\n"
+
+
+async def test_heartbeat_and_idle_timeout(proxy):
+    _, client = proxy
+    client = await client(EventStreaming(idle_timeout=0.3, heartbeat=0.1))
+
+    resp = await client.get("/idle")
+    # Heartbeats are sent while waiting, the stream ends once the target is idle
+    body = await asyncio.wait_for(resp.content.read(), 2)
+    assert body and set(body.split(b"\n\n")) == {b":", b""}
+
+
+async def test_fan_out_shares_target_stream(proxy):
+    target, client = proxy
+    client = await client(EventStreaming(fan_out=True))
+
+    first = await client.get("/events")
+    assert await _read(first, 1) == [b"id: 1\ndata: first\n\n"]
+    second = await client.get("/events")
+    assert target.opened == 1
+
+    target.release.set()
+    # Clients joining the stream receive the events from then on
+    assert await _read(first, 1) == [b"data: second\r\ndata: line\r\n\r\n"]
+    assert await second.content.read() == b"data: second\r\ndata: line\r\n\r\n"
+
+
+async def test_fan_out_does_not_share_streams_with_credentials(proxy):
+    target, client = proxy
+    client = await client(EventStreaming(fan_out=True))
+
+    first = await client.get("/events", headers={"Authorization": "Bearer alice"})
+    assert await _read(first, 1) == [b"id: 1\ndata: first\n\n"]
+    second = await client.get("/events", headers={"Cookie": "session=bob"})
+    assert await _read(second, 1) == [b"id: 1\ndata: first\n\n"]
+    assert target.opened == 2
+
+
+async def test_fan_out_shares_streams_by_key(proxy):
+    target, client = proxy
+    client = await client(
+        EventStreaming(
+            fan_out=True, key=lambda ctx: ctx.request.headers.get("Authorization")
+        )
+    )
+
+    first = await client.get("/events", headers={"Authorization": "Bearer alice"})
+    assert await _read(first, 1) == [b"id: 1\ndata: first\n\n"]
+    await client.get("/events", headers={"Authorization": "Bearer alice"})
+    assert target.opened == 1
+    other = await client.get("/events", headers={"Authorization": "Bearer bob"})
+    assert await _read(other, 1) == [b"id: 1\ndata: first\n\n"]
+    assert target.opened == 2
+
+
+def test_streaming_disables_total_timeout():
+    handler = HTTPProxyHandler(streaming=EventStreaming(idle_timeout=60))
+    timeout = handler.request_options["timeout"]
+    assert timeout.total is None
+    assert timeout.sock_read == 60
+
+    handler = HTTPProxyHandler(
+        streaming=EventStreaming(), request_options={"timeout": None}
+    )
+    assert handler.request_options["timeout"] is None
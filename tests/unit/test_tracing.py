@@ -0,0 +1,122 @@
+import asyncio
+from typing import List
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from aioresponses import aioresponses
+
+from aiorp.http_handler import HTTPProxyHandler
+from aiorp.tracing import BatchExporter, Span, SpanExporter, Tracer, parse_traceparent
+
+pytestmark = [pytest.mark.unit]
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class _Exporter(SpanExporter):
+    def __init__(self):
+        self.batches: List[List[Span]] = []
+
+    async def export(self, spans: List[Span]):
+        self.batches.append(spans)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (f"00-{TRACE_ID}-{PARENT_ID}-01", (TRACE_ID, PARENT_ID, True)),
+        (f"00-{TRACE_ID}-{PARENT_ID}-00", (TRACE_ID, PARENT_ID, False)),
+        (f"01-{TRACE_ID}-{PARENT_ID}-01-future", (TRACE_ID, PARENT_ID, True)),
+        (f"00-{TRACE_ID}-{PARENT_ID}-01-extra", None),
+        (f"ff-{TRACE_ID}-{PARENT_ID}-01", None),
+        (f"00-{'0' * 32}-{PARENT_ID}-01", None),
+        (f"00-{TRACE_ID.upper()}-{PARENT_ID}-01", None),
+        (None, None),
+    ],
+)
+def test_parse_traceparent(value, expected):
+    assert parse_traceparent(value) == expected
+
+
+async def test_tracer_propagates_parent(target_ctx):
+    exporter = _Exporter()
+    tracer = Tracer(exporter)
+    handler = HTTPProxyHandler(context=target_ctx)
+    handler.client_edge(tracer.trace)
+
+    with aioresponses() as mocked:
+        mocked.get(f"{target_ctx.url}/yell_path", status=200, body="OK")
+        req = make_mocked_request(
+            "GET",
+            "/yell_path",
+            headers={
+                "traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01",
+                "tracestate": "vendor=value",
+            },
+        )
+        await handler(req)
+        sent = list(mocked.requests.values())[0][0].kwargs["headers"]
+
+    await tracer.batch.flush()
+    (span,) = exporter.batches[0]
+    assert span.trace_id == TRACE_ID
+    assert span.parent_id == PARENT_ID
+    assert span.attributes["http.response.status_code"] == 200
+    assert span.end >= span.start
+    assert sent["traceparent"] == f"00-{TRACE_ID}-{span.span_id}-01"
+    assert sent["tracestate"] == "vendor=value"
+
+
+async def test_tracer_new_trace_and_sampling(target_ctx):
+    exporter = _Exporter()
+    tracer = Tracer(exporter, sample_rate=0)
+    handler = HTTPProxyHandler(context=target_ctx)
+    handler.client_edge(tracer.trace)
+
+    with aioresponses() as mocked:
+        mocked.get(f"{target_ctx.url}/yell_path", status=200, body="OK")
+        req = make_mocked_request(
+            "GET", "/yell_path", headers={"tracestate": "vendor=value"}
+        )
+        await handler(req)
+        sent = list(mocked.requests.values())[0][0].kwargs["headers"]
+
+    assert parse_traceparent(sent["traceparent"])[2] is False
+    assert "tracestate" not in sent
+    await tracer.batch.flush()
+    assert not exporter.batches
+
+
+async def test_tracer_records_failed_requests(target_ctx):
+    exporter = _Exporter()
+    tracer = Tracer(exporter)
+    handler = HTTPProxyHandler(context=target_ctx)
+    handler.client_edge(tracer.trace)
+    spans = []
+    tracer.batch.add = spans.append
+
+    with aioresponses() as mocked:
+        mocked.get(f"{target_ctx.url}/yell_path", status=500)
+        with pytest.raises(web.HTTPInternalServerError):
+            await handler(make_mocked_request("GET", "/yell_path"))
+
+    # The span is recorded by the time the request failed
+    (span,) = spans
+    assert span.error
+    assert span.end is not None
+
+
+async def test_batch_exporter_batches_and_drops():
+    exporter = _Exporter()
+    batch = BatchExporter(exporter, max_batch_size=2, max_queue_size=3, interval=10)
+
+    for _ in range(4):
+        batch.add(Span(TRACE_ID, PARENT_ID, None, "proxy", start=0))
+    assert batch.dropped == 1
+
+    # A full batch is exported without waiting for the interval
+    await asyncio.sleep(0.01)
+    assert [len(spans) for spans in exporter.batches] == [2, 1]
+    await batch.flush()
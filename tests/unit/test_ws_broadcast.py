@@ -0,0 +1,105 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from aiohttp import WSCloseCode, WSMessage, WSMsgType, web
+
+from aiorp.ws_broadcast import BroadcastChannel, WsBroadcast
+from aiorp.ws_handler import WsProxyHandler
+
+pytestmark = [pytest.mark.websocket_handler]
+
+
+def _message(data: str) -> WSMessage:
+    return WSMessage(WSMsgType.TEXT, data, None)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_shares_target(aiohttp_client, ws_target_ctx):
+    handler = WsProxyHandler(context=ws_target_ctx, broadcast=WsBroadcast())
+    app = web.Application()
+    app.router.add_get("/", handler)
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/") as ws_a, cli.ws_connect("/") as ws_b:
+        await ws_a.send_str("hello")
+        msg_a = await ws_a.receive()
+        msg_b = await ws_b.receive()
+
+        assert len(handler._channels) == 1
+
+    assert msg_a.data == "received: hello"
+    assert msg_b.data == "received: hello"
+
+
+@pytest.mark.asyncio
+async def test_broadcast_custom_key(aiohttp_client, ws_target_ctx):
+    handler = WsProxyHandler(
+        context=ws_target_ctx,
+        broadcast=WsBroadcast(key=lambda ctx: ctx.request.in_req.query.get("room")),
+    )
+    app = web.Application()
+    app.router.add_get("/", handler)
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/?room=a") as ws_a, cli.ws_connect("/?room=b") as ws_b:
+        await ws_a.send_str("hello")
+        msg_a = await ws_a.receive()
+        await ws_b.send_str("bye")
+        msg_b = await ws_b.receive()
+
+        assert len(handler._channels) == 2
+
+    assert msg_a.data == "received: hello"
+    assert msg_b.data == "received: bye"
+
+
+@pytest.mark.asyncio
+async def test_broadcast_target_closed(aiohttp_client, ws_target_ctx):
+    handler = WsProxyHandler(context=ws_target_ctx, broadcast=WsBroadcast())
+    app = web.Application()
+    app.router.add_get("/", handler)
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/") as ws_a, cli.ws_connect("/") as ws_b:
+        await ws_a.send_str("close")
+        msg_a = await ws_a.receive()
+        msg_b = await ws_b.receive()
+
+    assert msg_a.type == WSMsgType.CLOSE
+    assert msg_b.data == WSCloseCode.GOING_AWAY
+    assert not handler._channels
+
+
+@pytest.mark.asyncio
+async def test_broadcast_evicts_slow_subscriber():
+    channel = BroadcastChannel("key", queue_size=1, on_close=mock.Mock())
+    slow_ws = mock.MagicMock(closed=False)
+    slow_ws.close = mock.AsyncMock()
+    fast_ws = mock.MagicMock(closed=False)
+    received = []
+
+    async def _slow(msg):
+        await asyncio.Event().wait()
+
+    async def _fast(msg):
+        received.append(msg.data)
+
+    channel.subscribe(slow_ws, _slow)
+    channel.subscribe(fast_ws, _fast)
+
+    for data in ["a", "b", "c"]:
+        channel.publish(_message(data))
+        await asyncio.sleep(0)
+
+    await asyncio.sleep(0)
+
+    assert channel.evicted == 1
+    assert received == ["a", "b", "c"]
+    slow_ws.close.assert_awaited_once_with(
+        code=WSCloseCode.TRY_AGAIN_LATER, message=mock.ANY
+    )
+
+    await channel.unsubscribe(slow_ws)
+    await channel.unsubscribe(fast_ws)
+    assert channel.closed
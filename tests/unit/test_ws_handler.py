@@ -2,11 +2,24 @@ import asyncio
 from unittest import mock
 
 import pytest
-from aiohttp import WSCloseCode, WSMsgType, client, web
+from aiohttp import (
+    WSCloseCode,
+    WSMessage,
+    WSMsgType,
+    WSServerHandshakeError,
+    client,
+    web,
+)
 from aiohttp.test_utils import make_mocked_request
 
 from aiorp.base_handler import Rewrite
-from aiorp.ws_handler import WsProxyHandler
+from aiorp.registry import ConnectionLimit
+from aiorp.ws_handler import (
+    MessageDirection,
+    MessageMiddlewareDef,
+    WsCompression,
+    WsProxyHandler,
+)
 
 pytestmark = [pytest.mark.websocket_handler]
 
@@ -77,6 +90,25 @@ async def test_ws_handler_call_timeout(aiohttp_client, ws_target_ctx):
     assert msg.data == WSCloseCode.GOING_AWAY
 
 
+@pytest.mark.asyncio
+async def test_ws_handler_idle_timeout_replaces_receive_timeout(
+    aiohttp_client, ws_target_ctx
+):
+    with mock.patch("aiorp.ws_handler.DEFAULT_RECEIVE_TIMEOUT", 0.1):
+        app = _proxy_app(context=ws_target_ctx, idle_timeout=1)
+    client = await aiohttp_client(app)
+
+    async with client.ws_connect("/") as ws:
+        # Quiet for longer than the default receive timeout
+        await asyncio.sleep(0.3)
+        await ws.send_str("test")
+        msg = await ws.receive()
+        await ws.close()
+
+    assert msg.type == WSMsgType.TEXT
+    assert msg.data == "received: test"
+
+
 @pytest.mark.asyncio
 async def test_ws_handler_target_closed(aiohttp_client, ws_target_ctx):
     app = _proxy_app(context=ws_target_ctx)
@@ -122,7 +154,7 @@ async def test_ws_handler_task_cancellation(aiohttp_client, ws_target_ctx):
     app = _proxy_app(context=ws_target_ctx)
     cli = await aiohttp_client(app)
 
-    async def mock_proxy_messages(source, target):
+    async def mock_proxy_messages(source, target, transform=None):
         if isinstance(source, client.ClientWebSocketResponse):
             # Client->target task completes quickly
             await asyncio.sleep(0.1)
@@ -145,7 +177,7 @@ async def test_ws_handler_task_cancellation_reverse(aiohttp_client, ws_target_ct
     app = _proxy_app(context=ws_target_ctx)
     cli = await aiohttp_client(app)
 
-    async def mock_proxy_messages(source, target):
+    async def mock_proxy_messages(source, target, transform=None):
         if isinstance(source, client.ClientWebSocketResponse):
             # Target->client task would run longer
             await asyncio.sleep(10.0)
@@ -174,3 +206,212 @@ async def test_ws_handler_ping_pong(aiohttp_client, ws_target_ctx):
         msg = await ws.receive()
         assert msg.type == WSMsgType.BINARY
         assert msg.data == b"received: test"
+
+
+@pytest.mark.asyncio
+async def test_ws_handler_message_middleware(aiohttp_client, ws_target_ctx):
+    async def shout(ctx, msg):
+        return WSMessage(WSMsgType.TEXT, msg.data.upper(), None)
+
+    async def tag(ctx, msg):
+        return WSMessage(WSMsgType.TEXT, f"{msg.data} [proxied]", None)
+
+    handler = WsProxyHandler(
+        context=ws_target_ctx,
+        message_middlewares=[
+            MessageMiddlewareDef(MessageDirection.CLIENT_TO_TARGET, shout)
+        ],
+    )
+    handler.target_to_client(tag)
+    app = web.Application()
+    app.router.add_get("/", handler)
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/") as ws:
+        await ws.send_str("test")
+        msg = await ws.receive()
+        await ws.close()
+
+    assert msg.type == WSMsgType.TEXT
+    assert msg.data == "received: TEST [proxied]"
+
+
+@pytest.mark.asyncio
+async def test_ws_handler_message_middleware_drop(aiohttp_client, ws_target_ctx):
+    handler = WsProxyHandler(context=ws_target_ctx)
+
+    @handler.client_to_target
+    async def drop_secrets(ctx, msg):
+        if msg.data == "secret":
+            return None
+        return msg
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/") as ws:
+        await ws.send_str("secret")
+        await ws.send_str("test")
+        msg = await ws.receive()
+        await ws.close()
+
+    assert msg.data == "received: test"
+
+
+@pytest.mark.asyncio
+async def test_ws_handler_client_compression_disabled(aiohttp_client, ws_target_ctx):
+    app = _proxy_app(context=ws_target_ctx, compression=WsCompression(client=False))
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/", compress=15) as ws:
+        assert ws.compress == 0
+        await ws.send_str("test")
+        msg = await ws.receive()
+        await ws.close()
+
+    assert msg.data == "received: test"
+
+
+@pytest.mark.asyncio
+async def test_ws_handler_compression_threshold(aiohttp_client, ws_target_ctx):
+    app = _proxy_app(
+        context=ws_target_ctx,
+        compression=WsCompression(client=True, target=15, threshold=64),
+    )
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/", compress=15) as ws:
+        assert ws.compress == 15
+        await ws.send_str("small")
+        small = await ws.receive()
+        await ws.send_str("large" * 100)
+        large = await ws.receive()
+        await ws.close()
+
+    assert small.data == "received: small"
+    assert large.data == "received: " + "large" * 100
+
+
+async def _raw_frame_header(server, payload: bytes) -> int:
+    """Send a text frame over a raw connection and get the first byte of the reply"""
+    reader, writer = await asyncio.open_connection(server.host, server.port)
+    writer.write(
+        b"GET / HTTP/1.1\r\n"
+        b"Host: localhost\r\n"
+        b"Upgrade: websocket\r\n"
+        b"Connection: Upgrade\r\n"
+        b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+        b"Sec-WebSocket-Version: 13\r\n"
+        b"Sec-WebSocket-Extensions: permessage-deflate\r\n\r\n"
+    )
+    headers = await reader.readuntil(b"\r\n\r\n")
+    assert b"permessage-deflate" in headers
+    # Masked, uncompressed text frame, with a zero mask
+    length = len(payload)
+    if length < 126:
+        header = bytes([0x81, 0x80 | length])
+    else:
+        header = bytes([0x81, 0x80 | 126]) + length.to_bytes(2, "big")
+    writer.write(header + bytes(4) + payload)
+    first = (await reader.readexactly(2))[0]
+    writer.close()
+    await writer.wait_closed()
+    return first
+
+
+@pytest.mark.asyncio
+async def test_ws_handler_compression_threshold_frames(aiohttp_server, ws_target_ctx):
+    app = _proxy_app(
+        context=ws_target_ctx,
+        compression=WsCompression(client=True, threshold=64),
+    )
+    server = await aiohttp_server(app)
+
+    # RSV1 marks compressed frames
+    small = await _raw_frame_header(server, b"small")
+    large = await _raw_frame_header(server, "é".encode() * 30)
+
+    assert small & 0x40 == 0
+    assert large & 0x40
+
+
+@pytest.mark.asyncio
+async def test_ws_handler_idle_timeout(aiohttp_client, ws_target_ctx):
+    app = _proxy_app(context=ws_target_ctx, idle_timeout=0.2, client_heartbeat=0.05)
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/") as ws:
+        await ws.send_str("test")
+        msg = await ws.receive()
+        assert msg.data == "received: test"
+
+        msg = await ws.receive()
+
+    assert msg.type == WSMsgType.CLOSE
+    assert msg.data == WSCloseCode.GOING_AWAY
+    assert msg.extra == "Connection idle for too long, going away."
+
+
+@pytest.mark.asyncio
+async def test_ws_handler_max_connections(aiohttp_client, ws_target_ctx):
+    handler = WsProxyHandler(context=ws_target_ctx, max_connections=1)
+    app = web.Application()
+    app.router.add_get("/", handler)
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/") as ws:
+        await ws.send_str("test")
+        await ws.receive()
+        assert handler.active_connections == 1
+
+        with pytest.raises(WSServerHandshakeError) as exc_info:
+            await cli.ws_connect("/")
+        assert exc_info.value.status == 503
+
+        await ws.close()
+
+    # The handler releases the slot once it finished closing the tunnel
+    while handler.active_connections:
+        await asyncio.sleep(0.01)
+
+    async with cli.ws_connect("/") as ws:
+        await ws.send_str("test")
+        msg = await ws.receive()
+
+    assert msg.data == "received: test"
+
+
+@pytest.mark.asyncio
+async def test_ws_handler_shared_connection_limit(aiohttp_client, ws_target_ctx):
+    limit = ConnectionLimit(1)
+    first = WsProxyHandler(
+        context=ws_target_ctx, rewrite=Rewrite("/first", "/"), max_connections=limit
+    )
+    second = WsProxyHandler(
+        context=ws_target_ctx, rewrite=Rewrite("/second", "/"), max_connections=limit
+    )
+    app = web.Application()
+    app.router.add_get("/first", first)
+    app.router.add_get("/second", second)
+    cli = await aiohttp_client(app)
+
+    async with cli.ws_connect("/first") as ws:
+        await ws.send_str("test")
+        await ws.receive()
+        assert limit.active == 1
+
+        # The limit holds across the handlers
+        with pytest.raises(WSServerHandshakeError) as exc_info:
+            await cli.ws_connect("/second")
+        assert exc_info.value.status == 503
+
+        await ws.close()
+
+    while limit.active:
+        await asyncio.sleep(0.01)
+    async with cli.ws_connect("/second") as ws:
+        await ws.send_str("test")
+        msg = await ws.receive()
+
+    assert msg.data == "received: test"
@@ -49,6 +49,13 @@ async def internal_error(request: web.Request) -> web.Response:
     raise Exception("Big bad thing!")
 
 
+async def redirect(request: web.Request) -> web.Response:
+    resp = web.HTTPFound(location=f"http://{request.host}/yell_path?loud=1")
+    resp.set_cookie("session", "abc", path="/", domain=request.url.host)
+    resp.headers["Refresh"] = "0; url=/yell_path"
+    raise resp
+
+
 def app():
     app = web.Application()
 
@@ -61,6 +68,7 @@ def app():
             web.post("/upload", store_data),
             web.get("/error", return_error),
             web.get("/error/internal", internal_error),
+            web.get("/redirect", redirect),
         ]
     )
     return app